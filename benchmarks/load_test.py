@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Load generator for the OpenAI-compatible API server.
+
+Many simulated sessions replay the conversation corpus against
+/v1/chat/completions (SSE) and /v1/chat/completions/json, sending the full
+message history each turn like OpenWebUI does and attaching base64 JPEGs on
+upload turns. Meanwhile the server's /metrics endpoint is sampled to follow
+resident memory over time.
+
+Reports throughput, time-to-first-chunk, p50/p95/p99 turn latency per endpoint,
+error counts and server memory growth.
+
+Usage:
+    # server on local stand-ins, started by the load test itself
+    python benchmarks/load_test.py --launch --sessions 50 --concurrency 10
+
+    # against a server you started (benchmarks/serve_stand_ins.py or main_api.py)
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --duration 120 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stand_ins import add_stand_in_arguments, make_jpeg
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.json")
+RSS_PATTERN = re.compile(r"^process_resident_memory_bytes (\S+)$", re.MULTILINE)
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class LoadStats:
+    """Per-turn measurements and the server memory timeline."""
+
+    def __init__(self):
+        self.turns: List[Dict[str, Any]] = []
+        self.memory: List[Dict[str, float]] = []
+        self.sessions_completed = 0
+
+    def add_turn(self, endpoint: str, ttfc: Optional[float], latency: float, error: Optional[str],
+                 uploads: int, response_bytes: int):
+        self.turns.append({
+            "endpoint": endpoint,
+            "ttfc_s": ttfc,
+            "latency_s": latency,
+            "error": error,
+            "uploads": uploads,
+            "response_bytes": response_bytes,
+        })
+
+    def summary(self, wall_s: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint in sorted({t["endpoint"] for t in self.turns}):
+            turns = [t for t in self.turns if t["endpoint"] == endpoint]
+            ok = [t for t in turns if not t["error"]]
+            latencies = [t["latency_s"] for t in ok]
+            ttfcs = [t["ttfc_s"] for t in ok if t["ttfc_s"] is not None]
+            endpoints[endpoint] = {
+                "turns": len(turns),
+                "errors": len(turns) - len(ok),
+                "latency_p50_s": percentile(latencies, 0.50),
+                "latency_p95_s": percentile(latencies, 0.95),
+                "latency_p99_s": percentile(latencies, 0.99),
+                "latency_max_s": max(latencies) if latencies else 0.0,
+                "ttfc_p50_s": percentile(ttfcs, 0.50),
+                "ttfc_p95_s": percentile(ttfcs, 0.95),
+                "ttfc_p99_s": percentile(ttfcs, 0.99),
+            }
+        rss = [m["rss_bytes"] for m in self.memory]
+        return {
+            "wall_s": wall_s,
+            "sessions_completed": self.sessions_completed,
+            "turns": len(self.turns),
+            "errors": sum(1 for t in self.turns if t["error"]),
+            "error_kinds": _count(t["error"] for t in self.turns if t["error"]),
+            "turns_per_s": len(self.turns) / wall_s if wall_s else 0.0,
+            "sessions_per_s": self.sessions_completed / wall_s if wall_s else 0.0,
+            "endpoints": endpoints,
+            "memory": {
+                "rss_start_bytes": rss[0] if rss else 0,
+                "rss_end_bytes": rss[-1] if rss else 0,
+                "rss_peak_bytes": max(rss) if rss else 0,
+                "timeline": self.memory,
+            },
+        }
+
+def _count(items) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for item in items:
+        counts[item] = counts.get(item, 0) + 1
+    return counts
+
+def user_message(text: str, uploads: int, image_data_url: str) -> Dict[str, Any]:
+    """A user message in the shape OpenWebUI sends, multimodal when images are attached."""
+    if not uploads:
+        return {"role": "user", "content": text}
+    content = [{"type": "text", "text": text}]
+    content += [{"type": "image_url", "image_url": {"url": image_data_url}} for _ in range(uploads)]
+    return {"role": "user", "content": content}
+
+async def post_sse(client, url: str, payload: Dict[str, Any], headers: Dict[str, str]):
+    """Stream one SSE completion; returns (time to first chunk, full text, bytes received)."""
+    start = time.perf_counter()
+    ttfc = None
+    text = []
+    received = 0
+    async with client.stream("POST", url, json=payload, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            received += len(line) + 1
+            if not line.startswith("data:"):
+                continue
+            if ttfc is None:
+                ttfc = time.perf_counter() - start
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"])
+            text.append(chunk["choices"][0]["delta"].get("content") or "")
+    # Drop the "Processing started" placeholder the server sends first
+    return ttfc, "".join(text[1:]) if len(text) > 1 else "".join(text), received
+
+async def post_json(client, url: str, payload: Dict[str, Any], headers: Dict[str, str]):
+    """One non-streaming completion; the first byte arrives with the whole answer."""
+    response = await client.post(url, json=payload, headers=headers)
+    response.raise_for_status()
+    body = response.json()
+    return None, body["choices"][0]["message"]["content"], len(response.content)
+
+async def run_session(client, base_url: str, conversation: Dict[str, Any], session_id: str, use_sse: bool,
+                      image_data_url: str, stats: LoadStats):
+    endpoint = "/v1/chat/completions" if use_sse else "/v1/chat/completions/json"
+    post = post_sse if use_sse else post_json
+    history: List[Dict[str, Any]] = []
+
+    for turn_index, turn in enumerate(conversation["turns"]):
+        uploads = turn.get("uploads", 0)
+        history.append(user_message(turn["user"], uploads, image_data_url))
+        payload = {"messages": history, "session_id": session_id}
+        headers = {"X-Request-ID": f"{session_id}-{turn_index}"}
+
+        start = time.perf_counter()
+        error = None
+        ttfc, reply, received = None, "", 0
+        try:
+            ttfc, reply, received = await post(client, base_url + endpoint, payload, headers)
+            if ttfc is None:
+                ttfc = time.perf_counter() - start
+        except Exception as e:
+            error = type(e).__name__
+        latency = time.perf_counter() - start
+        stats.add_turn(endpoint, ttfc, latency, error, uploads, received)
+        if error:
+            return
+        history.append({"role": "assistant", "content": reply})
+    stats.sessions_completed += 1
+
+async def sample_memory(client, base_url: str, stats: LoadStats, interval: float, started: float, stop: asyncio.Event):
+    while True:
+        try:
+            response = await client.get(base_url + "/metrics")
+            match = RSS_PATTERN.search(response.text)
+            if match:
+                stats.memory.append({
+                    "t_s": round(time.perf_counter() - started, 2),
+                    "rss_bytes": float(match.group(1)),
+                    "turns": len(stats.turns),
+                })
+        except Exception as e:
+            print(f"⚠️ /metrics sample failed: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+async def run_load(args, corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import httpx
+
+    image_data_url = "data:image/jpeg;base64," + base64.b64encode(make_jpeg((1024, 768))).decode()
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=args.concurrency + 2, max_keepalive_connections=args.concurrency + 2)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(client, args.url, stats, args.sample_interval, started, stop))
+
+        counter = iter(range(10 ** 9))
+
+        async def worker(worker_id: int):
+            while True:
+                n = next(counter)
+                if args.duration:
+                    if time.perf_counter() - started >= args.duration:
+                        return
+                elif n >= args.sessions:
+                    return
+                conversation = corpus[n % len(corpus)]
+                # Deterministic endpoint mix: sse_ratio of the sessions stream
+                use_sse = int((n + 1) * args.sse_ratio) > int(n * args.sse_ratio)
+                session_id = f"load-{args.run_id}-{n}"
+                await run_session(client, args.url, conversation, session_id, use_sse, image_data_url, stats)
+
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        wall_s = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    report = stats.summary(wall_s)
+    report["settings"] = {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "sessions": None if args.duration else args.sessions,
+        "duration_s": args.duration,
+        "sse_ratio": args.sse_ratio,
+        "language": args.lang,
+    }
+    return report
+
+def _mb(value: float) -> str:
+    return f"{value / (1024 * 1024):.1f}MB" if value else "n/a"
+
+def print_report(report: Dict[str, Any]):
+    print("\n📊 Load test")
+    print("=" * 78)
+    print(f"Settings: {report['settings']}")
+    print(f"Wall time {report['wall_s']:.1f}s, {report['sessions_completed']} sessions completed, "
+          f"{report['turns']} turns ({report['turns_per_s']:.2f} turns/s, {report['sessions_per_s']:.2f} sessions/s)")
+    print(f"Errors: {report['errors']} {report['error_kinds'] or ''}")
+
+    print(f"\n{'endpoint':<28}{'turns':>6}{'ttfc p50':>10}{'p95':>8}{'p99':>8}"
+          f"{'lat p50':>10}{'p95':>8}{'p99':>8}{'max':>8}")
+    for endpoint, s in report["endpoints"].items():
+        print(f"{endpoint:<28}{s['turns']:>6}{s['ttfc_p50_s']:>9.2f}s{s['ttfc_p95_s']:>7.2f}s{s['ttfc_p99_s']:>7.2f}s"
+              f"{s['latency_p50_s']:>9.2f}s{s['latency_p95_s']:>7.2f}s{s['latency_p99_s']:>7.2f}s"
+              f"{s['latency_max_s']:>7.2f}s")
+
+    memory = report["memory"]
+    growth = memory["rss_end_bytes"] - memory["rss_start_bytes"]
+    print(f"\nServer RSS: start {_mb(memory['rss_start_bytes'])}, end {_mb(memory['rss_end_bytes'])}, "
+          f"peak {_mb(memory['rss_peak_bytes'])}, growth {growth / (1024 * 1024):+.1f}MB")
+    timeline = memory["timeline"]
+    step = max(1, len(timeline) // 10)
+    for sample in timeline[::step]:
+        print(f"   t={sample['t_s']:>7.1f}s  turns={sample['turns']:>5}  rss={_mb(sample['rss_bytes'])}")
+
+def launch_server(args) -> subprocess.Popen:
+    """Start serve_stand_ins.py on a local port and wait until /info answers."""
+    import httpx
+
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve_stand_ins.py"),
+        "--port", str(args.port), "--quiet",
+        "--llm-latency", str(args.llm_latency),
+        "--llm-token-latency", str(args.llm_token_latency),
+        "--replicate-latency", str(args.replicate_latency),
+        "--shopify-latency", str(args.shopify_latency),
+        "--image-size", args.image_size,
+    ]
+    server = subprocess.Popen(command)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Stand-in server exited with code {server.returncode}")
+        try:
+            if httpx.get(args.url + "/info", timeout=1).status_code == 200:
+                print(f"🚀 Stand-in server ready at {args.url}")
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    server.terminate()
+    raise RuntimeError("Stand-in server did not start within 60s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the chat completion endpoints with simulated sessions")
+    parser.add_argument("--url", help="Server base URL (default: the --launch server)")
+    parser.add_argument("--launch", action="store_true", help="Start benchmarks/serve_stand_ins.py for the run")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --launch")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Conversation corpus JSON")
+    parser.add_argument("--lang", choices=["en", "zh"], help="Only replay conversations in this language")
+    parser.add_argument("--sessions", type=int, default=30, help="Sessions to run (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions in flight at once")
+    parser.add_argument("--sse-ratio", type=float, default=0.5, help="Share of sessions using the SSE endpoint")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="Seconds between /metrics samples")
+    parser.add_argument("--json", metavar="PATH", help="Write the report as JSON")
+    add_stand_in_arguments(parser)
+    args = parser.parse_args()
+    args.url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    args.run_id = int(time.time())
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    if args.lang:
+        corpus = [c for c in corpus if c.get("language") == args.lang]
+
+    server = launch_server(args) if args.launch else None
+    try:
+        report = asyncio.run(run_load(args, corpus))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark: replays recorded conversations through the compiled
+graph with every external service replaced by a local stand-in (see stand_ins.py).
+
+Reports per-node and per-external-call p50/p95 latency, LLM calls and tokens per
+purpose, turn latency and process memory. Save a run with --json and diff a
+later run against it with --compare to see the effect of an optimization.
+
+Usage:
+    python benchmarks/run_benchmark.py
+    python benchmarks/run_benchmark.py --repeat 5 --llm-latency 0.4 --replicate-latency 8
+    python benchmarks/run_benchmark.py --lang zh --json baseline.json
+    python benchmarks/run_benchmark.py --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stand_ins import add_stand_in_arguments, install_stand_ins, make_jpeg, stand_in_config_from_args
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.json")
+
+def load_corpus(path: str, language: str = None) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+    if language:
+        conversations = [c for c in conversations if c.get("language") == language]
+    return conversations
+
+def _write_uploads(count: int, workdir: str) -> List[Dict[str, str]]:
+    """Save `count` JPEGs the way main_api.save_base64_images_to_session does."""
+    upload_dir = tempfile.mkdtemp(dir=workdir)
+    files = []
+    for i in range(count):
+        path = os.path.join(upload_dir, f"uploaded_image_{i + 1}.jpg")
+        with open(path, "wb") as f:
+            f.write(make_jpeg((1024, 768)))
+        files.append({"path": path, "filename": os.path.basename(path), "content_type": "image/jpeg"})
+    return files
+
+def run_conversation(graph, conversation: Dict[str, Any], thread_id: str, workdir: str, verbose: bool = False):
+    """
+    Replay one conversation, carrying session state between turns like
+    main_api's /v1/chat/completions handler does.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph_workflow.utils.metrics import record_call, set_trace_id, reset_trace_id
+
+    session = {
+        "messages": [],
+        "search_results": [],
+        "image_modification_request": {},
+        "modified_images": [],
+        "awaiting_confirmation": False,
+        "incorporate_previous": False,
+        "action_type": "general",
+    }
+    for turn_index, turn in enumerate(conversation["turns"]):
+        session["messages"].append(HumanMessage(content=turn["user"]))
+        state = {
+            **session,
+            "uploaded_files": _write_uploads(turn.get("uploads", 0), workdir) if turn.get("uploads") else [],
+        }
+
+        token = set_trace_id(f"{thread_id}-{turn_index}")
+        start = time.perf_counter()
+        error = None
+        try:
+            output = io.StringIO() if not verbose else None
+            with contextlib.redirect_stdout(output) if output is not None else contextlib.nullcontext():
+                result = graph.invoke(state, config={"configurable": {"thread_id": thread_id}})
+        except Exception as e:
+            error = type(e).__name__
+            result = {}
+            print(f"❌ {conversation['id']} turn {turn_index + 1} failed: {e}")
+        finally:
+            record_call("turn", conversation["id"], time.perf_counter() - start, error=error)
+            reset_trace_id(token)
+
+        for key in ("image_modification_request", "modified_images", "awaiting_confirmation",
+                    "incorporate_previous", "action_type"):
+            if key in result:
+                session[key] = result[key]
+        if result.get("search_results"):
+            session["search_results"] = result["search_results"]
+        ai_messages = [m for m in result.get("messages", []) if isinstance(m, AIMessage)]
+        if ai_messages:
+            session["messages"].append(AIMessage(content=ai_messages[-1].content))
+
+def collect_report(args, wall_s: float, rss_start: int, rss_end: int, tracemalloc_peak: int, stand_ins) -> Dict[str, Any]:
+    from langgraph_workflow.utils.llm_registry import get_llm_stats
+    from langgraph_workflow.utils.metrics import get_metrics_snapshot
+
+    snapshot = get_metrics_snapshot()
+    llm_stats = get_llm_stats()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {
+        "settings": {
+            "repeat": args.repeat,
+            "language": args.lang,
+            "llm_latency": args.llm_latency,
+            "replicate_latency": args.replicate_latency,
+            "shopify_latency": args.shopify_latency,
+        },
+        "wall_s": wall_s,
+        "latency": snapshot["latency"],
+        "errors": snapshot["errors"],
+        "tokens": snapshot["tokens"],
+        "payload_bytes": snapshot["payload_bytes"],
+        "llm_calls": llm_stats["calls"],
+        "llm_tokens": llm_stats["tokens"],
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": rss_end,
+            "rss_peak_bytes": peak_rss,
+            "tracemalloc_peak_bytes": tracemalloc_peak,
+        },
+        "stand_ins": {
+            "replicate_runs": stand_ins["replicate"].calls,
+            "shopify_operations": dict(stand_ins["http"].shopify.operations),
+        },
+    }
+
+def _mb(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f}MB" if value else "n/a"
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    latency = report["latency"]
+    base_latency = (baseline or {}).get("latency", {})
+
+    def rows(prefix: str):
+        return sorted(((k, v) for k, v in latency.items() if k.startswith(prefix)),
+                      key=lambda kv: kv[1]["sum_s"], reverse=True)
+
+    def delta(key: str, field: str) -> str:
+        if key not in base_latency or not base_latency[key][field]:
+            return ""
+        change = (latency[key][field] - base_latency[key][field]) / base_latency[key][field] * 100
+        return f" ({change:+.0f}%)"
+
+    print("\n📊 Offline benchmark")
+    print("=" * 78)
+    print(f"Wall time: {report['wall_s']:.2f}s   settings: {report['settings']}")
+
+    for title, prefix in (("Turns (per conversation)", "turn:"), ("Graph nodes", "node:")):
+        print(f"\n{title}:")
+        print(f"{'name':<34}{'count':>6}{'p50':>16}{'p95':>16}")
+        for key, stats in rows(prefix):
+            name = key.split(":", 1)[1]
+            print(f"{name:<34}{stats['count']:>6}"
+                  f"{stats['p50_s'] * 1000:>9.1f}ms{delta(key, 'p50_s'):<6}"
+                  f"{stats['p95_s'] * 1000:>9.1f}ms{delta(key, 'p95_s'):<6}")
+
+    print("\nExternal calls:")
+    print(f"{'kind:name':<46}{'count':>6}{'p50':>10}{'p95':>10}{'errors':>8}")
+    for key, stats in sorted(latency.items()):
+        if key.startswith(("node:", "turn:")):
+            continue
+        print(f"{key:<46}{stats['count']:>6}{stats['p50_s'] * 1000:>8.1f}ms"
+              f"{stats['p95_s'] * 1000:>8.1f}ms{report['errors'].get(key, 0):>8}")
+
+    print("\nLLM calls by purpose:")
+    base_calls = (baseline or {}).get("llm_calls", {})
+    for purpose, calls in sorted(report["llm_calls"].items(), key=lambda kv: kv[1], reverse=True):
+        tokens = report["llm_tokens"].get(purpose, {}).get("total_tokens", 0)
+        was = f" (baseline {base_calls[purpose]})" if purpose in base_calls and base_calls[purpose] != calls else ""
+        print(f"   {purpose:<30}{calls:>5} calls{was}  {tokens:>8} tokens")
+    print(f"   {'TOTAL':<30}{sum(report['llm_calls'].values()):>5} calls")
+
+    memory = report["memory"]
+    print(f"\nMemory: RSS start {_mb(memory['rss_start_bytes'])}, end {_mb(memory['rss_end_bytes'])}, "
+          f"peak {_mb(memory['rss_peak_bytes'])}, tracemalloc peak {_mb(memory['tracemalloc_peak_bytes'])}")
+    print(f"Stand-ins: {report['stand_ins']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay conversations through the graph against local stand-ins")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Conversation corpus JSON")
+    parser.add_argument("--lang", choices=["en", "zh"], help="Only replay conversations in this language")
+    parser.add_argument("--repeat", type=int, default=3, help="Times to replay the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded corpus passes before measuring")
+    add_stand_in_arguments(parser)
+    parser.add_argument("--tracemalloc", action="store_true", help="Track Python allocation peak (slower)")
+    parser.add_argument("--verbose", action="store_true", help="Show node output")
+    parser.add_argument("--json", metavar="PATH", help="Write the report as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Baseline report JSON to diff against")
+    args = parser.parse_args()
+    # Resolve paths now; the run happens in a scratch working directory
+    args.json = os.path.abspath(args.json) if args.json else None
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+    args.corpus = os.path.abspath(args.corpus)
+
+    from langgraph_workflow.utils.metrics import get_process_memory_bytes, reset_metrics
+    from langgraph_workflow.utils.llm_registry import reset_llm_stats
+
+    stand_ins = install_stand_ins(stand_in_config_from_args(args))
+    corpus = load_corpus(args.corpus, args.lang)
+
+    # The listing database and uploads live in the working directory; keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="kekari-bench-")
+    os.chdir(workdir)
+
+    from langgraph_workflow.graph_build import get_graph
+    graph = get_graph()
+
+    for i in range(args.warmup):
+        for conversation in corpus:
+            run_conversation(graph, conversation, f"warmup-{i}-{conversation['id']}", workdir, args.verbose)
+    reset_metrics()
+    reset_llm_stats()
+    stand_ins["replicate"].calls = 0
+    stand_ins["http"].shopify.operations.clear()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_start = get_process_memory_bytes()
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        for conversation in corpus:
+            run_conversation(graph, conversation, f"run-{i}-{conversation['id']}", workdir, args.verbose)
+    wall_s = time.perf_counter() - start
+    tracemalloc_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else 0
+
+    report = collect_report(args, wall_s, rss_start, get_process_memory_bytes(), tracemalloc_peak, stand_ins)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Run the OpenAI-compatible API server (main_api.py) with every external service
+replaced by the local stand-ins from stand_ins.py, so load_test.py can drive it
+without network access or API keys.
+
+Usage:
+    python benchmarks/serve_stand_ins.py --port 8000
+    python benchmarks/serve_stand_ins.py --llm-latency 0.4 --replicate-latency 8 --quiet
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stand_ins import add_stand_in_arguments, install_stand_ins, stand_in_config_from_args
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve main_api.py against local stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--quiet", action="store_true", help="Discard the server's debug prints")
+    add_stand_in_arguments(parser)
+    args = parser.parse_args()
+
+    install_stand_ins(stand_in_config_from_args(args))
+
+    # Uploaded images and the listing database are written to the working directory
+    workdir = tempfile.mkdtemp(prefix="kekari-serve-")
+    os.chdir(workdir)
+    print(f"📁 Working directory: {workdir}")
+
+    if args.quiet:
+        sys.stdout = open(os.devnull, "w")
+
+    import uvicorn
+    import main_api
+    uvicorn.run(main_api.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
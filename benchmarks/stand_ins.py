@@ -0,0 +1,838 @@
+"""
+Local stand-ins for every external service the graph talks to.
+
+    install_stand_ins(StandInConfig(llm_latency=0.2, replicate_latency=5.0))
+
+After installation the compiled graph runs fully offline:
+
+- LLM: FakeChatModel per purpose, answering in the format each node parses
+  (routing JSON, SKU lists, prompts, copy) with configurable latency.
+- Embeddings + Pinecone: a hashing embedder and an in-memory vector index loaded
+  from all_new_skus_us.json with the same metadata layout as
+  embeddings/upsert_giga_to_pinecone.py.
+- Replicate, S3: record calls, sleep, return deterministic URLs.
+- HTTP (image downloads, Shopify GraphQL): generated JPEGs and a minimal
+  Admin API that answers the queries/mutations the Shopify agent sends.
+
+Stand-ins are installed through utils.clients.set_client() and
+utils.llm_registry.set_chat_model_factory(), so no node code is patched.
+"""
+
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CATALOG = os.path.join(REPO_ROOT, "all_new_skus_us.json")
+
+SKU_PATTERN = re.compile(r"\b[A-Z]{1,4}\d{4,}[A-Z0-9]*\b")
+
+# Chinese keywords mapped to English so zh queries hit the same products
+ZH_KEYWORDS = {
+    "沙发": "sofa", "椅子": "chair", "凳子": "chair", "桌子": "table", "桌": "table",
+    "户外": "outdoor patio", "室内": "indoor", "庭院": "patio", "花园": "garden",
+    "宠物": "pet hutch", "兔子": "rabbit hutch", "鸡": "chicken coop", "化妆": "makeup vanity",
+    "梳妆台": "makeup vanity", "床": "bed", "黑色": "black", "白色": "white", "灰色": "grey",
+    "米色": "beige", "木": "wood", "铝": "aluminum", "藤": "rattan", "咖啡店": "coffee shop",
+}
+
+@dataclass
+class StandInConfig:
+    """Latencies (seconds) and sizes used by the stand-ins."""
+    llm_latency: float = 0.05
+    llm_token_latency: float = 0.0
+    embedding_latency: float = 0.01
+    vector_query_latency: float = 0.01
+    replicate_latency: float = 0.2
+    s3_latency: float = 0.02
+    shopify_latency: float = 0.05
+    image_fetch_latency: float = 0.01
+    image_size: tuple = (1600, 1200)
+    catalog_path: str = DEFAULT_CATALOG
+    s3_bucket: str = "bench-bucket"
+
+def _sleep(seconds: float):
+    if seconds > 0:
+        time.sleep(seconds)
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+# ---------------------------------------------------------------------------
+# Fake LLM
+# ---------------------------------------------------------------------------
+
+def _section(prompt: str, start: str, end: Optional[str] = None) -> str:
+    """Text between `start` and `end` markers in a prompt ('' if absent)."""
+    index = prompt.find(start)
+    if index < 0:
+        return ""
+    text = prompt[index + len(start):]
+    if end:
+        stop = text.find(end)
+        if stop >= 0:
+            text = text[:stop]
+    return text.strip()
+
+def _skus(text: str) -> List[str]:
+    seen = []
+    for sku in SKU_PATTERN.findall(text):
+        if sku not in seen:
+            seen.append(sku)
+    return seen
+
+def _has_any(text: str, words) -> bool:
+    lowered = text.lower()
+    return any(word in lowered for word in words)
+
+PUBLISH_WORDS = ("publish", "shopify", "list this", "list it", "list the", "list all", "上架", "发布")
+IMAGE_WORDS = ("background", "put this", "put the", "place it", "scene", "in a café", "in a cafe",
+               "背景", "放到", "放在", "改成")
+SEARCH_WORDS = ("find", "search", "show me", "looking for", "need", "recommend", "any ",
+                "找", "搜索", "有没有", "推荐", "看看")
+
+def _select_skus(query: str, candidates: List[str]) -> List[str]:
+    mentioned = [sku for sku in _skus(query) if sku in candidates]
+    if mentioned:
+        return mentioned
+    if _has_any(query, ("all", "every", "全部", "所有")):
+        return candidates[:5]
+    if _has_any(query, ("last", "最后")):
+        return candidates[-1:]
+    return candidates[:1]
+
+def _respond_planning(prompt: str) -> str:
+    query = _section(prompt, "USER'S LATEST QUERY:", "IMAGES PRESENT:")
+    if _has_any(query, PUBLISH_WORDS):
+        action = "shopify_agent"
+    elif _has_any(query, IMAGE_WORDS):
+        action = "image_agent"
+    elif _has_any(query, SEARCH_WORDS):
+        action = "decide_search_strategy"
+    else:
+        action = "gpt4_chat"
+    return json.dumps({"action": action})
+
+def _respond_search_strategy(prompt: str) -> str:
+    history = _section(prompt, "Here is the full conversation so far:", "Available metadata fields:")
+    user_lines = [line[len("User: "):] for line in history.splitlines() if line.startswith("User: ")]
+    query = user_lines[-1] if user_lines else history
+    filters = {}
+    weight = re.search(r"(?:under|below|less than|低于|小于)\s*(\d+)\s*(?:lbs?|磅)", query, re.IGNORECASE)
+    if weight:
+        filters["weight"] = {"$lt": float(weight.group(1))}
+    return json.dumps({"user_query": query, "use_metadata_filter": bool(filters), "filters": filters},
+                      ensure_ascii=False)
+
+def _respond_search_queries(prompt: str) -> str:
+    query = _section(prompt, "has given this query: '", "'\n")
+    english = " ".join(en for zh, en in ZH_KEYWORDS.items() if zh in query)
+    terms = [query, f"{english or query} furniture".strip(), english or query.split()[0]]
+    return json.dumps(terms, ensure_ascii=False)
+
+def _respond_chat(prompt: str) -> str:
+    skus = _skus(_section(prompt, "FOUND PRODUCTS:", "RECENTLY MODIFIED IMAGES:") or prompt)[:8]
+    chinese = "Respond in Chinese" in prompt
+    intro = "这是我为你找到的产品：" if chinese else "Here is what I found for you:"
+    parts = [intro]
+    for sku in skus:
+        parts.append(
+            f"**SKU:** {sku}\n![Product Image](https://cdn.example.com/{sku}.jpg)\n"
+            "**Key Features:** Sturdy frame, weather-resistant finish and easy assembly. "
+            "This would be a great fit for you because it balances comfort, durability and style.\n---"
+        )
+    parts.append("These products are now in your listing database. You can: 1) List them on Shopify "
+                 "immediately, 2) Modify their images first, or 3) Search for more products.")
+    return "\n\n".join(parts)
+
+def _respond_filter(prompt: str) -> str:
+    candidates = _skus(_section(prompt, "Here are the candidate products:", "User's instruction:"))
+    query = _section(prompt, "User's instruction:", "IMPORTANT:")
+    return json.dumps([
+        {"sku": sku, "title": f"Product {sku}", "description": "A versatile, durable piece for any space."}
+        for sku in _select_skus(query, candidates)
+    ])
+
+def _respond_product_selection(prompt: str) -> str:
+    candidates = _skus(_section(prompt, "AVAILABLE PRODUCTS:", "USER'S CURRENT QUERY:"))
+    query = _section(prompt, "USER'S CURRENT QUERY:", "\n\n")
+    return json.dumps({
+        "selected_skus": _select_skus(query, candidates),
+        "reasoning": "Matched the products referenced in the query",
+        "confidence": 0.9
+    })
+
+def _respond_sku_identification(prompt: str) -> str:
+    candidates = _skus(_section(prompt, "**Available Products:**", "**Your Task:**"))
+    query = _section(prompt, "**Current User Query:**", "\n")
+    selected = _select_skus(query, candidates)
+    return selected[0] if selected else "none"
+
+def _respond_image_edit_plan(prompt: str) -> str:
+    candidates = _skus(_section(prompt, "**Available Products:**", "**Your Task:**"))
+    query = _section(prompt, "**Current User Query:**", "\n")
+    selected = _select_skus(query, candidates)
+    return json.dumps({
+        "sku": selected[0] if selected else "none",
+        "replicate_prompt": _respond_image_prompt(prompt),
+    })
+
+def _respond_confirmation(prompt: str) -> str:
+    response = _section(prompt, 'USER\'S CURRENT RESPONSE: "', '"\n')
+    if _has_any(response, PUBLISH_WORDS):
+        intent = "add_and_list"
+    elif _has_any(response, ("no", "discard", "不要", "不好", "算了", "cancel")):
+        intent = "skip"
+    elif _has_any(response, ("yes", "ok", "good", "great", "perfect", "好", "可以", "不错")):
+        intent = "add_only"
+    else:
+        intent = "clarify"
+    return json.dumps({"intent": intent, "reasoning": "Keyword classification", "followup_instruction": None})
+
+def _respond_image_analysis(prompt: str) -> str:
+    return json.dumps({"is_image_request": True, "approach": "product_images", "reasoning": "Product image edit"})
+
+def _respond_image_prompt(prompt: str) -> str:
+    return ("Replace the background with a warm, modern coffee shop interior with soft natural light "
+            "and people in the background, while keeping the product exactly as it is in shape, color "
+            "and position. Photorealistic, high resolution, professional product photography.")
+
+def _respond_title(prompt: str) -> str:
+    sku = (_skus(prompt) or ["ITEM"])[0]
+    return f"Modern Comfort Collection {sku} - Durable, Stylish and Easy to Assemble"
+
+def _respond_description(prompt: str) -> str:
+    return ("Elevate your space with a piece designed for everyday comfort and lasting durability. "
+            "Crafted from premium materials with a weather-resistant finish, it pairs clean modern lines "
+            "with practical details. Easy to assemble and simple to maintain, it is the perfect fit for "
+            "living rooms, patios and cafés alike. " * 2).strip()
+
+def _respond_shopify(prompt: str) -> str:
+    return "🎉 Your products are live on Shopify! Check the links above to review each listing."
+
+def _respond_generic(prompt: str) -> str:
+    return "Here is a concise, helpful answer based on the information provided."
+
+RESPONDERS: Dict[str, Callable[[str], str]] = {
+    "planning": _respond_planning,
+    "search_strategy": _respond_search_strategy,
+    "search_queries": _respond_search_queries,
+    "summarize": _respond_chat,
+    "filter_results": _respond_filter,
+    "chat": _respond_chat,
+    "chat_fallback": _respond_generic,
+    "product_selection": _respond_product_selection,
+    "shopify_product_selection": _respond_product_selection,
+    "image_product_selection": _respond_product_selection,
+    "confirmation_intent": _respond_confirmation,
+    "image_request_analysis": _respond_image_analysis,
+    "sku_identification": _respond_sku_identification,
+    "image_edit_plan": _respond_image_edit_plan,
+    "replicate_prompt": _respond_image_prompt,
+    "translate_instruction": _respond_image_prompt,
+    "shopify_title": _respond_title,
+    "shopify_description": _respond_description,
+    "shopify_response": _respond_shopify,
+}
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers from RESPONDERS[purpose] after a simulated delay."""
+
+    purpose: str = "unknown"
+    model_name: str = "fake-gpt"
+    latency: float = 0.05
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(m.content if isinstance(m.content, str) else json.dumps(m.content) for m in messages)
+        text = RESPONDERS.get(self.purpose, _respond_generic)(prompt)
+        usage = {
+            "prompt_tokens": _estimate_tokens(prompt),
+            "completion_tokens": _estimate_tokens(text),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        _sleep(self.latency + self.token_latency * usage["completion_tokens"])
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": usage, "model_name": self.model_name}
+        )
+
+# ---------------------------------------------------------------------------
+# Embeddings + vector index
+# ---------------------------------------------------------------------------
+
+EMBEDDING_DIM = 256
+
+def embed_text(text: str) -> List[float]:
+    """Deterministic bag-of-words hashing embedding (unit length)."""
+    text = text.lower()
+    extra = " ".join(en for zh, en in ZH_KEYWORDS.items() if zh in text)
+    vector = [0.0] * EMBEDDING_DIM
+    for token in re.findall(r"[a-z0-9]+|[一-鿿]", f"{text} {extra}"):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class FakeOpenAIClient:
+    """openai.OpenAI stand-in exposing embeddings.create()."""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _create_embedding(self, input, model="text-embedding-3-small", **kwargs):
+        _sleep(self.latency)
+        texts = input if isinstance(input, list) else [input]
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=embed_text(t), index=i) for i, t in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=sum(_estimate_tokens(t) for t in texts),
+                                  total_tokens=sum(_estimate_tokens(t) for t in texts)),
+            model=model
+        )
+
+def _clean_html(raw_html: str) -> str:
+    return re.sub(r"<.*?>", "", raw_html or "")
+
+def catalog_to_vectors(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build index records with the same ids/metadata as embeddings/upsert_giga_to_pinecone.py."""
+    records = []
+    for product in products:
+        attributes = product.get("attributes") or ""
+        color = material = scene = None
+        if isinstance(attributes, str):
+            match = re.search(r"main_color='([^']*)'", attributes)
+            color = match.group(1) if match else None
+            match = re.search(r"main_material='([^']*)'", attributes)
+            material = match.group(1) if match else None
+            match = re.search(r"scene=([^,)]*)", attributes)
+            scene = match.group(1) if match and match.group(1) != "None" else None
+        elif isinstance(attributes, dict):
+            color, material, scene = attributes.get("main_color"), attributes.get("main_material"), attributes.get("scene")
+
+        image_urls = product.get("image_urls") or []
+        main_image_url = product.get("main_image_url", "")
+        if not image_urls and main_image_url:
+            image_urls = [main_image_url]
+
+        metadata = {key: product[key] for key in (
+            "category", "category_code", "weight", "length", "width", "height",
+            "weight_kg", "length_cm", "width_cm", "height_cm", "sku", "US", "EU"
+        ) if product.get(key) is not None}
+        for key, value in (("color", color), ("material", material), ("scene", scene)):
+            if value is not None:
+                metadata[key] = value
+        metadata["characteristics_text"] = " ".join(product.get("characteristics") or [])
+        metadata["image_urls"] = image_urls
+        metadata["main_image_url"] = main_image_url
+        metadata["total_images"] = len(image_urls)
+
+        text = f"{product.get('name', '')}. {_clean_html(product.get('description', ''))}. {metadata['characteristics_text']}"
+        vector = embed_text(text)
+        records.append({"id": f"{product['sku']}_text", "values": vector, "metadata": {**metadata, "type": "text"}})
+        for i, image_url in enumerate(image_urls):
+            records.append({
+                "id": f"{product['sku']}_image_{i}",
+                "values": vector,
+                "metadata": {**metadata, "type": "image", "image_index": i, "image_url": image_url}
+            })
+    return records
+
+def _matches_filter(metadata: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Pinecone's filter language the nodes use."""
+    if not flt:
+        return True
+    for key, condition in flt.items():
+        if key == "$and":
+            if not all(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            try:
+                ok = {
+                    "$eq": lambda: value == expected,
+                    "$ne": lambda: value != expected,
+                    "$in": lambda: value in expected,
+                    "$nin": lambda: value not in expected,
+                    "$lt": lambda: value is not None and value < expected,
+                    "$lte": lambda: value is not None and value <= expected,
+                    "$gt": lambda: value is not None and value > expected,
+                    "$gte": lambda: value is not None and value >= expected,
+                }[op]()
+            except (KeyError, TypeError):
+                ok = False
+            if not ok:
+                return False
+    return True
+
+class InMemoryVectorIndex:
+    """Pinecone Index stand-in: brute-force cosine search with metadata filters."""
+
+    def __init__(self, records: List[Dict[str, Any]], latency: float = 0.01):
+        self.records = records
+        self.latency = latency
+
+    @classmethod
+    def from_catalog(cls, path: str = DEFAULT_CATALOG, latency: float = 0.01) -> "InMemoryVectorIndex":
+        with open(path, "r") as f:
+            return cls(catalog_to_vectors(json.load(f)), latency)
+
+    def query(self, vector, top_k=10, include_metadata=True, filter=None, **kwargs):
+        _sleep(self.latency)
+        scored = []
+        for record in self.records:
+            if _matches_filter(record["metadata"], filter):
+                score = sum(a * b for a, b in zip(vector, record["values"]))
+                scored.append((score, record))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return {"matches": [
+            {"id": r["id"], "score": s, "metadata": dict(r["metadata"]) if include_metadata else None, "values": []}
+            for s, r in scored[:top_k]
+        ]}
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.records), "dimension": EMBEDDING_DIM}
+
+# ---------------------------------------------------------------------------
+# Replicate, S3
+# ---------------------------------------------------------------------------
+
+class FakePredictions:
+    """client.predictions stand-in: a prediction succeeds `latency` seconds after creation."""
+
+    def __init__(self, owner: "FakeReplicateClient"):
+        self.owner = owner
+        self._predictions: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    def _view(self, record: Dict[str, Any]) -> SimpleNamespace:
+        elapsed = time.time() - record["created"]
+        if record["canceled"]:
+            status, output, logs = "canceled", None, ""
+        elif elapsed >= self.owner.latency:
+            status, output, logs = "succeeded", record["output"], "100%|##########| 28/28"
+        else:
+            percent = int(elapsed / self.owner.latency * 100) if self.owner.latency else 0
+            status, output, logs = "processing", None, f"{percent}%|#         | {percent * 28 // 100}/28"
+        return SimpleNamespace(id=record["id"], status=status, output=output, error=None, logs=logs)
+
+    def create(self, model: str = None, input: Dict[str, Any] = None, **kwargs) -> SimpleNamespace:
+        with self.owner._lock:
+            self.owner.calls += 1
+            prediction_id = f"bench-{next(self._ids)}-{hashlib.sha1(os.urandom(8)).hexdigest()[:8]}"
+        record = {
+            "id": prediction_id,
+            "created": time.time(),
+            "output": self.owner.output_url(input),
+            "canceled": False,
+        }
+        self._predictions[prediction_id] = record
+        return SimpleNamespace(id=prediction_id, status="starting", output=None, error=None, logs="")
+
+    def get(self, prediction_id: str) -> SimpleNamespace:
+        return self._view(self._predictions[prediction_id])
+
+    def cancel(self, prediction_id: str):
+        self._predictions[prediction_id]["canceled"] = True
+
+class FakeReplicateClient:
+    """replicate.Client stand-in: run() / predictions return a deterministic output URL after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.predictions = FakePredictions(self)
+
+    @staticmethod
+    def output_url(input: Dict[str, Any] = None) -> str:
+        digest = hashlib.sha1(json.dumps(input or {}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return f"https://replicate.delivery/bench/{digest}/output.jpg"
+
+    def run(self, model: str, input: Dict[str, Any] = None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        _sleep(self.latency)
+        return self.output_url(input)
+
+class FakeS3Client:
+    """boto3 S3 client stand-in that keeps object sizes in memory."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.objects: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        _sleep(self.latency)
+        with self._lock:
+            self.objects[f"{Bucket}/{Key}"] = os.path.getsize(Filename)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        _sleep(self.latency)
+        size = len(Fileobj.read())
+        with self._lock:
+            self.objects[f"{Bucket}/{Key}"] = size
+
+    def head_object(self, Bucket, Key, **kwargs):
+        from botocore.exceptions import ClientError
+
+        _sleep(self.latency / 4)
+        with self._lock:
+            size = self.objects.get(f"{Bucket}/{Key}")
+        if size is None:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": size}
+
+# ---------------------------------------------------------------------------
+# HTTP: image downloads + Shopify Admin GraphQL
+# ---------------------------------------------------------------------------
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, content: bytes = b"", headers: Dict[str, str] = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+    def iter_content(self, chunk_size: int = 8192):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FakeShopify:
+    """Answers the Admin GraphQL operations the Shopify agent sends."""
+
+    def __init__(self):
+        self._ids = itertools.count(9_000_000_000)
+        self._lock = threading.Lock()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.variants: Dict[str, List[Dict[str, Any]]] = {}
+        self.published: set = set()
+        self.operations: Dict[str, int] = {}
+        # Query cost bucket, reported in extensions.cost like the real Admin API
+        self.bucket_size = 1000.0
+        self.restore_rate = 50.0
+        self.query_cost = 10
+        self._available = self.bucket_size
+        self._refilled_at = time.monotonic()
+        # Bulk operations: staged variable files, and result files by URL
+        self.staged_files: Dict[str, bytes] = {}
+        self.bulk_operations: Dict[str, Dict[str, Any]] = {}
+        self.bulk_results: Dict[str, bytes] = {}
+
+    def _next_id(self, kind: str) -> str:
+        with self._lock:
+            return f"gid://shopify/{kind}/{next(self._ids)}"
+
+    def _count(self, op: str):
+        with self._lock:
+            self.operations[op] = self.operations.get(op, 0) + 1
+
+    def execute(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.bucket_size, self._available + (now - self._refilled_at) * self.restore_rate)
+            self._refilled_at = now
+            throttled = self._available < self.query_cost
+            if not throttled:
+                self._available -= self.query_cost
+            status = {"maximumAvailable": self.bucket_size, "currentlyAvailable": self._available,
+                      "restoreRate": self.restore_rate}
+        if throttled:
+            self._count("throttled")
+            body = {"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}]}
+        else:
+            body = self._answer(query, variables or {})
+        body["extensions"] = {"cost": {"requestedQueryCost": self.query_cost,
+                                       "actualQueryCost": None if throttled else self.query_cost,
+                                       "throttleStatus": status}}
+        return body
+
+    STAGED_UPLOAD_URL = "https://shopify-staged-uploads.test/upload"
+
+    def _run_bulk(self, mutation: str, staged_path: str) -> Dict[str, Any]:
+        """Run every line of a staged JSONL file through `mutation`; finishes on the second poll."""
+        lines = self.staged_files.get(staged_path, b"").decode("utf-8").splitlines()
+        results = []
+        for number, line in enumerate(l for l in lines if l.strip()):
+            body = self._answer(mutation, json.loads(line))
+            results.append(json.dumps({**body, "__lineNumber": number}))
+        return self._store_bulk(results)
+
+    def _export_products(self) -> Dict[str, Any]:
+        """bulkOperationRunQuery over products: one line per product, then its variants with __parentId."""
+        results = []
+        with self._lock:
+            for product_id, product in self.products.items():
+                online_url = (f"https://bench.myshopify.com/products/{product['handle']}"
+                              if product_id in self.published else None)
+                results.append(json.dumps({"id": product_id, "handle": product["handle"], "onlineStoreUrl": online_url}))
+                for variant in self.variants.get(product_id, []):
+                    results.append(json.dumps({"id": variant["id"], "sku": variant.get("sku"), "__parentId": product_id}))
+        return self._store_bulk(results)
+
+    def _store_bulk(self, results: List[str]) -> Dict[str, Any]:
+        operation_id = self._next_id("BulkOperation")
+        url = f"https://shopify-bulk-results.test/{operation_id.rsplit('/', 1)[-1]}.jsonl"
+        with self._lock:
+            self.bulk_results[url] = ("\n".join(results) + "\n").encode("utf-8")
+            self.bulk_operations[operation_id] = {"id": operation_id, "objectCount": str(len(results)),
+                                                  "url": url, "polls": 0}
+        return {"id": operation_id, "status": "CREATED"}
+
+    def _bulk_status(self, operation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            operation = self.bulk_operations.get(operation_id)
+            if operation is None:
+                return None
+            operation["polls"] += 1
+            done = operation["polls"] > 1
+        return {"id": operation_id, "status": "COMPLETED" if done else "RUNNING", "errorCode": None,
+                "objectCount": operation["objectCount"] if done else "0",
+                "url": operation["url"] if done else None, "partialDataUrl": None}
+
+    def _answer(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        if "bulkOperationRunQuery" in query:
+            self._count("bulkOperationRunQuery")
+            return {"data": {"bulkOperationRunQuery": {"bulkOperation": self._export_products(), "userErrors": []}}}
+        if "bulkOperationRunMutation" in query:
+            self._count("bulkOperationRunMutation")
+            operation = self._run_bulk(variables.get("mutation", ""), variables.get("stagedUploadPath", ""))
+            return {"data": {"bulkOperationRunMutation": {"bulkOperation": operation, "userErrors": []}}}
+        if "stagedUploadsCreate" in query:
+            self._count("stagedUploadsCreate")
+            key = f"tmp/bulk/{self._next_id('StagedUpload').rsplit('/', 1)[-1]}/bulk_op_vars.jsonl"
+            target = {"url": self.STAGED_UPLOAD_URL, "resourceUrl": None, "parameters": [
+                {"name": "key", "value": key}, {"name": "Content-Type", "value": "text/jsonl"}
+            ]}
+            return {"data": {"stagedUploadsCreate": {"stagedTargets": [target], "userErrors": []}}}
+        if "node(id" in query:
+            self._count("bulkOperationStatus")
+            return {"data": {"node": self._bulk_status(variables.get("id"))}}
+        if "publishablePublish" in query:
+            self._count("publishablePublish")
+            product = self.products.get(variables.get("id"), {"id": variables.get("id"), "handle": "product"})
+            with self._lock:
+                self.published.add(product["id"])
+            publishable = {**product, "onlineStoreUrl": f"https://bench.myshopify.com/products/{product.get('handle')}"}
+            return {"data": {"publishablePublish": {"publishable": publishable, "userErrors": []}}}
+        if "productSet" in query:
+            self._count("productSet")
+            product_input = variables.get("input", {})
+            product_id = (variables.get("identifier") or {}).get("id")
+            if product_id and product_id not in self.products:
+                return {"data": {"productSet": {"product": None, "userErrors": [
+                    {"field": ["identifier", "id"], "message": "Product does not exist", "code": "PRODUCT_DOES_NOT_EXIST"}
+                ]}}}
+            product_id = product_id or self._next_id("Product")
+            title = product_input.get("title", "Product")
+            handle = self.products.get(product_id, {}).get("handle") or re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+            variants = self.variants.get(product_id) or [
+                {"id": self._next_id("ProductVariant"), "sku": v.get("inventoryItem", {}).get("sku"), "price": v.get("price"),
+                 "available": 0}
+                for v in product_input.get("variants", [])
+            ]
+            # Like the real productSet, stock only changes where inventoryQuantities are sent
+            for variant, variant_input in zip(variants, product_input.get("variants", [])):
+                for quantity in variant_input.get("inventoryQuantities") or []:
+                    if quantity.get("name") == "available":
+                        variant["available"] = quantity.get("quantity", 0)
+            product = {"id": product_id, "title": title, "handle": handle}
+            with self._lock:
+                self.products[product_id] = product
+                self.variants[product_id] = variants
+            return {"data": {"productSet": {"product": {**product, "variants": {"nodes": variants}}, "userErrors": []}}}
+        if "productVariantsBulkCreate" in query:
+            self._count("productVariantsBulkCreate")
+            variants = [{"id": self._next_id("ProductVariant"), "sku": v.get("inventoryItem", {}).get("sku")}
+                        for v in variables.get("variants", [])]
+            with self._lock:
+                self.variants[variables.get("productId")] = variants
+            return {"data": {"productVariantsBulkCreate": {"productVariants": variants, "userErrors": []}}}
+        if "productCreate" in query:
+            self._count("productCreate")
+            product_id = self._next_id("Product")
+            title = variables.get("input", {}).get("title", "Product")
+            handle = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+            with self._lock:
+                self.products[product_id] = {"id": product_id, "title": title, "handle": handle}
+            return {"data": {"productCreate": {"product": {"id": product_id, "title": title}, "userErrors": []}}}
+        if "publications(" in query or "locations(" in query:
+            data = {}
+            if "publications(" in query:
+                self._count("publications")
+                data["publications"] = {"edges": [
+                    {"node": {"id": "gid://shopify/Publication/1", "name": "Online Store"}},
+                    {"node": {"id": "gid://shopify/Publication/2", "name": "Point of Sale"}}
+                ]}
+            if "locations(" in query:
+                self._count("locations")
+                data["locations"] = {"edges": [{"node": {"id": "gid://shopify/Location/1", "name": "Warehouse"}}]}
+            return {"data": data}
+        if "product(id" in query:
+            self._count("product")
+            product = self.products.get(variables.get("id"), {"id": variables.get("id"), "handle": "product"})
+            return {"data": {"product": {**product, "onlineStoreUrl": f"https://bench.myshopify.com/products/{product.get('handle')}"}}}
+        self._count("unknown")
+        return {"errors": [{"message": "Unsupported operation in benchmark stand-in"}]}
+
+class FakeHTTPSession:
+    """requests.Session stand-in: GET serves generated JPEGs, POST serves Shopify GraphQL (and staged uploads)."""
+
+    def __init__(self, image_size=(1600, 1200), image_latency: float = 0.01, shopify_latency: float = 0.05):
+        self.image_size = tuple(image_size)
+        self.image_latency = image_latency
+        self.shopify_latency = shopify_latency
+        self.shopify = FakeShopify()
+        self._image_bytes = None
+        self._lock = threading.Lock()
+
+    def image_bytes(self) -> bytes:
+        with self._lock:
+            if self._image_bytes is None:
+                self._image_bytes = make_jpeg(self.image_size)
+            return self._image_bytes
+
+    def get(self, url, timeout=None, stream=False, headers=None, **kwargs):
+        if url in self.shopify.bulk_results:
+            _sleep(self.shopify_latency)
+            return FakeResponse(200, self.shopify.bulk_results[url], {"Content-Type": "application/jsonl"})
+        _sleep(self.image_latency)
+        content = self.image_bytes()
+        match = re.match(r"bytes=(\d+)-(\d*)", (headers or {}).get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else len(content)
+            return FakeResponse(206, content[start:end], {"Content-Type": "image/jpeg"})
+        return FakeResponse(200, content, {"Content-Type": "image/jpeg"})
+
+    def post(self, url, headers=None, json=None, data=None, timeout=None, **kwargs):
+        import json as json_module
+        _sleep(self.shopify_latency)
+        if url == FakeShopify.STAGED_UPLOAD_URL:
+            self.shopify.staged_files[data["key"]] = kwargs["files"]["file"][1]
+            return FakeResponse(201, b"")
+        payload = json if json is not None else json_module.loads(data or "{}")
+        if "graphql" in url:
+            body = self.shopify.execute(payload.get("query", ""), payload.get("variables"))
+            return FakeResponse(200, json_module.dumps(body).encode("utf-8"), {"Content-Type": "application/json"})
+        return FakeResponse(404, b"{}")
+
+    def close(self):
+        pass
+
+def make_jpeg(size=(1600, 1200), quality: int = 85) -> bytes:
+    """A noisy gradient JPEG of `size` (compresses like a real product photo, not a flat fill)."""
+    from PIL import Image
+    width, height = size
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+# ---------------------------------------------------------------------------
+# Installation
+# ---------------------------------------------------------------------------
+
+def install_stand_ins(cfg: StandInConfig = None) -> Dict[str, Any]:
+    """
+    Route every external dependency of the graph to a local stand-in.
+
+    Must run before the graph's nodes are first executed. Returns the stand-in
+    objects so callers can inspect them (call counts, stored objects, ...).
+    """
+    import config
+    from langgraph_workflow.utils.clients import reset_clients, set_client
+    from langgraph_workflow.utils.llm_registry import set_chat_model_factory
+
+    cfg = cfg or StandInConfig()
+
+    # S3 uploads are skipped unless a real-looking bucket is configured
+    config.S3_BUCKET_NAME = cfg.s3_bucket
+    # Every pass must pay for its publishes; with the SKU index a warmup pass
+    # would leave the measured passes nothing but "unchanged" skips
+    config.SHOPIFY_INDEX_ENABLED = False
+
+    stand_ins = {
+        "openai": FakeOpenAIClient(cfg.embedding_latency),
+        "pinecone_index": InMemoryVectorIndex.from_catalog(cfg.catalog_path, cfg.vector_query_latency),
+        "replicate": FakeReplicateClient(cfg.replicate_latency),
+        f"s3:{config.AWS_REGION}": FakeS3Client(cfg.s3_latency),
+        "http": FakeHTTPSession(cfg.image_size, cfg.image_fetch_latency, cfg.shopify_latency),
+    }
+    reset_clients()
+    for name, client in stand_ins.items():
+        set_client(name, client)
+
+    set_chat_model_factory(lambda purpose, settings: FakeChatModel(
+        purpose=purpose,
+        model_name=settings.get("model", "fake-gpt"),
+        latency=cfg.llm_latency,
+        token_latency=cfg.llm_token_latency
+    ))
+    return stand_ins
+
+def add_stand_in_arguments(parser):
+    """Latency / size flags shared by the benchmark scripts."""
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0, help="Extra seconds per completion token")
+    parser.add_argument("--replicate-latency", type=float, default=0.2, help="Seconds per fake Replicate run")
+    parser.add_argument("--shopify-latency", type=float, default=0.05, help="Seconds per fake Shopify GraphQL call")
+    parser.add_argument("--image-size", default="1600x1200", help="Size of images served by the fake CDN (WxH)")
+
+def stand_in_config_from_args(args) -> StandInConfig:
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    return StandInConfig(
+        llm_latency=args.llm_latency,
+        llm_token_latency=args.llm_token_latency,
+        replicate_latency=args.replicate_latency,
+        shopify_latency=args.shopify_latency,
+        image_size=(width, height),
+    )
@@ -1,21 +1,41 @@
 # langgraph_workflow/graph_build.py
 
+import importlib
+import threading
 from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import InMemorySaver
+from langgraph_workflow.utils.metrics import instrument_node
 
-# Import all node functions
-from .nodes.rag_search import rag_search_node
-from .nodes.metadata_filter_search import metadata_filter_search_node
-from .nodes.planning import planning_node
-from .nodes.gpt4_chat import gpt4_chat_node
-from .nodes.shopify_agent import shopify_agent_node
-from .nodes.filter_search_results import filter_search_results_node
-from .nodes.image_agent import image_agent_node
-from .nodes.standalone_image_agent import standalone_image_agent_node
-from .nodes.listing_database import listing_database_node
+def _lazy_node(module_name: str, attr: str):
+    """
+    Return a node callable that imports its implementation on first call.
+    Node modules pull in boto3, replicate, PIL and the OpenAI SDKs, so they are
+    only loaded when a conversation actually reaches them.
+    """
+    target = None
+
+    def node(state):
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(module_name, __package__), attr)
+        return target(state)
+
+    node.__name__ = attr
+    return node
+
+# Node functions (imported lazily)
+rag_search_node = _lazy_node(".nodes.rag_search", "rag_search_node")
+metadata_filter_search_node = _lazy_node(".nodes.metadata_filter_search", "metadata_filter_search_node")
+planning_node = _lazy_node(".nodes.planning", "planning_node")
+gpt4_chat_node = _lazy_node(".nodes.gpt4_chat", "gpt4_chat_node")
+shopify_agent_node = _lazy_node(".nodes.shopify_agent", "shopify_agent_node")
+filter_search_results_node = _lazy_node(".nodes.filter_search_results", "filter_search_results_node")
+image_agent_node = _lazy_node(".nodes.image_agent", "image_agent_node")
+standalone_image_agent_node = _lazy_node(".nodes.standalone_image_agent", "standalone_image_agent_node")
+listing_database_node = _lazy_node(".nodes.listing_database", "listing_database_node")
 
 # Define the LangGraph state
 class GraphState(TypedDict):
@@ -54,8 +74,8 @@ def decide_search_strategy_node(state: GraphState):
     metadata_fields = [
          "category_code", "weight", "length", "width", "height", "weight_kg", "length_cm", "width_cm", "height_cm", "sku", "main_image_url", "US", "EU",  "material", "scene"
     ]
-    from langchain_community.chat_models import ChatOpenAI
-    llm = ChatOpenAI(model="gpt-4o")
+    from .utils.llm_registry import get_llm
+    llm = get_llm("search_strategy")
     prompt = (
         f"Here is the full conversation so far:\n{history}\n\n"
         f"Available metadata fields: {metadata_fields}\n"
@@ -78,16 +98,16 @@ def decide_search_strategy_node(state: GraphState):
 
 def create_graph():
     builder = StateGraph(GraphState)
-    builder.add_node("planning", planning_node)
-    builder.add_node("gpt4_chat", gpt4_chat_node)
-    builder.add_node("decide_search_strategy", decide_search_strategy_node)
-    builder.add_node("rag_search", rag_search_node)
-    builder.add_node("metadata_filter_search", metadata_filter_search_node)
-    builder.add_node("shopify_agent", shopify_agent_node)
-    builder.add_node("filter_search_results", filter_search_results_node)
-    builder.add_node("image_agent", image_agent_node)
-    builder.add_node("standalone_image_agent", standalone_image_agent_node)
-    builder.add_node("listing_database", listing_database_node)
+    builder.add_node("planning", instrument_node("planning", planning_node))
+    builder.add_node("gpt4_chat", instrument_node("gpt4_chat", gpt4_chat_node))
+    builder.add_node("decide_search_strategy", instrument_node("decide_search_strategy", decide_search_strategy_node))
+    builder.add_node("rag_search", instrument_node("rag_search", rag_search_node))
+    builder.add_node("metadata_filter_search", instrument_node("metadata_filter_search", metadata_filter_search_node))
+    builder.add_node("shopify_agent", instrument_node("shopify_agent", shopify_agent_node))
+    builder.add_node("filter_search_results", instrument_node("filter_search_results", filter_search_results_node))
+    builder.add_node("image_agent", instrument_node("image_agent", image_agent_node))
+    builder.add_node("standalone_image_agent", instrument_node("standalone_image_agent", standalone_image_agent_node))
+    builder.add_node("listing_database", instrument_node("listing_database", listing_database_node))
     
     # Simplified routing: Planning node routes directly to appropriate service
     def plan_route(state):
@@ -146,5 +166,20 @@ def create_graph():
     saver = InMemorySaver()
     return builder.compile(checkpointer=saver)
 
-# Expose the compiled graph for LangGraph CLI
-graph = create_graph()
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """Return the process-wide compiled graph, compiling it on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = create_graph()
+    return _graph
+
+def __getattr__(name):
+    # Expose the compiled graph for LangGraph CLI without compiling at import time
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
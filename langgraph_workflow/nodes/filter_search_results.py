@@ -1,5 +1,5 @@
 from langchain_core.messages import HumanMessage
-from langchain_community.chat_models import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
 import json
 
 def filter_search_results_node(state):
@@ -39,7 +39,7 @@ def filter_search_results_node(state):
     print(f"🔍 [Filter Node] User query: {user_query}")
     print(f"🔍 [Filter Node] Number of search results: {len(search_results)}")
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3, request_timeout=15)
+    llm = get_llm("filter_results")
     prompt = f"""
 You are an expert e-commerce assistant. The user wants to list a product on Shopify.
 
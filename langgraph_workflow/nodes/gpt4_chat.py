@@ -1,4 +1,4 @@
-from langchain_community.chat_models import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph_workflow.utils.helpers import detect_language
 
@@ -54,7 +54,7 @@ Please:
 - Briefly summarize what happened,
 - Offer helpful next steps (e.g., retry, clarify, try a different action).
 """
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
+        llm = get_llm("chat_fallback")
         response = llm.invoke(prompt)
         return {"messages": [AIMessage(content=response.content)]}
     
@@ -243,7 +243,7 @@ NEXT STEPS SUGGESTIONS:
 
 Please respond to the user's query using the information provided above:"""
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
+    llm = get_llm("chat")
     response = llm.invoke(prompt)
     
     return {"messages": [AIMessage(content=response.content)]} 
\ No newline at end of file
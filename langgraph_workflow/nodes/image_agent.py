@@ -2,15 +2,38 @@ import os
 import time
 import json
 import tempfile
+import threading
+import unicodedata
 import requests
-import boto3
-import uuid
 from typing import Dict, List, Any, Optional
-import replicate
 from langchain_core.messages import HumanMessage, AIMessage
-from botocore.exceptions import NoCredentialsError
 import config
-from langchain_openai import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
+from langgraph_workflow.utils.clients import get_replicate_client, get_storage
+from langgraph_workflow.utils.metrics import track
+from langgraph_workflow.utils.concurrency import run_bounded
+from langgraph_workflow.utils.image_jobs import cancel_job, submit_job, wait_for_job
+from langgraph_workflow.utils.edit_cache import edit_cache_key, file_source, get_cached_edit, url_source
+from langgraph_workflow.utils.image_preprocess import discard_preprocessed, preprocess_enabled, preprocess_image
+from langgraph_workflow.utils.storage import S3Storage
+
+def _edit_concurrency() -> int:
+    return getattr(config, "IMAGE_EDIT_CONCURRENCY", 4)
+
+def _edit_timeout() -> float:
+    return getattr(config, "IMAGE_EDIT_TIMEOUT", 180)
+
+REGENERATE_WORDS = ["regenerate", "try again", "another version", "redo", "new version",
+                    "重新生成", "再生成", "重做", "再来一次", "换一个版本"]
+
+def wants_regenerate(user_query: str) -> bool:
+    """The user explicitly asked for a fresh result, so cached edits must not be reused."""
+    text = (user_query or "").lower()
+    return any(word in text for word in REGENERATE_WORDS)
+
+def _edit_async() -> bool:
+    """Return from the chat turn as soon as edits are submitted instead of waiting for them."""
+    return getattr(config, "IMAGE_EDIT_ASYNC", True)
 
 def select_products_for_image_modification(messages: List, search_results: List, user_query: str) -> List:
     """
@@ -62,7 +85,7 @@ def select_products_for_image_modification(messages: List, search_results: List,
     
     product_list_text = "\n".join(product_list)
     
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+    llm = get_llm("image_product_selection")
     
     prompt = f"""You are an expert at understanding user intent for image modification. Analyze the conversation and user query to determine which products should have their images modified.
 
@@ -143,7 +166,7 @@ def generate_replicate_prompt(user_instruction: str, conversation_context: str =
     """
     Use LLM to generate a concise English prompt for Replicate based on user request and context.
     """
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
+    llm = get_llm("replicate_prompt")
     
     # Build context information
     context_info = ""
@@ -212,12 +235,94 @@ Write the English prompt:"""
     response = llm.invoke(prompt)
     return response.content.strip()
 
+def is_english_text(text: str) -> bool:
+    """Local language check: True when the text has no non-ASCII letters or digits (e.g. no Chinese)."""
+    if not text or not text.strip():
+        return False
+    return not any(ord(char) > 127 and unicodedata.category(char)[0] in "LN" for char in text)
+
+def plan_image_edit(user_query: str, search_results: List[Dict], messages: List,
+                    previous_modifications: List[Dict] = None) -> Dict[str, Any]:
+    """
+    One structured LLM call for a product image edit: which SKU the user means
+    and the English Replicate prompt.
+    
+    Replaces the separate SKU identification, prompt generation and translation hops.
+    Earlier edits are listed under the product they were made to, so the prompt
+    for one product is only shaped by that product's own history.
+    
+    Returns:
+        {"sku": str or None, "replicate_prompt": str}
+    """
+    conversation_context = _build_conversation_context(messages, search_results)
+    edits_by_sku = {}
+    for mod in previous_modifications or []:
+        if mod.get('status') == 'success' and mod.get('sku'):
+            edits_by_sku.setdefault(mod['sku'], []).append(mod.get('instruction', 'Unknown'))
+    
+    prompt = f"""You help edit product photos. From the user's request, work out which product they mean and write the prompt for an AI image modification model.
+
+**Current User Query:** {user_query}
+
+**Conversation Context:**
+{conversation_context}
+
+**Available Products:**
+{_format_products_for_llm(search_results, edits_by_sku)}
+
+**Your Task:**
+1. "sku": the SKU the user is referring to, or "none" if you cannot tell
+   - Match colors, materials and types the user mentions ("黄色" = yellow, "亚麻" = linen, "凳子" = stool/chair)
+   - "这个"/"this" means the most recently discussed product; "第二个" means the second product; "最后这个" means the last one
+2. "replicate_prompt": a clear, concise ENGLISH prompt (1-2 sentences) for the image model
+   - Be specific about what should change and what must stay the same (keep the product unchanged unless asked)
+   - If the user is correcting an earlier edit (e.g. "为什么椅子在桌子上？", "the background is too dark"), use only the previous edits of the product you picked and describe the fix for the main issue only
+   - Example: "把这款椅子的背景改成咖啡店，带人，椅子保持不变" → "Replace the background with a coffee shop interior featuring people, while keeping the chair exactly as it is."
+
+**Response Format:**
+Return ONLY a JSON object, no explanations:
+{{"sku": "W1880115228", "replicate_prompt": "..."}}
+"""
+    
+    try:
+        llm = get_llm("image_edit_plan")
+        response = llm.invoke(prompt)
+        content = response.content.strip()
+        if content.startswith("```"):
+            content = content.strip("`").removeprefix("json").strip()
+        plan = json.loads(content)
+        
+        sku = str(plan.get("sku") or "").strip()
+        known_skus = {p.get('metadata', {}).get('sku') for p in search_results}
+        # Basic SKU validation, same as the old identification step
+        if sku.lower() == "none" or not (sku in known_skus or (len(sku) >= 8 and any(c.isdigit() for c in sku))):
+            sku = None
+        replicate_prompt = str(plan.get("replicate_prompt") or "").strip()
+        result = {
+            "sku": sku,
+            "replicate_prompt": replicate_prompt if is_english_text(replicate_prompt) else translate_instruction_to_english(replicate_prompt or user_query)
+        }
+        print(f"🧭 Image edit plan: {result}")
+        return result
+    except Exception as e:
+        print(f"⚠️ Image edit planning failed, falling back to separate steps: {e}")
+        return {
+            "sku": _identify_sku_with_llm(user_query, search_results, messages),
+            "replicate_prompt": translate_instruction_to_english(user_query)
+        }
+
 def translate_instruction_to_english(user_instruction: str) -> str:
     """
     Smart interpretation and prompt generation for Replicate API.
     Interprets user intent and creates detailed, professional prompts.
+    
+    Instructions that are already English (e.g. prompts from generate_replicate_prompt
+    or plan_image_edit) are returned unchanged without an LLM call.
     """
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+    if is_english_text(user_instruction):
+        return user_instruction
+    
+    llm = get_llm("translate_instruction")
     
     prompt = f"""You are an expert at interpreting user requests and creating detailed, professional prompts for image generation models.
 
@@ -270,148 +375,221 @@ class ImageProcessor:
     def __init__(self, bucket_name: str = None, region: str = None):
         self.bucket_name = bucket_name or config.S3_BUCKET_NAME
         self.region = region or config.AWS_REGION
-        
-        # Create S3 client with credentials from config
-        if self.bucket_name and self.bucket_name != "your-image-bucket":
-            self.s3_client = boto3.client(
-                "s3", 
-                region_name=self.region,
-                aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY
-            )
-        else:
-            self.s3_client = None
-            
-        self.replicate_client = replicate.Client(api_token=config.REPLICATE_API_TOKEN)
+        self.replicate_client = get_replicate_client()
     
     def upload_to_s3(self, image_path: str, object_name: Optional[str] = None) -> str:
         """
-        Uploads an image to AWS S3 and returns the public URL.
+        Uploads an image to the shared storage (S3) and returns the public URL.
+        
+        Objects are keyed by content hash, so a file that was uploaded before
+        only costs an existence check.
         """
-        if not self.bucket_name or self.bucket_name == "your-image-bucket":
+        storage = get_storage()
+        if storage is None:
             raise Exception("S3_BUCKET_NAME not configured")
-            
-        if object_name is None:
-            object_name = f"uploads/{uuid.uuid4()}_{os.path.basename(image_path)}"
+        
+        # botocore is only needed (and only installed) for the S3 backend
+        credential_errors = ()
+        if isinstance(storage, S3Storage):
+            from botocore.exceptions import NoCredentialsError
+            credential_errors = (NoCredentialsError,)
         
         try:
-            # Upload the file to S3
-            self.s3_client.upload_file(
-                image_path, 
-                self.bucket_name, 
-                object_name, 
-                ExtraArgs={"ACL": "public-read"}
-            )
-            
-            # Generate the public URL
-            url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_name}"
+            url = storage.put_file(image_path, key=object_name)
             print(f"✅ File uploaded successfully: {url}")
             return url
             
         except FileNotFoundError:
             raise Exception("The file was not found.")
-        except NoCredentialsError:
+        except credential_errors:
             raise Exception("AWS credentials not available.")
         except Exception as e:
             raise Exception(f"Upload failed: {e}")
     
-    def process_local_image(self, image_path: str, instruction: str, output_format: str = "jpg") -> Dict[str, Any]:
+    def process_local_image(self, image_path: str, instruction: str, output_format: str = "jpg",
+                            use_cache: bool = True) -> Dict[str, Any]:
         """
-        Process a local image: upload to S3, modify with Replicate, return results.
+        Process a local image: preprocess, upload to S3, modify with Replicate, return results.
+        
+        use_cache=False forces a new Replicate run (e.g. the user asked to regenerate).
         """
         print(f"🎨 Processing local image: {image_path}")
         print(f"🎨 Instruction: {instruction}")
+        return self._edit_local_image(image_path, instruction, output_format, use_cache, wait=True)
+    
+    def submit_local_image(self, image_path: str, instruction: str, output_format: str = "jpg",
+                           use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Upload a local image to S3 and start its Replicate edit without waiting for it.
+        """
+        print(f"🎨 Submitting local image: {image_path}")
+        return self._edit_local_image(image_path, instruction, output_format, use_cache, wait=False)
+    
+    def _edit_local_image(self, image_path: str, instruction: str, output_format: str, use_cache: bool, wait: bool) -> Dict[str, Any]:
+        # Uploads are cached by content, so a re-uploaded file skips both S3 and Replicate
+        source = file_source(image_path)
+        english_instruction = translate_instruction_to_english(instruction)
+        if use_cache:
+            cached = self._cached_result(source, None, instruction, english_instruction, output_format, image_path)
+            if cached:
+                return cached
         
-        # Step 1: Upload to S3
+        # Step 1: Fix orientation and shrink to the model's working resolution
+        prepared = None
+        if preprocess_enabled():
+            try:
+                prepared = preprocess_image(image_path)
+            except Exception as e:
+                # PIL could not read it (unsupported or truncated file); Replicate may still manage
+                print(f"⚠️ Image pre-processing failed, uploading the original: {e}")
+        
+        # Step 2: Upload to S3
         print("📤 Uploading image to S3...")
-        original_url = self.upload_to_s3(image_path)
+        try:
+            original_url = self.upload_to_s3(prepared["path"] if prepared else image_path)
+        finally:
+            if prepared:
+                discard_preprocessed(prepared)
         
-        # Step 2: Process with Replicate
-        return self._process_with_replicate(original_url, instruction, output_format, image_path)
+        # Step 3: Process with Replicate (cache already checked above)
+        edit = self._process_with_replicate if wait else self.submit_edit
+        result = edit(original_url, instruction, output_format, image_path,
+                      source=source, english_instruction=english_instruction, use_cache=False)
+        if prepared:
+            result["input_image"] = {key: prepared[key] for key in
+                                     ("width", "height", "format", "bytes", "original_width", "original_height", "original_bytes")}
+        return result
     
-    def process_url_image(self, image_url: str, instruction: str, output_format: str = "jpg") -> Dict[str, Any]:
+    def process_url_image(self, image_url: str, instruction: str, output_format: str = "jpg",
+                          use_cache: bool = True, english_instruction: str = None) -> Dict[str, Any]:
         """
         Process an existing image URL with Replicate.
+        
+        english_instruction: Replicate prompt if the caller already has one (skips translation)
         """
         print(f"🎨 Processing URL image: {image_url}")
         print(f"🎨 Instruction: {instruction}")
         
-        return self._process_with_replicate(image_url, instruction, output_format)
+        return self._process_with_replicate(image_url, instruction, output_format,
+                                            english_instruction=english_instruction, use_cache=use_cache)
     
-    def _process_with_replicate(self, image_url: str, instruction: str, output_format: str = "jpg", original_file: str = None) -> Dict[str, Any]:
+    def _cached_result(self, source: str, image_url: Optional[str], instruction: str, english_instruction: str,
+                       output_format: str, original_file: str = None) -> Optional[Dict[str, Any]]:
+        """Successful result built from the edit cache, or None on a miss."""
+        entry = get_cached_edit(edit_cache_key(source, english_instruction, output_format))
+        if not entry:
+            return None
+        result = {
+            "original_url": image_url or entry.get("source_url"),
+            "modified_url": entry["modified_url"],
+            "instruction": instruction,
+            "english_instruction": english_instruction,
+            "status": "success",
+            "cached": True,
+            "timestamp": time.time()
+        }
+        if original_file:
+            result["original_file"] = original_file
+        return result
+    
+    def submit_edit(self, image_url: str, instruction: str, output_format: str = "jpg",
+                    original_file: str = None, metadata: Dict[str, Any] = None, source: str = None,
+                    english_instruction: str = None, use_cache: bool = True) -> Dict[str, Any]:
         """
-        Process image with Replicate (internal method).
+        Start a Replicate edit without waiting for it.
+        
+        Args:
+            source: Edit cache source (defaults to the image URL)
+            english_instruction: Already translated instruction, if the caller has it
+            use_cache: False skips the cache lookup (the new result still replaces the cached one)
+        
+        Returns:
+            A "pending" result carrying the image job ID (see utils/image_jobs.py),
+            or a "success" result straight from the edit cache
+        """
+        # Translate instruction to English for Replicate API
+        english_instruction = english_instruction or translate_instruction_to_english(instruction)
+        source = source or url_source(image_url)
+        if use_cache:
+            cached = self._cached_result(source, image_url, instruction, english_instruction, output_format, original_file)
+            if cached:
+                return cached
+        
+        # Use Flux Kontext Pro model with correct parameters
+        input_data = {
+            "prompt": english_instruction,
+            "input_image": image_url,
+            "output_format": output_format
+        }
+        print(f"🎨 Replicate input data: {input_data}")
+        
+        job = submit_job(input_data, metadata={
+            **(metadata or {}),
+            "original_file": original_file,
+            "cache_key": edit_cache_key(source, english_instruction, output_format)
+        })
+        result = {
+            "original_url": image_url,
+            "modified_url": None,
+            "instruction": instruction,
+            "english_instruction": english_instruction,
+            "status": "pending",
+            "job_id": job["id"],
+            "timestamp": time.time()
+        }
+        if original_file:
+            result["original_file"] = original_file
+        return result
+    
+    def _process_with_replicate(self, image_url: str, instruction: str, output_format: str = "jpg", original_file: str = None,
+                                source: str = None, english_instruction: str = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Process image with Replicate (internal method): submit the edit and wait for it.
         """
         print("🔄 Processing with Replicate...")
+        result = {
+            "original_url": image_url,
+            "modified_url": None,
+            "instruction": instruction,
+            "timestamp": time.time()
+        }
+        if original_file:
+            result["original_file"] = original_file
+        
         try:
-            # Translate instruction to English for Replicate API
-            english_instruction = translate_instruction_to_english(instruction)
+            pending = self.submit_edit(image_url, instruction, output_format, original_file,
+                                       source=source, english_instruction=english_instruction, use_cache=use_cache)
+            if pending["status"] != "pending":
+                return pending
+            with track("replicate", "flux-kontext-pro"):
+                job = wait_for_job(pending["job_id"], timeout=_edit_timeout())
+            result["english_instruction"] = pending["english_instruction"]
             
-            # Use Flux Kontext Pro model with correct parameters
-            input_data = {
-                "prompt": english_instruction,
-                "input_image": image_url,
-                "output_format": output_format
-            }
+            if job["status"] == "succeeded":
+                modified_url = job["output_url"]
+                print(f"✅ Image processing complete!")
+                print(f"✅ Modified image URL: {modified_url}")
+                result.update({"modified_url": modified_url, "status": "success", "timestamp": time.time()})
+                return result
             
-            print(f"🎨 Replicate input data: {input_data}")
-            
-            # Run the model with correct parameters
-            output = self.replicate_client.run(
-                "black-forest-labs/flux-kontext-pro",
-                input=input_data
-            )
-            
-            # Convert FileOutput to string URL
-            if hasattr(output, 'url'):
-                modified_url = str(output.url)
-            elif isinstance(output, str):
-                modified_url = output
-            elif isinstance(output, list) and len(output) > 0:
-                modified_url = str(output[0])
-            else:
-                modified_url = str(output)
-            
-            print(f"✅ Image processing complete!")
-            print(f"✅ Modified image URL: {modified_url}")
-            
-            result = {
-                "original_url": image_url,
-                "modified_url": modified_url,
-                "instruction": instruction,
-                "english_instruction": english_instruction,
-                "status": "success",
-                "timestamp": time.time()
-            }
-            
-            if original_file:
-                result["original_file"] = original_file
-            
-            return result
+            if job["status"] not in ("failed", "canceled"):
+                cancel_job(job["id"])
+                raise Exception(f"Replicate prediction {job['id']} did not finish within {_edit_timeout():.0f}s")
+            raise Exception(job["error"] or f"Replicate prediction {job['status']}")
             
         except Exception as e:
             print(f"❌ Replicate processing failed: {e}")
-            result = {
-                "original_url": image_url,
-                "modified_url": None,
-                "instruction": instruction,
-                "status": "error",
-                "error": str(e),
-                "timestamp": time.time()
-            }
-            
-            if original_file:
-                result["original_file"] = original_file
-            
+            result.update({"status": "error", "error": str(e), "timestamp": time.time()})
             return result
 
 class ImageAgent:
     def __init__(self):
-        self.replicate_client = replicate.Client(api_token=config.REPLICATE_API_TOKEN)
+        self.replicate_client = get_replicate_client()
         self.image_processor = ImageProcessor()
         self.modified_images_storage = {}  # In-memory storage for demo
     
-    def modify_image(self, image_url: str, instruction: str, output_format: str = "jpg") -> Dict[str, Any]:
+    def modify_image(self, image_url: str, instruction: str, output_format: str = "jpg", use_cache: bool = True,
+                     english_instruction: str = None) -> Dict[str, Any]:
         """
         Modify an image based on text instruction using Replicate's Flux model
         
@@ -419,35 +597,65 @@ class ImageAgent:
             image_url: URL of the source image
             instruction: Text instruction for modification (e.g., "Make this a 90s cartoon", "Change background to coffee shop")
             output_format: Output format (jpg, png, etc.)
+            use_cache: False forces a new run instead of reusing an identical earlier edit
+            english_instruction: Ready-made English Replicate prompt (skips translation)
             
         Returns:
             Dict containing modified image URL and metadata
         """
-        return self.image_processor.process_url_image(image_url, instruction, output_format)
+        return self.image_processor.process_url_image(image_url, instruction, output_format, use_cache, english_instruction)
     
-    def batch_modify_images(self, images: List[Dict], instruction: str) -> List[Dict]:
+    def batch_modify_images(self, images: List[Dict], instruction: str,
+                            cancel_event: Optional[threading.Event] = None, use_cache: bool = True) -> List[Dict]:
         """
-        Modify multiple images with the same instruction
+        Modify multiple images with the same instruction, several at a time
         
         Args:
             images: List of image dictionaries with 'url' and 'sku' keys
             instruction: Text instruction for modification
+            cancel_event: Set it to stop edits that have not finished yet
+            use_cache: False forces new runs instead of reusing identical earlier edits
             
         Returns:
-            List of modification results
+            List of modification results, in the order of `images`
         """
-        results = []
+        jobs = []
         for image_info in images:
-            image_url = image_info.get('url')
-            sku = image_info.get('sku', 'unknown')
-            
-            if image_url:
-                print(f"🎨 Image Agent: Processing image for SKU: {sku}")
-                result = self.modify_image(image_url, instruction)
-                result['sku'] = sku
-                results.append(result)
+            if image_info.get('url'):
+                jobs.append(image_info)
+            else:
+                print(f"⚠️ Image Agent: No URL found for SKU: {image_info.get('sku', 'unknown')}")
+        
+        def edit(image_info: Dict) -> Dict:
+            print(f"🎨 Image Agent: Processing image for SKU: {image_info.get('sku', 'unknown')}")
+            return self.modify_image(image_info['url'], instruction, use_cache=use_cache)
+        
+        def report(index: int, outcome: Dict):
+            print(f"🎨 Image Agent: SKU {jobs[index].get('sku', 'unknown')} finished ({outcome['status']})")
+        
+        outcomes = run_bounded(
+            edit, jobs,
+            max_workers=_edit_concurrency(),
+            timeout=_edit_timeout(),
+            cancel_event=cancel_event,
+            on_outcome=report
+        )
+        
+        results = []
+        for image_info, outcome in zip(jobs, outcomes):
+            if outcome["status"] == "success":
+                result = outcome["result"]
             else:
-                print(f"⚠️ Image Agent: No URL found for SKU: {sku}")
+                result = {
+                    "original_url": image_info['url'],
+                    "modified_url": None,
+                    "instruction": instruction,
+                    "status": "error",
+                    "error": outcome["error"],
+                    "timestamp": time.time()
+                }
+            result['sku'] = image_info.get('sku', 'unknown')
+            results.append(result)
         
         return results
 
@@ -456,7 +664,7 @@ def analyze_image_request(user_query: str, uploaded_files: List[Dict] = None) ->
     Analyze the user query to determine if it's an image modification request and what approach to use.
     """
     try:
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+        llm = get_llm("image_request_analysis")
         prompt = f"""You are an expert at analyzing user requests for image modification. ..."""
         response = llm.invoke(prompt)
         result = json.loads(response.content.strip())
@@ -591,6 +799,20 @@ This way I'll know which product you want to modify! 😊"""
         "awaiting_confirmation": False
     }
 
+def _pending_jobs_text(pending_results: List[Dict], instruction: str, is_chinese: bool) -> str:
+    """Chat reply for edits that were submitted but are still running."""
+    if is_chinese:
+        text = f"""⏳ **图片正在处理中**\n\n已提交 **{len(pending_results)} 张图片** 的修改任务：*\"{instruction}\"*\n\n"""
+        for i, result in enumerate(pending_results, 1):
+            text += f"- 图片 {i}: 任务 `{result['job_id']}` — 进度见 `/v1/image-jobs/{result['job_id']}`\n"
+        text += """\n完成后回复 **\"是\"** 将修改后的图片加入上架准备数据库，或回复 **\"否\"** 放弃。"""
+    else:
+        text = f"""⏳ **Image Edits Started**\n\nSubmitted **{len(pending_results)} image(s)** with your instruction: *\"{instruction}\"*\n\n"""
+        for i, result in enumerate(pending_results, 1):
+            text += f"- Image {i}: job `{result['job_id']}` — progress at `/v1/image-jobs/{result['job_id']}`\n"
+        text += """\nWhen they're done, reply **\"yes\"** to add the modified images to the listing preparation database, or **\"no\"** to discard them."""
+    return text
+
 def _process_local_files(agent: ImageAgent, state: Dict, analysis: Dict, user_query: str) -> Dict:
     """Process uploaded local files."""
     uploaded_files = analysis["files"]
@@ -625,37 +847,56 @@ def _process_local_files(agent: ImageAgent, state: Dict, analysis: Dict, user_qu
     )
     print(f"🎨 Generated Replicate prompt: {replicate_prompt}")
     
-    # Process each uploaded image with the generated prompt
+    # Process the uploaded images in parallel with the generated prompt
+    use_cache = not wants_regenerate(user_query)
+    jobs = [f for f in uploaded_files if f.get("path") and os.path.exists(f["path"])]
+    
+    def edit(file_info: Dict) -> Dict:
+        print(f"🎨 Processing image: {os.path.basename(file_info['path'])}")
+        if _edit_async():
+            return agent.image_processor.submit_local_image(file_info["path"], replicate_prompt, use_cache=use_cache)
+        return agent.image_processor.process_local_image(file_info["path"], replicate_prompt, use_cache=use_cache)
+    
+    def report(index: int, outcome: Dict):
+        print(f"✅ Finished image {index + 1}/{len(jobs)} ({outcome['status']})")
+    
+    outcomes = run_bounded(
+        edit, jobs,
+        max_workers=_edit_concurrency(),
+        timeout=_edit_timeout(),
+        on_outcome=report
+    )
+    
     results = []
-    for i, file_info in enumerate(uploaded_files, 1):
-        file_path = file_info.get("path")
-        if file_path and os.path.exists(file_path):
-            try:
-                print(f"🎨 Processing image {i}/{len(uploaded_files)}: {os.path.basename(file_path)}")
-                result = agent.image_processor.process_local_image(file_path, replicate_prompt)
-                # Store both the original user instruction and the generated prompt
-                result["user_instruction"] = user_instruction
-                result["replicate_prompt"] = replicate_prompt
-                results.append(result)
-                print(f"✅ Completed image {i}/{len(uploaded_files)}")
-            except Exception as e:
-                print(f"❌ Failed to process {file_path}: {e}")
-                results.append({
-                    "original_file": file_path,
-                    "status": "error",
-                    "error": str(e),
-                    "user_instruction": user_instruction,
-                    "replicate_prompt": replicate_prompt
-                })
+    for file_info, outcome in zip(jobs, outcomes):
+        if outcome["status"] == "success":
+            result = outcome["result"]
+        else:
+            print(f"❌ Failed to process {file_info['path']}: {outcome['error']}")
+            result = {
+                "original_file": file_info["path"],
+                "status": "error",
+                "error": outcome["error"]
+            }
+        # Store both the original user instruction and the generated prompt
+        result["user_instruction"] = user_instruction
+        result["replicate_prompt"] = replicate_prompt
+        results.append(result)
     
     # Create response based on user's language
     successful_results = [r for r in results if r.get("status") == "success"]
     failed_results = [r for r in results if r.get("status") == "error"]
+    pending_results = [r for r in results if r.get("status") == "pending"]
     
     # Detect if user is speaking Chinese
     is_chinese = any('\u4e00' <= char <= '\u9fff' for char in user_query)
     
-    if successful_results:
+    if pending_results:
+        response_text = _pending_jobs_text(pending_results, user_instruction, is_chinese)
+        if failed_results:
+            response_text += (f"\n**失败：** {len(failed_results)} 张图片处理失败。" if is_chinese
+                              else f"\n**Failed:** {len(failed_results)} images could not be processed.")
+    elif successful_results:
         if is_chinese:
             response_text = f"""🎨 **图片处理完成！**\n\n我已成功按照你的要求 *\"{user_instruction}\"* 处理了 **{len(successful_results)} 张图片**。\n\n**结果：**\n"""
             for i, result in enumerate(successful_results, 1):
@@ -702,8 +943,9 @@ def _process_product_images(agent: ImageAgent, state: Dict, modification_request
     """Process existing product images with SKU identification."""
     print("🎨 Image Agent: Processing product images with SKU identification")
     
-    # Use LLM to identify which specific product/SKU the user is referring to
-    identified_sku = _identify_sku_with_llm(user_query, search_results, state.get("messages", []))
+    # One LLM call: which product/SKU the user means + the English Replicate prompt
+    edit_plan = plan_image_edit(user_query, search_results, state.get("messages", []), state.get("modified_images", []))
+    identified_sku = edit_plan["sku"]
 
     if not identified_sku:
         # Could not identify a SKU at all
@@ -781,23 +1023,42 @@ Please select another product with an image for modification."""
             "awaiting_confirmation": False
         }
     
-    # Build conversation context for the image modification
-    conversation_context = _build_conversation_context(state.get("messages", []), [target_product])
-    
-    # Get previous modifications for this product
-    previous_modifications = []
     modified_images = state.get("modified_images", [])
-    for mod in modified_images:
-        if mod.get('sku') == identified_sku:
-            previous_modifications.append(mod)
     
     # Process the image
     try:
-        result = agent.modify_image(
-            image_url=image_url,
-            instruction=user_query,
-            output_format="jpg"
-        )
+        use_cache = not wants_regenerate(user_query)
+        if _edit_async():
+            result = agent.image_processor.submit_edit(image_url, user_query, "jpg", metadata={"sku": identified_sku},
+                                                       english_instruction=edit_plan["replicate_prompt"],
+                                                       use_cache=use_cache)
+        else:
+            result = agent.modify_image(
+                image_url=image_url,
+                instruction=user_query,
+                output_format="jpg",
+                use_cache=use_cache,
+                english_instruction=edit_plan["replicate_prompt"]
+            )
+        
+        if result.get('status') == 'pending':
+            new_modified_image = {
+                'sku': identified_sku,
+                'original_url': image_url,
+                'modified_url': None,
+                'instruction': user_query,
+                'status': 'pending',
+                'job_id': result['job_id']
+            }
+            is_chinese = any('\u4e00' <= char <= '\u9fff' for char in user_query)
+            response_text = _pending_jobs_text([result], user_query, is_chinese)
+            return {
+                **state,
+                "modified_images": modified_images + [new_modified_image],
+                "image_agent_response": response_text,
+                "messages": state.get("messages", []) + [AIMessage(content=response_text)],
+                "awaiting_confirmation": True
+            }
         
         if result.get('status') == 'success':
             # Successfully modified the image
@@ -966,12 +1227,8 @@ Example responses:
 - "none"
 """
 
-        # Initialize LLM
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            max_tokens=50
-        )
+        # Shared SKU-identification model (gpt-4o-mini, max 50 tokens)
+        llm = get_llm("sku_identification")
         
         # Get LLM response
         response = llm.invoke(prompt)
@@ -1016,8 +1273,8 @@ def _build_conversation_context(messages: List, search_results: List[Dict]) -> s
     return "\n".join(context_parts)
 
 
-def _format_products_for_llm(products: List[Dict]) -> str:
-    """Format products for LLM analysis."""
+def _format_products_for_llm(products: List[Dict], edits_by_sku: Dict[str, List[str]] = None) -> str:
+    """Format products for LLM analysis, with each product's earlier edit instructions if given."""
     if not products:
         return "No products available"
     
@@ -1048,6 +1305,8 @@ def _format_products_for_llm(products: List[Dict]) -> str:
         formatted.append(f"   Color: {color}")
         if characteristics and characteristics != 'N/A':
             formatted.append(f"   Characteristics: {characteristics[:100]}...")
+        for edit in (edits_by_sku or {}).get(sku, [])[-2:]:  # Last 2 edits of this product
+            formatted.append(f"   Previous edit: {edit}")
         formatted.append("")
     
     return "\n".join(formatted) 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_community.chat_models import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
 import json
 from typing import Dict, List, Any, Optional
 
@@ -10,7 +10,7 @@ class ProductSelectionIntentParser:
     """
     
     def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+        self.llm = get_llm("product_selection")
     
     def parse_product_selection(self, 
                               user_query: str, 
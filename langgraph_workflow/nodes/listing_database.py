@@ -1,11 +1,17 @@
 import json
 import os
-import requests
-from PIL import Image
-from io import BytesIO
+import sqlite3
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Any
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+import config
+from langgraph_workflow.utils.llm_registry import get_llm
+from langgraph_workflow.utils.clients import get_http_session
+from langgraph_workflow.utils.metrics import count_cache, track
+from langgraph_workflow.utils.image_probe import probe_image
+from langgraph_workflow.utils.image_compress import cached_compressed_image, compressed_image_url
+from langgraph_workflow.utils.image_jobs import resolve_modified_images
 from langchain.schema import AIMessage
 
 def extract_text_from_multimodal_content(content):
@@ -34,10 +40,21 @@ def extract_text_from_multimodal_content(content):
     
     return str(content)
 
+def download_image(image_url: str, timeout: int = 10):
+    """GET an image over the shared HTTP session; raises on HTTP errors."""
+    with track("image_fetch", "download") as call:
+        response = get_http_session().get(image_url, timeout=timeout)
+        response.raise_for_status()
+        call["response_bytes"] = len(response.content)
+    return response
+
 def validate_image_resolution(image_url: str, max_megapixels: int = 25) -> tuple[bool, str]:
     """
     Validate if an image exceeds the maximum resolution limit.
     
+    Only the image header is fetched (see utils/image_probe.py) and the result is
+    cached per URL, so repeated checks of the same image are free.
+    
     Args:
         image_url: URL of the image to validate
         max_megapixels: Maximum allowed megapixels (default 25)
@@ -46,13 +63,8 @@ def validate_image_resolution(image_url: str, max_megapixels: int = 25) -> tuple
         tuple: (is_valid, error_message)
     """
     try:
-        # Download the image
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        
-        # Open with PIL to get dimensions
-        img = Image.open(BytesIO(response.content))
-        width, height = img.size
+        info = probe_image(image_url)
+        width, height = info["width"], info["height"]
         
         # Calculate megapixels
         megapixels = (width * height) / 1_000_000
@@ -69,6 +81,9 @@ def resize_image_if_needed(image_url: str, max_megapixels: int = 25) -> tuple[st
     """
     Resize an image if it exceeds the maximum resolution limit.
     
+    The smaller copy is stored under a content-hash key and its URL is
+    remembered (see utils/image_compress.py), so each image is resized once.
+    
     Args:
         image_url: URL of the image to resize
         max_megapixels: Maximum allowed megapixels (default 25)
@@ -77,46 +92,22 @@ def resize_image_if_needed(image_url: str, max_megapixels: int = 25) -> tuple[st
         tuple: (resized_image_url, error_message)
     """
     try:
-        # Download the image
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        
-        # Open with PIL
-        img = Image.open(BytesIO(response.content))
-        width, height = img.size
+        # Images resized before are served from storage without fetching the original
+        compressed = cached_compressed_image(image_url, max_megapixels)
+        if compressed is None:
+            info = probe_image(image_url)
+            if (info["width"] * info["height"]) / 1_000_000 <= max_megapixels:
+                return image_url, "Image already within size limits"
+            compressed = compressed_image_url(image_url, max_megapixels)
+        if compressed is None:
+            return image_url, "Image exceeds size limits but no image storage is configured"
         
-        # Calculate megapixels
+        width, height = compressed["width"], compressed["height"]
+        new_width, new_height = compressed["new_width"], compressed["new_height"]
         megapixels = (width * height) / 1_000_000
-        
-        if megapixels <= max_megapixels:
-            return image_url, "Image already within size limits"
-        
-        # Calculate new dimensions to fit within max_megapixels
-        ratio = (max_megapixels / megapixels) ** 0.5
-        new_width = int(width * ratio)
-        new_height = int(height * ratio)
-        
-        # Resize the image
-        resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save to temporary file
-        import tempfile
-        import os
-        
-        # Create a temporary file with .jpg extension
-        temp_fd, temp_path = tempfile.mkstemp(suffix='.jpg')
-        os.close(temp_fd)
-        
-        # Save the resized image
-        resized_img.save(temp_path, 'JPEG', quality=85, optimize=True)
-        
-        # For now, we'll return the original URL with a note about compression
-        # In production, you would upload the compressed image to a CDN and return that URL
         print(f"✅ Compressed image from {width}x{height} ({megapixels:.1f}MP) to {new_width}x{new_height} ({max_megapixels}MP)")
-        print(f"📁 Compressed image saved to: {temp_path}")
-        
-        # Return the compressed image path (in production, this would be a CDN URL)
-        return temp_path, f"Image compressed from {width}x{height} ({megapixels:.1f}MP) to {new_width}x{new_height} ({max_megapixels}MP)"
+        print(f"📁 Compressed image stored at: {compressed['url']}")
+        return compressed["url"], f"Image compressed from {width}x{height} ({megapixels:.1f}MP) to {new_width}x{new_height} ({max_megapixels}MP)"
         
     except Exception as e:
         return image_url, f"Error processing image: {str(e)}"
@@ -133,75 +124,387 @@ def compress_image_url(image_url: str, max_megapixels: int = 25) -> str:
     Returns:
         str: Compressed image URL or original URL
     """
-    try:
-        # Download the image
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        
-        # Open with PIL
-        img = Image.open(BytesIO(response.content))
-        width, height = img.size
-        
-        # Calculate megapixels
-        megapixels = (width * height) / 1_000_000
-        
-        if megapixels <= max_megapixels:
-            return image_url  # No compression needed
-        
-        # Calculate new dimensions to fit within max_megapixels
-        ratio = (max_megapixels / megapixels) ** 0.5
-        new_width = int(width * ratio)
-        new_height = int(height * ratio)
-        
-        # Resize the image
-        resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save to temporary file
-        import tempfile
-        import os
-        
-        # Create a temporary file with .jpg extension
-        temp_fd, temp_path = tempfile.mkstemp(suffix='.jpg')
-        os.close(temp_fd)
-        
-        # Save the resized image
-        resized_img.save(temp_path, 'JPEG', quality=85, optimize=True)
-        
-        print(f"✅ Compressed image from {width}x{height} ({megapixels:.1f}MP) to {new_width}x{new_height} ({max_megapixels}MP)")
-        
-        # For now, return the file path
-        # In production, you would upload to a CDN and return the URL
-        return temp_path
-        
-    except Exception as e:
-        print(f"❌ Error compressing image: {str(e)}")
-        return image_url  # Return original if compression fails
+    compressed_url, message = resize_image_if_needed(image_url, max_megapixels)
+    if compressed_url == image_url and message.startswith(("Error", "Image exceeds")):
+        print(f"❌ Error compressing image: {message}")
+    return compressed_url
+
+def _max_modifications() -> int:
+    return getattr(config, "LISTING_MAX_MODIFICATIONS", 5)
+
+def _max_images() -> int:
+    return getattr(config, "LISTING_MAX_IMAGES", 20)
+
+def _cap_images(images: List[str]) -> List[str]:
+    """Drop duplicate and empty URLs (keeping the first) and cut the list at config.LISTING_MAX_IMAGES"""
+    unique = []
+    for url in images:
+        if url and url not in unique:
+            unique.append(url)
+    return unique[:_max_images()]
+
+def _without_timestamps(product: Dict[str, Any]) -> Dict[str, Any]:
+    """A product without its top-level *_at fields, for change detection"""
+    return {key: value for key, value in product.items() if not key.endswith("_at")}
+
+class _SharedConnection:
+    """One SQLite connection per database file, shared by every ListingDatabase on it"""
+    
+    def __init__(self, db_path: str):
+        # timeout: how long a writer waits for another process's transaction
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                                    timeout=getattr(config, "LISTING_DB_BUSY_TIMEOUT", 30))
+        self.lock = threading.Lock()
+        self.users = 0
+
+_connections: Dict[str, _SharedConnection] = {}
+_connections_lock = threading.Lock()
+
+class _ProductCache:
+    """
+    Process-wide read-through cache for one listing database file.
+    
+    A dedicated connection that never writes watches PRAGMA data_version, which
+    changes whenever any other connection (in this or another process) commits;
+    the cache is dropped on the next lookup after that. A load is only cached
+    if no newer version was seen while it ran. Products are kept as their JSON
+    text so every caller gets its own copy.
+    """
+    
+    def __init__(self, db_path: str):
+        self._watch = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._version = None
+        self._products: Dict[str, Any] = {}
+        self._skus = None
+    
+    def _validate(self):
+        """Drop cached entries if the database changed (lock held)"""
+        version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._version = version
+            self._products.clear()
+            self._skus = None
+    
+    def get_product(self, sku: str, load) -> Dict[str, Any]:
+        with self._lock:
+            self._validate()
+            version = self._version
+            data = self._products.get(sku, _MISSING)
+        count_cache("listing_products", data is not _MISSING)
+        if data is _MISSING:
+            data = load(sku)
+            with self._lock:
+                # A commit validated in the meantime may postdate what we read
+                if self._version == version:
+                    self._products[sku] = data
+        return json.loads(data) if data else {}
+    
+    def list_products(self, load) -> List[str]:
+        with self._lock:
+            self._validate()
+            version = self._version
+            skus = self._skus
+        count_cache("listing_skus", skus is not None)
+        if skus is None:
+            skus = load()
+            with self._lock:
+                if self._version == version:
+                    self._skus = skus
+        return list(skus)
+
+_MISSING = object()
+_caches: Dict[str, _ProductCache] = {}
+_caches_lock = threading.Lock()
+
+def _product_cache(db_path: str):
+    """Shared cache for `db_path`, or None when config.LISTING_CACHE_ENABLED is False"""
+    if not getattr(config, "LISTING_CACHE_ENABLED", True):
+        return None
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = _ProductCache(db_path)
+        return cache
+
+def reset_listing_cache():
+    """Forget all cached listing products (e.g. after replacing the database file)"""
+    with _caches_lock:
+        _caches.clear()
 
 class ListingDatabase:
-    """Simple file-based database for listing-ready products with modified images"""
+    """
+    SQLite-backed store for listing-ready products with modified images.
+    
+    Each product is one row keyed by SKU; the full product dict is kept as JSON
+    in `data`, with `status` and `added_at` copied into indexed columns. The
+    database runs in WAL mode so readers never block the writer. An existing
+    listing_ready_products.json next to the database is imported on first use.
+    All instances for one file share a single connection (opened, and its
+    schema checked, by the first of them), so creating one per request is cheap.
     
-    def __init__(self, db_path: str = "listing_ready_products.json"):
+    Read-modify-write updates run in BEGIN IMMEDIATE transactions, so
+    concurrent requests (threads, workers or processes) serialize on SQLite's
+    write lock instead of overwriting each other, and a crash rolls back to the
+    last committed state. Every write is also appended to the `product_changes`
+    journal in the same transaction (see changes_since()).
+    
+    The `shopify_products` table maps SKUs to the Shopify product/variant they
+    were published as, with a hash of the published content, so publishing
+    again updates (or skips) the existing product instead of creating another.
+    """
+    
+    def __init__(self, db_path: str = None):
+        db_path = db_path or getattr(config, "LISTING_DB_PATH", "listing_ready_products.db")
+        if db_path.endswith(".json"):
+            # Old callers pass the JSON file; keep the data beside it in SQLite
+            db_path = os.path.splitext(db_path)[0] + ".db"
         self.db_path = db_path
-        self.ensure_db_exists()
+        self.legacy_json_path = os.path.splitext(db_path)[0] + ".json"
+        key = os.path.abspath(db_path)
+        with _connections_lock:
+            shared = _connections.get(key)
+            opened = shared is None or not os.path.exists(key)
+            if opened:
+                shared = _connections[key] = _SharedConnection(db_path)
+            shared.users += 1
+            self._shared = shared
+            self._conn, self._lock = shared.conn, shared.lock
+            # Schema and PRAGMAs once per connection, not per instance
+            if opened:
+                self.ensure_db_exists()
+        self._cache = _product_cache(db_path)
     
     def ensure_db_exists(self):
-        """Create the database file if it doesn't exist"""
-        if not os.path.exists(self.db_path):
-            with open(self.db_path, 'w') as f:
-                json.dump({}, f)
+        """Create the schema (and import the legacy JSON file) if needed"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    sku TEXT PRIMARY KEY,
+                    status TEXT,
+                    added_at TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_status ON products(status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_added_at ON products(added_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS product_changes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sku TEXT,
+                    op TEXT NOT NULL,
+                    changed_at TEXT NOT NULL,
+                    data TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_product_changes_sku ON product_changes(sku)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived_modifications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sku TEXT NOT NULL,
+                    modified_at TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_modifications_sku ON archived_modifications(sku)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shopify_products (
+                    sku TEXT PRIMARY KEY,
+                    product_id TEXT NOT NULL,
+                    variant_id TEXT,
+                    handle TEXT,
+                    live_url TEXT,
+                    content_hash TEXT,
+                    copy TEXT,
+                    published INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            empty = self._conn.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None
+        if empty and os.path.exists(self.legacy_json_path):
+            self._import_legacy_json()
+        self._migrate()
+    
+    def _import_legacy_json(self):
+        try:
+            with open(self.legacy_json_path, 'r') as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Listing Database: Could not import {self.legacy_json_path}: {e}")
+            return
+        with self._transaction():
+            # Another process may have imported it while we were reading
+            if self._conn.execute("SELECT 1 FROM products LIMIT 1").fetchone() is not None:
+                return
+            for sku, product in legacy.items():
+                self._write(sku, product, "import")
+        print(f"📦 Listing Database: Imported {len(legacy)} products from {self.legacy_json_path}")
+    
+    def _migrate(self):
+        """One-time data migrations, tracked in PRAGMA user_version"""
+        with self._lock:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+        with self._transaction():
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # Records written before the retention policy may be arbitrarily long
+                self._compact_all()
+                self._conn.execute("PRAGMA user_version = 1")
+    
+    def close(self):
+        """Release this instance; the shared connection closes when its last user does"""
+        with _connections_lock:
+            if self._shared is None:
+                return
+            shared, self._shared = self._shared, None
+            shared.users -= 1
+            if shared.users > 0:
+                return
+            key = os.path.abspath(self.db_path)
+            if _connections.get(key) is shared:
+                del _connections[key]
+        with shared.lock:
+            shared.conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on any error"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    @staticmethod
+    def _row(sku: str, product: Dict[str, Any]) -> tuple:
+        added_at = product.get('added_at') or product.get('modified_at')
+        return (sku, product.get('status'), added_at, json.dumps(product))
+    
+    def _get(self, sku: str) -> Dict[str, Any]:
+        """Read one product (lock held)"""
+        row = self._conn.execute("SELECT data FROM products WHERE sku = ?", (sku,)).fetchone()
+        return json.loads(row[0]) if row else {}
+    
+    def _write(self, sku: str, product: Dict[str, Any], op: str):
+        """Insert or replace one product and journal it (inside a transaction)"""
+        row = self._row(sku, product)
+        self._conn.execute("INSERT OR REPLACE INTO products (sku, status, added_at, data) VALUES (?, ?, ?, ?)", row)
+        self._conn.execute(
+            "INSERT INTO product_changes (sku, op, changed_at, data) VALUES (?, ?, ?, ?)",
+            (sku, op, datetime.now().isoformat(), row[3])
+        )
+    
+    def _delete(self, sku: str, op: str = "delete") -> bool:
+        """Delete one product and journal it (inside a transaction)"""
+        if self._conn.execute("DELETE FROM products WHERE sku = ?", (sku,)).rowcount == 0:
+            return False
+        self._conn.execute(
+            "INSERT INTO product_changes (sku, op, changed_at, data) VALUES (?, ?, ?, NULL)",
+            (sku, op, datetime.now().isoformat())
+        )
+        return True
+    
+    def _archive_old_modifications(self, sku: str, product: Dict[str, Any]) -> int:
+        """
+        Keep the newest config.LISTING_MAX_MODIFICATIONS modifications on the product
+        and move older ones to `archived_modifications` (inside a transaction).
+        Returns the number archived.
+        """
+        modifications = sorted(product.get('modifications') or [], key=lambda m: m.get('modified_at', ''))
+        excess = len(modifications) - _max_modifications()
+        if excess <= 0:
+            return 0
+        self._conn.executemany(
+            "INSERT INTO archived_modifications (sku, modified_at, data) VALUES (?, ?, ?)",
+            [(sku, m.get('modified_at'), json.dumps(m)) for m in modifications[:excess]]
+        )
+        product['modifications'] = modifications[excess:]
+        return excess
+    
+    def _compact(self, sku: str, product: Dict[str, Any]) -> bool:
+        """Apply the retention policy to a stored product (inside a transaction)"""
+        listing_images = product.get('listing_images') or {}
+        archived = self._archive_old_modifications(sku, product)
+        if archived and product.get('modified_image_url'):
+            # Newest modification, retained earlier ones (newest first), then originals
+            previous = [m['modified_image_url'] for m in reversed(product['modifications'][:-1])]
+            originals = (product.get('original_metadata') or {}).get('image_urls', [])
+            images = [product['modified_image_url']] + previous + originals
+        else:
+            images = listing_images.get('all_images')
+        if not archived and (images is None or _cap_images(images) == images):
+            return False
+        if images is not None:
+            listing_images['all_images'] = _cap_images(images)
+            listing_images['total_images'] = len(listing_images['all_images'])
+            product['listing_images'] = listing_images
+        self._write(sku, product, "compact")
+        return True
+    
+    def compact_products(self) -> int:
+        """
+        Apply the modification/image retention policy to every stored product.
+        Runs once automatically when an older database is opened.
+        
+        Returns:
+            int: Number of products rewritten
+        """
+        with self._transaction():
+            return self._compact_all()
+    
+    def _compact_all(self) -> int:
+        rows = self._conn.execute("SELECT sku, data FROM products").fetchall()
+        compacted = sum(self._compact(sku, json.loads(data)) for sku, data in rows)
+        if compacted:
+            print(f"🗜️ Listing Database: Compacted {compacted} products")
+        return compacted
+    
+    def get_archived_modifications(self, sku: str) -> List[Dict[str, Any]]:
+        """Modifications moved out of a product by the retention policy, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM archived_modifications WHERE sku = ? ORDER BY modified_at, id", (sku,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
     
     def load_products(self) -> Dict[str, Any]:
         """Load all products from the database"""
-        try:
-            with open(self.db_path, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        with self._lock:
+            rows = self._conn.execute("SELECT sku, data FROM products ORDER BY added_at, sku").fetchall()
+        return {sku: json.loads(data) for sku, data in rows}
     
     def save_products(self, products: Dict[str, Any]):
-        """Save products to the database"""
-        with open(self.db_path, 'w') as f:
-            json.dump(products, f, indent=2)
+        """Replace the database contents with `products`"""
+        with self._transaction():
+            for (sku,) in self._conn.execute("SELECT sku FROM products").fetchall():
+                if sku not in products:
+                    self._delete(sku)
+            for sku, product in products.items():
+                self._write(sku, product, "put")
+    
+    def changes_since(self, change_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Journal entries after `change_id`, oldest first.
+        
+        Returns:
+            List of {"id", "sku", "op", "changed_at", "product"} dicts; "product"
+            is the row as written (None for deletes)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sku, op, changed_at, data FROM product_changes WHERE id > ? ORDER BY id LIMIT ?",
+                (change_id, limit)
+            ).fetchall()
+        return [
+            {"id": id_, "sku": sku, "op": op, "changed_at": changed_at, "product": json.loads(data) if data else None}
+            for id_, sku, op, changed_at, data in rows
+        ]
     
     def add_modified_product(self, sku: str, original_metadata: Dict[str, Any], modified_image_url: str, instruction: str) -> bool:
         """
@@ -230,79 +533,21 @@ class ListingDatabase:
                     # Re-validate the compressed image
                     is_valid, validation_msg = validate_image_resolution(modified_image_url)
             
-            products = self.load_products()
-            
-            # Check if product already exists
-            if sku in products:
-                existing_product = products[sku]
-                
-                # If product exists, update with new modification
-                # Create a list of modifications if it doesn't exist
-                if 'modifications' not in existing_product:
-                    existing_product['modifications'] = []
-                
-                # Add new modification to the list
-                new_modification = {
-                    "modified_image_url": modified_image_url,
-                    "instruction": instruction,
-                    "modified_at": datetime.now().isoformat(),
-                    "image_validation": {
-                        "is_valid": is_valid,
-                        "message": validation_msg
-                    }
-                }
-                existing_product['modifications'].append(new_modification)
-                
-                # Update the primary image to be the newest modification
-                existing_product['modified_image_url'] = modified_image_url
-                existing_product['modification_instruction'] = instruction
-                existing_product['modified_at'] = datetime.now().isoformat()
-                
-                # Rebuild the listing_images with proper ordering:
-                # 1. Newest modified image (primary)
-                # 2. Previous modifications (newest first)
-                # 3. Original images
-                listing_images = []
-                
-                # Add newest modification as primary
-                listing_images.append(modified_image_url)
-                
-                # Add previous modifications (newest first)
-                if len(existing_product['modifications']) > 1:
-                    # Get all modifications except the current one, sorted by date (newest first)
-                    previous_modifications = sorted(
-                        existing_product['modifications'][:-1],  # Exclude current
-                        key=lambda x: x['modified_at'],
-                        reverse=True
-                    )
-                    for mod in previous_modifications:
-                        listing_images.append(mod['modified_image_url'])
-                
-                # Add original images
-                original_images = original_metadata.get('image_urls', [])
-                if original_images:
-                    listing_images.extend(original_images)
-                
-                # Update the listing_images structure
-                existing_product['listing_images'] = {
-                    "primary_image": modified_image_url,
-                    "all_images": listing_images,
-                    "total_images": len(listing_images)
-                }
-                
-                products[sku] = existing_product
-                
-            else:
-                # Create new product entry
-                listing_product = {
-                    "sku": sku,
-                    "original_metadata": original_metadata,
-                    "modified_image_url": modified_image_url,
-                    "original_main_image": original_metadata.get('main_image_url', ''),
-                    "modification_instruction": instruction,
-                    "modified_at": datetime.now().isoformat(),
-                    "status": "ready_for_listing",
-                    "modifications": [{
+            # Read and write under SQLite's write lock so concurrent additions
+            # of modifications for the same SKU cannot overwrite each other
+            with self._transaction():
+                existing_product = self._get(sku)
+
+                # Check if product already exists
+                if existing_product:
+
+                    # If product exists, update with new modification
+                    # Create a list of modifications if it doesn't exist
+                    if 'modifications' not in existing_product:
+                        existing_product['modifications'] = []
+
+                    # Add new modification to the list
+                    new_modification = {
                         "modified_image_url": modified_image_url,
                         "instruction": instruction,
                         "modified_at": datetime.now().isoformat(),
@@ -310,17 +555,78 @@ class ListingDatabase:
                             "is_valid": is_valid,
                             "message": validation_msg
                         }
-                    }],
-                    "listing_images": {
+                    }
+                    existing_product['modifications'].append(new_modification)
+                    self._archive_old_modifications(sku, existing_product)
+
+                    # Update the primary image to be the newest modification
+                    existing_product['modified_image_url'] = modified_image_url
+                    existing_product['modification_instruction'] = instruction
+                    existing_product['modified_at'] = datetime.now().isoformat()
+
+                    # Rebuild the listing_images with proper ordering:
+                    # 1. Newest modified image (primary)
+                    # 2. Previous modifications (newest first)
+                    # 3. Original images
+                    listing_images = []
+
+                    # Add newest modification as primary
+                    listing_images.append(modified_image_url)
+
+                    # Add previous modifications (newest first)
+                    if len(existing_product['modifications']) > 1:
+                        # Get all modifications except the current one, sorted by date (newest first)
+                        previous_modifications = sorted(
+                            existing_product['modifications'][:-1],  # Exclude current
+                            key=lambda x: x['modified_at'],
+                            reverse=True
+                        )
+                        for mod in previous_modifications:
+                            listing_images.append(mod['modified_image_url'])
+
+                    # Add original images
+                    original_images = original_metadata.get('image_urls', [])
+                    if original_images:
+                        listing_images.extend(original_images)
+
+                    # Update the listing_images structure
+                    listing_images = _cap_images(listing_images)
+                    existing_product['listing_images'] = {
                         "primary_image": modified_image_url,
-                        "all_images": [modified_image_url] + original_metadata.get('image_urls', []),
-                        "total_images": len(original_metadata.get('image_urls', [])) + 1
+                        "all_images": listing_images,
+                        "total_images": len(listing_images)
                     }
-                }
-                
-                products[sku] = listing_product
-            
-            self.save_products(products)
+
+                    self._write(sku, existing_product, "modify")
+
+                else:
+                    # Create new product entry
+                    listing_product = {
+                        "sku": sku,
+                        "original_metadata": original_metadata,
+                        "modified_image_url": modified_image_url,
+                        "original_main_image": original_metadata.get('main_image_url', ''),
+                        "modification_instruction": instruction,
+                        "modified_at": datetime.now().isoformat(),
+                        "status": "ready_for_listing",
+                        "modifications": [{
+                            "modified_image_url": modified_image_url,
+                            "instruction": instruction,
+                            "modified_at": datetime.now().isoformat(),
+                            "image_validation": {
+                                "is_valid": is_valid,
+                                "message": validation_msg
+                            }
+                        }],
+                        "listing_images": {
+                            "primary_image": modified_image_url,
+                            "all_images": _cap_images([modified_image_url] + original_metadata.get('image_urls', []))
+                        }
+                    }
+                    listing_product['listing_images']['total_images'] = len(listing_product['listing_images']['all_images'])
+
+                    self._write(sku, listing_product, "add")
+
             print(f"✅ Listing Database: Added/Updated SKU {sku} with modified image")
             if not is_valid:
                 print(f"⚠️ Warning: Image may cause Shopify upload issues due to size")
@@ -330,30 +636,208 @@ class ListingDatabase:
             print(f"❌ Listing Database: Error adding product {sku}: {str(e)}")
             return False
     
+    def _load_data(self, sku: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM products WHERE sku = ?", (sku,)).fetchone()
+        return row[0] if row else None
+    
+    def _load_skus(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT sku FROM products ORDER BY added_at, sku").fetchall()
+        return [sku for (sku,) in rows]
+    
     def get_product(self, sku: str) -> Dict[str, Any]:
-        """Get a product from the listing database"""
-        products = self.load_products()
-        return products.get(sku, {})
+        """Get a product from the listing database (served from the process-wide cache)"""
+        if self._cache is not None:
+            return self._cache.get_product(sku, self._load_data)
+        data = self._load_data(sku)
+        return json.loads(data) if data else {}
     
     def list_products(self) -> List[str]:
-        """List all SKUs in the listing database"""
-        products = self.load_products()
-        return list(products.keys())
+        """List all SKUs in the listing database (served from the process-wide cache)"""
+        if self._cache is not None:
+            return self._cache.list_products(self._load_skus)
+        return self._load_skus()
+    
+    def list_products_by_status(self, status: str) -> List[str]:
+        """List the SKUs with the given status (e.g. "ready_for_listing")"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sku FROM products WHERE status = ? ORDER BY added_at, sku", (status,)
+            ).fetchall()
+        return [sku for (sku,) in rows]
     
     def remove_product(self, sku: str) -> bool:
         """Remove a product from the listing database"""
         try:
-            products = self.load_products()
-            if sku in products:
-                del products[sku]
-                self.save_products(products)
+            with self._transaction():
+                removed = self._delete(sku)
+            if removed:
                 print(f"✅ Listing Database: Removed SKU {sku}")
-                return True
-            return False
+            return removed
         except Exception as e:
             print(f"❌ Listing Database: Error removing product {sku}: {str(e)}")
             return False
     
+    def upsert_products(self, products: Dict[str, Dict[str, Any]], replace_existing: bool = True) -> List[str]:
+        """
+        Write many products in one transaction.
+        
+        Args:
+            products: Product dicts keyed by SKU
+            replace_existing: False leaves SKUs that are already stored untouched
+            
+        Returns:
+            List[str]: SKUs that were inserted or changed (rows that differ only in
+            their timestamps, e.g. a fresh added_at, count as unchanged and are skipped)
+        """
+        if not products:
+            return []
+        skus = list(products)
+        written = []
+        with self._transaction():
+            existing = {}
+            # Stay well below SQLite's bound-parameter limit
+            for offset in range(0, len(skus), 500):
+                chunk = skus[offset:offset + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(self._conn.execute(
+                    f"SELECT sku, data FROM products WHERE sku IN ({placeholders})", chunk
+                ).fetchall())
+            
+            for sku, product in products.items():
+                if sku in existing and (not replace_existing or
+                                        _without_timestamps(json.loads(existing[sku])) == _without_timestamps(product)):
+                    continue
+                self._write(sku, product, "update" if sku in existing else "add")
+                written.append(sku)
+        return written
+    
+    def record_listing_results(self, results: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Store Shopify publish outcomes in one transaction.
+        
+        Successful SKUs get status "listed", failed ones "listing_failed"; the
+        Shopify IDs, URL or error are kept under "shopify". SKUs that are not in
+        the database yet are added from the result's "metadata", if given.
+        
+        Args:
+            results: Dicts keyed by SKU with "success" and "product_id",
+                "live_url", "admin_url", "error", "bulk_operation_id", "metadata"
+            
+        Returns:
+            List[str]: SKUs that were updated
+        """
+        updated = []
+        now = datetime.now().isoformat()
+        with self._transaction():
+            for sku, result in results.items():
+                product = self._get(sku)
+                if not product:
+                    if not result.get("metadata"):
+                        continue
+                    product = self._product_from_search(sku, result["metadata"])
+                product["status"] = "listed" if result.get("success") else "listing_failed"
+                shopify = {key: result[key] for key in
+                           ("product_id", "live_url", "admin_url", "error", "bulk_operation_id") if result.get(key)}
+                shopify["updated_at"] = now
+                product["shopify"] = shopify
+                self._write(sku, product, "listing")
+                updated.append(sku)
+        return updated
+    
+    _SHOPIFY_COLUMNS = ("sku", "product_id", "variant_id", "handle", "live_url", "content_hash", "copy", "published",
+                        "updated_at")
+    
+    def get_shopify_ids(self, skus: List[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        SKU -> Shopify ID index entries.
+        
+        Args:
+            skus: SKUs to look up (default: every indexed SKU)
+            
+        Returns:
+            Dict keyed by SKU with "product_id", "variant_id", "handle", "live_url",
+            "content_hash", "copy" (the generated title/description, if recorded),
+            "published" and "updated_at"; unknown SKUs are absent
+        """
+        columns = ", ".join(self._SHOPIFY_COLUMNS)
+        rows = []
+        with self._lock:
+            if skus is None:
+                rows = self._conn.execute(f"SELECT {columns} FROM shopify_products").fetchall()
+            else:
+                skus = list(skus)
+                for offset in range(0, len(skus), 500):
+                    chunk = skus[offset:offset + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows.extend(self._conn.execute(
+                        f"SELECT {columns} FROM shopify_products WHERE sku IN ({placeholders})", chunk
+                    ).fetchall())
+        entries = {}
+        for row in rows:
+            entry = dict(zip(self._SHOPIFY_COLUMNS, row))
+            entry["published"] = bool(entry["published"])
+            entry["copy"] = json.loads(entry["copy"]) if entry["copy"] else None
+            entries[entry.pop("sku")] = entry
+        return entries
+    
+    def put_shopify_ids(self, entries: Dict[str, Dict[str, Any]]):
+        """
+        Insert or update index entries in one transaction.
+        
+        Missing fields keep their stored value while the product ID is unchanged,
+        so entries found by reconciliation (which know no content hash or copy)
+        do not invalidate what this process published.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction():
+            for sku, entry in entries.items():
+                self._conn.execute("""
+                    INSERT INTO shopify_products (sku, product_id, variant_id, handle, live_url, content_hash, copy, published, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(sku) DO UPDATE SET
+                        variant_id = CASE WHEN excluded.product_id = shopify_products.product_id
+                            THEN COALESCE(excluded.variant_id, shopify_products.variant_id) ELSE excluded.variant_id END,
+                        handle = COALESCE(excluded.handle, shopify_products.handle),
+                        live_url = COALESCE(excluded.live_url, shopify_products.live_url),
+                        content_hash = CASE WHEN excluded.product_id = shopify_products.product_id
+                            THEN COALESCE(excluded.content_hash, shopify_products.content_hash) ELSE excluded.content_hash END,
+                        copy = CASE WHEN excluded.product_id = shopify_products.product_id
+                            THEN COALESCE(excluded.copy, shopify_products.copy) ELSE excluded.copy END,
+                        published = excluded.published,
+                        product_id = excluded.product_id,
+                        updated_at = excluded.updated_at
+                """, (sku, entry["product_id"], entry.get("variant_id"), entry.get("handle"), entry.get("live_url"),
+                      entry.get("content_hash"), json.dumps(entry["copy"]) if entry.get("copy") else None,
+                      int(bool(entry.get("published"))), now))
+    
+    def remove_shopify_ids(self, skus: List[str]) -> int:
+        """Drop index entries (e.g. for products deleted in Shopify); returns how many existed"""
+        removed = 0
+        with self._transaction():
+            for sku in skus:
+                removed += self._conn.execute("DELETE FROM shopify_products WHERE sku = ?", (sku,)).rowcount
+        return removed
+    
+    @staticmethod
+    def _product_from_search(sku: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Listing-ready product entry for a search result (without modifications)"""
+        return {
+            "sku": sku,
+            "original_metadata": metadata,
+            "modified_image_url": None,  # No modifications
+            "original_main_image": metadata.get('main_image_url', ''),
+            "modification_instruction": None,  # No modifications
+            "added_at": datetime.now().isoformat(),
+            "status": "ready_for_listing",
+            "listing_images": {
+                "primary_image": metadata.get('main_image_url', ''),
+                "additional_images": metadata.get('image_urls', []),
+                "total_images": len(metadata.get('image_urls', []))
+            }
+        }
+    
     def add_product_from_search(self, sku: str, metadata: Dict[str, Any]) -> bool:
         """
         Add a product from search results to the listing database (without modifications)
@@ -366,33 +850,10 @@ class ListingDatabase:
             bool: True if successful, False otherwise
         """
         try:
-            products = self.load_products()
-            
-            # Check if product already exists
-            if sku in products:
+            if not self.upsert_products({sku: self._product_from_search(sku, metadata)}, replace_existing=False):
                 print(f"ℹ️ Listing Database: SKU {sku} already exists in database")
                 return True
             
-            # Create the listing-ready product entry (without modifications)
-            listing_product = {
-                "sku": sku,
-                "original_metadata": metadata,
-                "modified_image_url": None,  # No modifications
-                "original_main_image": metadata.get('main_image_url', ''),
-                "modification_instruction": None,  # No modifications
-                "added_at": datetime.now().isoformat(),
-                "status": "ready_for_listing",
-                "listing_images": {
-                    "primary_image": metadata.get('main_image_url', ''),
-                    "additional_images": metadata.get('image_urls', []),
-                    "total_images": len(metadata.get('image_urls', []))
-                }
-            }
-            
-            # Add to database
-            products[sku] = listing_product
-            self.save_products(products)
-            
             print(f"✅ Listing Database: Added SKU {sku} from search results (no modifications)")
             return True
             
@@ -403,22 +864,29 @@ class ListingDatabase:
     def add_multiple_products_from_search(self, search_results: List[Dict]) -> List[str]:
         """
         Add multiple products from search results to the listing database
+        in a single transaction. SKUs that are already stored are left as they are.
         
         Args:
             search_results: List of search result dictionaries
             
         Returns:
-            List[str]: List of successfully added SKUs
+            List[str]: List of successfully added SKUs (including ones already present)
         """
-        added_skus = []
+        products = {}
         for result in search_results:
             metadata = result.get('metadata', {})
             sku = metadata.get('sku')
-            if sku:
-                if self.add_product_from_search(sku, metadata):
-                    added_skus.append(sku)
+            if sku and sku not in products:
+                products[sku] = self._product_from_search(sku, metadata)
         
-        return added_skus
+        try:
+            inserted = self.upsert_products(products, replace_existing=False)
+        except Exception as e:
+            print(f"❌ Listing Database: Error adding {len(products)} products: {str(e)}")
+            return []
+        print(f"✅ Listing Database: Added {len(inserted)} new SKUs from search results "
+              f"({len(products) - len(inserted)} already present)")
+        return list(products)
 
 def parse_confirmation_intent(user_query: str) -> tuple:
     """
@@ -475,7 +943,7 @@ ANALYZE ONLY this response and classify their intent:
 Respond with a JSON object:
 {{"intent": "intent_type", "reasoning": "Detailed explanation of how you interpreted the user's response", "followup_instruction": "the follow-up image modification instruction, or null if none"}}
 """
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+    llm = get_llm("confirmation_intent")
     response = llm.invoke(prompt)
     try:
         content = response.content.strip()
@@ -518,8 +986,8 @@ def listing_database_node(state):
     last_message = state["messages"][-1]
     user_query = extract_text_from_multimodal_content(last_message.content)
     
-    # Get state information
-    modified_images = state.get("modified_images", [])
+    # Get state information (edits submitted asynchronously may have finished since)
+    modified_images = resolve_modified_images(state.get("modified_images", []))
     search_results = state.get("search_results", [])
     awaiting_confirmation = state.get("awaiting_confirmation", False)
     
@@ -538,6 +1006,21 @@ def listing_database_node(state):
         if modified_images:
             modification_result = modified_images[0]
             sku = modification_result.get('sku')
+        if intent in ("add_only", "add_and_list") and modified_images and modification_result.get('status') == 'pending':
+            # The edit is still running; keep waiting for the confirmation
+            progress = modification_result.get('progress')
+            progress_text = f" ({progress:.0%})" if progress is not None else ""
+            if any('\u4e00' <= char <= '\u9fff' for char in user_query):
+                response_text = f"""⏳ **图片仍在处理中**\n\nSKU {sku or ''} 的图片修改还在进行{progress_text}（任务 `{modification_result['job_id']}`）。\n\n请稍后再次回复 **"是"** 将其加入上架准备数据库。"""
+            else:
+                response_text = f"""⏳ **Still Working on It**\n\nThe image edit for SKU {sku or ''} is still running{progress_text} (job `{modification_result['job_id']}`).\n\nReply **"yes"** again in a moment to add it to the listing database."""
+            return {
+                **state,
+                "modified_images": modified_images,
+                "listing_database_response": response_text,
+                "awaiting_confirmation": True,
+                "messages": state.get("messages", []) + [AIMessage(content=response_text)]
+            }
         # --- Existing intent handling logic ---
         if intent == "add_only":
             # Add to DB, prompt for next action
@@ -612,7 +1095,7 @@ def listing_database_node(state):
         messages = state.get("messages", [])
         if response_text:
             messages = messages + [AIMessage(content=response_text)]
-        return {**state, "listing_database_response": response_text, "listing_ready_products": ready_skus, "awaiting_confirmation": False, "messages": messages}
+        return {**state, "modified_images": modified_images, "listing_database_response": response_text, "listing_ready_products": ready_skus, "awaiting_confirmation": False, "messages": messages}
     
     elif "view all listing" in user_query or "show listing" in user_query or "list ready" in user_query:
         # User wants to see all listing-ready products
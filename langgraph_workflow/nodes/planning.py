@@ -1,4 +1,4 @@
-from langchain_community.chat_models import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
 from langchain_core.messages import HumanMessage
 import json
 import re
@@ -98,7 +98,7 @@ def planning_node(state):
         f"SKU: {p.get('metadata', {}).get('sku', '')}, Name: {p.get('metadata', {}).get('name', '')}" for p in search_results
     ])
     
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.1, request_timeout=10)
+    llm = get_llm("planning")
     
     # Simplified LLM-based routing prompt
     prompt = f"""You are an intelligent conversation router that understands user intent and directs them to the appropriate service. Analyze the user's natural language request and determine what they want to accomplish.
@@ -1,14 +1,19 @@
 from langchain_core.messages import HumanMessage, AIMessage
 import json
+import threading
 import time
 from typing import Dict, List, Any
-import requests
 import sys
 import os
-from langchain_community.chat_models import ChatOpenAI
+from langgraph_workflow.utils.llm_registry import get_llm
+from langgraph_workflow.utils.metrics import track
+from langgraph_workflow.utils.clients import get_http_session
+from langgraph_workflow.utils.concurrency import run_bounded
+from langgraph_workflow.utils.shopify_throttle import get_shopify_throttle, is_throttled
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import config
 from config import SHOP, ACCESS_TOKEN
 
 # Import functions from listing_database
@@ -87,7 +92,7 @@ def select_products_with_llm(messages: List, search_results: List, user_query: s
         
         product_list_text = "\n".join(product_list)
         
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+        llm = get_llm("shopify_product_selection")
         
         prompt = f"""You are an expert at understanding user intent for product selection in e-commerce workflows. Your task is to analyze the user's natural language request and determine which specific products they want to list on Shopify.
 
@@ -370,90 +375,62 @@ def shopify_agent_node(state):
     
     print(f"📦 Deduplicated to {len(unique_products)} unique products by SKU")
     
-    # Process each product for Shopify listing
-    successful_products = []
-    failed_products = []
+    # Products without listing-database images use their catalog images: validate
+    # those for every product up front, in parallel
+    def listing_images_for(sku: str) -> List[str]:
+        return ((db.get_product(sku) or {}).get('listing_images') or {}).get('all_images') or []
+    
+    catalog_media = create_media_for_products([
+        product.get('metadata', {}) for product in unique_products
+        if not listing_images_for(product.get('metadata', {}).get('sku', ''))
+    ])
+    
+    def media_from_metadata(metadata: Dict[str, Any]) -> List[Dict[str, str]]:
+        sku = metadata.get('sku', '')
+        return catalog_media[sku] if sku in catalog_media else create_media_from_metadata(metadata)
     
-    for i, product in enumerate(unique_products, 1):
+    # Media is resolved up front (listing-database images, else the validated
+    # catalog images); copy generation and the Shopify mutations then run for
+    # all products in parallel
+    jobs = []
+    for product in unique_products:
         metadata = product.get('metadata', {})
         sku = metadata.get('sku', '')
-        
-        print(f"🔄 Processing product {i}/{len(unique_products)}: {sku}")
-        
-        try:
-            # Generate AI title and description
-            ai_title = generate_ai_title(metadata, language)
-            ai_description = generate_ai_description(metadata, language)
-            
-            print(f"🤖 Generated AI Title: {ai_title}")
-            print(f"🤖 Generated AI Description: {ai_description[:100]}...")
-            
-            # Check listing database for modified images
-            print(f"🔍 Debug - Checking listing database for SKU {sku}")
-            listing_product = db.get_product(sku)
-            print(f"🔍 Debug - Listing product found: {listing_product is not None}")
-            
-            if listing_product:
-                print(f"🔍 Debug - Listing product keys: {list(listing_product.keys())}")
-                listing_images = listing_product.get('listing_images', {})
-                print(f"🔍 Debug - Has listing_images: {listing_images is not None}")
-                
-                if listing_images:
-                    print(f"🔍 Debug - listing_images keys: {list(listing_images.keys())}")
-                    all_images = listing_images.get('all_images', [])
-                    print(f"🔍 Debug - all_images count: {len(all_images)}")
-                    
-                    if all_images:
-                        print(f"🎨 Shopify Agent: Using {len(all_images)} images from listing database for SKU {sku}")
-                        primary_image = listing_images.get('primary_image', '')
-                        print(f"🎨 Primary image: {primary_image}")
-                        
-                        # Format media for Shopify API
-                        media = [
-                            {"originalSource": image_url, "mediaContentType": "IMAGE"}
-                            for image_url in all_images
-                        ]
-                        
-                        print(f"📸 Final media count for SKU {sku}: {len(media)} images")
-                    else:
-                        print(f"⚠️ No images found in listing database for SKU {sku}")
-                        media = create_media_from_metadata(metadata)
-                else:
-                    print(f"⚠️ No listing_images found for SKU {sku}")
-                    media = create_media_from_metadata(metadata)
-            else:
-                print(f"⚠️ No listing database entry found for SKU {sku}")
-                media = create_media_from_metadata(metadata)
-            
-            # Create product input
-            product_input = create_product_input_from_metadata(metadata, ai_title, ai_description)
-            
-            # Publish to Shopify
-            result = publish_product_to_shopify(product_input, media, metadata)
-            
-            if result.get("success"):
-                print(f"✅ Successfully published: {ai_title}")
-                successful_products.append({
-                    "title": ai_title,
-                    "url": result.get("live_url", ""),
-                    "sku": sku
-                })
-            else:
-                error_msg = result.get("error", "Unknown error")
-                print(f"❌ Failed to publish: {ai_title}")
-                print(f"❌ Error details: {error_msg}")
-                failed_products.append({
-                    "title": ai_title,
-                    "error": error_msg,
-                    "sku": sku
-                })
-                
-        except Exception as e:
-            print(f"❌ Error processing product {sku}: {e}")
+        all_images = listing_images_for(sku)
+        if all_images:
+            print(f"🎨 Shopify Agent: Using {len(all_images)} images from listing database for SKU {sku}")
+            media = [
+                {"originalSource": image_url, "mediaContentType": "IMAGE"}
+                for image_url in all_images
+            ]
+            print(f"📸 Final media count for SKU {sku}: {len(media)} images")
+        else:
+            print(f"⚠️ No listing database images for SKU {sku}")
+            media = media_from_metadata(metadata)
+        jobs.append((metadata, media))
+    
+    results = publish_products(jobs, language)
+    
+    successful_products = []
+    failed_products = []
+    for (metadata, _), result in zip(jobs, results):
+        sku = metadata.get('sku', '')
+        if result.get("success"):
+            successful_products.append({
+                "title": result["title"],
+                "url": result.get("live_url", ""),
+                "sku": sku,
+                "attempts": result["attempts"]
+            })
+        else:
+            error_msg = result.get("error", "Unknown error")
+            if result.get("product_id"):
+                error_msg += f" (product {result['product_id']} was created before the failure)"
             failed_products.append({
-                "title": f"Product {sku}",
-                "error": str(e),
-                "sku": sku
+                "title": result.get("title") or f"Product {sku}",
+                "error": error_msg,
+                "sku": sku,
+                "attempts": result["attempts"]
             })
     
     # Generate response
@@ -637,14 +614,14 @@ def create_specifications_table(specs: Dict[str, str]) -> str:
     </div>
     '''
 
-def create_media_from_metadata(metadata: Dict[str, Any], modified_images: List[Dict] = None) -> List[Dict[str, str]]:
+def _media_concurrency() -> int:
+    return getattr(config, "SHOPIFY_MEDIA_CONCURRENCY", 8)
+
+def _media_sources(metadata: Dict[str, Any], modified_images: List[Dict] = None) -> List[tuple]:
     """
-    Create a list of media dicts for Shopify from product metadata and modified images.
-    Ensures all images are under 25MP and compresses if needed.
-    The modified image (if present) is always the primary image.
+    Ordered (url, label) pairs for a product's Shopify media, before validation.
+    The modified image (if present) comes first and replaces the main image.
     """
-    media = []
-    sku = metadata.get('sku', '')
     main_image_url = metadata.get('main_image_url', '')
     image_urls = metadata.get('image_urls', [])
     modified_image_url = None
@@ -652,115 +629,699 @@ def create_media_from_metadata(metadata: Dict[str, Any], modified_images: List[D
         # Use the most recent modified image as primary
         modified_image_url = modified_images[0]["url"] if modified_images else None
 
-    # Add modified image as primary if present
+    sources = []
     if modified_image_url:
-        # Validate and compress image resolution
-        is_valid, validation_msg = validate_image_resolution(modified_image_url)
-        if not is_valid:
-            print(f"⚠️ Warning: Modified image for SKU {sku} exceeds 25MP limit: {validation_msg}")
-            print(f"🔄 Compressing modified image before Shopify upload...")
-            compressed_url = compress_image_url(modified_image_url)
-            if compressed_url != modified_image_url:
-                print(f"✅ Modified image compressed successfully for Shopify upload")
-                modified_image_url = compressed_url
-        media.append({
-            "originalSource": modified_image_url,
-            "mediaContentType": "IMAGE"
-        })
-        print(f"🎨 Shopify Agent: Using modified image for SKU {sku}: {modified_image_url}")
+        sources.append((modified_image_url, "Modified"))
 
     # Add original images (but skip the main one if we're using a modified version)
     if image_urls:
         for img_url in image_urls:
             if img_url and img_url.strip():
-                # Skip the main image if we're using a modified version
                 if modified_image_url and img_url.strip() == main_image_url:
                     continue
-                # Validate and compress image resolution
-                is_valid, validation_msg = validate_image_resolution(img_url)
-                if not is_valid:
-                    print(f"⚠️ Warning: Original image for SKU {sku} exceeds 25MP limit: {validation_msg}")
-                    print(f"🔄 Compressing original image before Shopify upload...")
-                    compressed_url = compress_image_url(img_url)
-                    if compressed_url != img_url:
-                        print(f"✅ Original image compressed successfully for Shopify upload")
-                        img_url = compressed_url
-                media.append({
-                    "originalSource": img_url.strip(),
-                    "mediaContentType": "IMAGE"
-                })
+                sources.append((img_url.strip(), "Original"))
     # Fallback to main_image_url if image_urls is not available and no modified image
     elif main_image_url and not modified_image_url:
-        # Validate and compress image resolution
-        is_valid, validation_msg = validate_image_resolution(main_image_url)
-        if not is_valid:
-            print(f"⚠️ Warning: Main image for SKU {sku} exceeds 25MP limit: {validation_msg}")
-            print(f"🔄 Compressing main image before Shopify upload...")
-            compressed_url = compress_image_url(main_image_url)
-            if compressed_url != main_image_url:
-                print(f"✅ Main image compressed successfully for Shopify upload")
-                main_image_url = compressed_url
-        media.append({
-            "originalSource": main_image_url,
-            "mediaContentType": "IMAGE"
-        })
-    # Remove duplicates while preserving order
+        sources.append((main_image_url, "Main"))
+    return sources
+
+def _prepare_image_url(image_url: str, sku: str, label: str) -> str:
+    """Validate one image against Shopify's 25MP limit and compress it if needed."""
+    is_valid, validation_msg = validate_image_resolution(image_url)
+    if not is_valid:
+        print(f"⚠️ Warning: {label} image for SKU {sku} exceeds 25MP limit: {validation_msg}")
+        print(f"🔄 Compressing {label.lower()} image before Shopify upload...")
+        compressed_url = compress_image_url(image_url)
+        if compressed_url != image_url:
+            print(f"✅ {label} image compressed successfully for Shopify upload")
+            return compressed_url
+    return image_url
+
+def prepare_media_urls(sources: List[tuple]) -> Dict[str, str]:
+    """
+    Validate/compress many images at once.
+    
+    Args:
+        sources: (url, sku, label) tuples; repeated URLs are prepared once
+        
+    Returns:
+        Dict mapping each source URL to the URL to upload (the original URL if
+        preparation failed or timed out)
+    """
+    unique = {}
+    for url, sku, label in sources:
+        unique.setdefault(url, (url, sku, label))
+    jobs = list(unique.values())
+    outcomes = run_bounded(lambda job: _prepare_image_url(*job), jobs,
+                           max_workers=_media_concurrency(), timeout=60)
+    prepared = {}
+    for (url, sku, label), outcome in zip(jobs, outcomes):
+        if outcome["status"] != "success":
+            print(f"⚠️ Could not validate image for SKU {sku}: {outcome['error']}")
+        prepared[url] = outcome["result"] if outcome["status"] == "success" else url
+    return prepared
+
+def _build_media(sku: str, sources: List[tuple], prepared: Dict[str, str]) -> List[Dict[str, str]]:
+    media = []
     seen_urls = set()
-    unique_media = []
-    for item in media:
-        if item["originalSource"] not in seen_urls:
-            unique_media.append(item)
-            seen_urls.add(item["originalSource"])
-    print(f"📸 Final media count for SKU {sku}: {len(unique_media)} images")
-    return unique_media
-
-def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[str, str]], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    for url, label in sources:
+        final_url = prepared.get(url, url)
+        if label == "Modified":
+            print(f"🎨 Shopify Agent: Using modified image for SKU {sku}: {final_url}")
+        # Remove duplicates while preserving order
+        if final_url not in seen_urls:
+            media.append({"originalSource": final_url, "mediaContentType": "IMAGE"})
+            seen_urls.add(final_url)
+    print(f"📸 Final media count for SKU {sku}: {len(media)} images")
+    return media
+
+def create_media_from_metadata(metadata: Dict[str, Any], modified_images: List[Dict] = None) -> List[Dict[str, str]]:
     """
-    Use the existing shopify_listing.py logic to publish a product
-    Returns: {'success': bool, 'title': str, 'live_url': str, 'product_id': str, 'error': str}
+    Create a list of media dicts for Shopify from product metadata and modified images.
+    Ensures all images are under 25MP and compresses if needed; the images are
+    checked in parallel and keep their original order.
+    The modified image (if present) is always the primary image.
     """
-    try:
-        print(f"🔄 Starting Shopify publish for product: {product_input.get('title', 'Unknown')}")
-        print(f"🔄 Media count: {len(media)}")
+    sku = metadata.get('sku', '')
+    sources = _media_sources(metadata, modified_images)
+    prepared = prepare_media_urls([(url, sku, label) for url, label in sources])
+    return _build_media(sku, sources, prepared)
+
+def create_media_for_products(metadatas: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, str]]]:
+    """
+    create_media_from_metadata for several products, with the images of all of
+    them validated in one parallel pass. Returns media lists keyed by SKU.
+    """
+    sources_by_sku = {metadata.get('sku', ''): _media_sources(metadata) for metadata in metadatas}
+    prepared = prepare_media_urls([
+        (url, sku, label) for sku, sources in sources_by_sku.items() for url, label in sources
+    ])
+    return {sku: _build_media(sku, sources, prepared) for sku, sources in sources_by_sku.items()}
+
+def _throttle_retries() -> int:
+    return getattr(config, "SHOPIFY_THROTTLE_RETRIES", 5)
+
+def _publish_concurrency() -> int:
+    return getattr(config, "SHOPIFY_PUBLISH_CONCURRENCY", 4)
+
+def _publish_retries() -> int:
+    return getattr(config, "SHOPIFY_PUBLISH_RETRIES", 2)
+
+def _request_timeout() -> float:
+    return getattr(config, "SHOPIFY_REQUEST_TIMEOUT", 60)
+
+class ShopifyRequestError(Exception):
+    """
+    A GraphQL request failed in transit (timeout, dropped connection, unreadable
+    response). Shopify may still have executed it, so a create must not be re-sent.
+    """
+
+class ShopMetadataError(Exception):
+    """A mutation rejected the cached publication or location ID."""
+
+def _raise_user_errors(errors: List[Dict[str, Any]], description: str):
+    """Raise for a mutation's userErrors; ShopMetadataError if they name a publication or location."""
+    if not errors:
+        return
+    if any(field in ("locationId", "publicationId") for e in errors for field in (e.get("field") or [])):
+        raise ShopMetadataError(f"{description} user errors: {errors}")
+    raise Exception(f"{description} user errors: {errors}")
+
+def publish_listing(metadata: Dict[str, Any], media: List[Dict[str, str]], language: str = "en") -> Dict[str, Any]:
+    """
+    Generate the title and description for one product and publish it.
+    
+    Failures are retried up to config.SHOPIFY_PUBLISH_RETRIES times with a short
+    backoff, unless the product was already created or its create request failed
+    in transit (retrying could list it twice).
+    Generated copy is kept between attempts. A SKU that is already on Shopify
+    reuses the copy it was published with, so an unchanged product is skipped
+    without any LLM or Shopify call.
+    
+    Returns:
+        publish_product_to_shopify's result plus "attempts" and "seconds"
+    """
+    sku = metadata.get('sku', '')
+    start = time.perf_counter()
+    copy = None
+    index = shopify_index()
+    previous = ((index.get_shopify_ids([sku]).get(sku) or {}).get("copy") or {}) if index else {}
+    if previous.get("language") == language and previous.get("title"):
+        copy = (previous["title"], previous.get("description", ""))
+        print(f"♻️ Reusing published copy for {sku}: {copy[0]}")
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if copy is None:
+                ai_title = generate_ai_title(metadata, language)
+                ai_description = generate_ai_description(metadata, language)
+                copy = (ai_title, ai_description)
+                print(f"🤖 Generated AI Title for {sku}: {ai_title}")
+            product_input = create_product_input_from_metadata(metadata, *copy)
+            result = publish_product_to_shopify(product_input, media, metadata,
+                                                {"title": copy[0], "description": copy[1], "language": language})
+        except Exception as e:
+            print(f"❌ Error processing product {sku}: {e}")
+            result = {'success': False, 'title': copy[0] if copy else None, 'error': str(e)}
+        if result.get('success') or result.get('product_id') or result.get('retryable') is False \
+                or attempt > _publish_retries():
+            break
+        print(f"🔁 Retrying SKU {sku} (attempt {attempt + 1}) after: {result.get('error')}")
+        time.sleep(attempt)
+    result['attempts'] = attempt
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def publish_products(jobs: List[tuple], language: str = "en") -> List[Dict[str, Any]]:
+    """
+    publish_listing for many products, config.SHOPIFY_PUBLISH_CONCURRENCY at a time.
+    The shared cost throttle in shopify_graphql keeps the combined request rate
+    within the shop's GraphQL budget.
+    
+    Args:
+        jobs: (metadata, media) tuples
+        language: Language for the generated copy
+        
+    Returns:
+        One result per job, in input order
+    """
+    start = time.perf_counter()
+    
+    def on_outcome(index: int, outcome: Dict[str, Any]):
+        sku = jobs[index][0].get('sku', '')
+        ok = outcome["status"] == "success" and outcome["result"].get("success")
+        print(f"{'✅' if ok else '❌'} Finished SKU {sku} ({outcome.get('seconds', 0):.1f}s)")
+    
+    outcomes = run_bounded(lambda job: publish_listing(job[0], job[1], language), jobs,
+                           max_workers=_publish_concurrency(), on_outcome=on_outcome)
+    results = []
+    for outcome in outcomes:
+        if outcome["status"] == "success":
+            results.append(outcome["result"])
+        else:
+            results.append({'success': False, 'title': None, 'error': outcome["error"], 'attempts': 1})
+    
+    succeeded = sum(1 for r in results if r.get('success'))
+    unchanged = sum(1 for r in results if r.get('unchanged'))
+    retried = sum(1 for r in results if r.get('attempts', 1) > 1)
+    print(f"📊 Shopify publish: {succeeded}/{len(results)} succeeded ({unchanged} unchanged), {retried} retried, "
+          f"{time.perf_counter() - start:.1f}s total")
+    return results
+
+def shopify_graphql(query: str, variables: Dict[str, Any] = None, operation: str = "graphql") -> Dict[str, Any]:
+    """
+    POST a query to the Shopify Admin GraphQL API and return the decoded JSON body.
+    Each call is recorded under metrics kind "shopify" with `operation` as its name.
+    
+    Calls wait for room in the shop's query cost bucket (utils/shopify_throttle.py),
+    and a THROTTLED response is retried once the bucket has refilled, up to
+    config.SHOPIFY_THROTTLE_RETRIES times.
+    
+    Raises:
+        ShopifyRequestError: if the request times out (config.SHOPIFY_REQUEST_TIMEOUT,
+        default 60s), the connection fails or the response is not JSON
+    """
+    url = f"https://{SHOP}/admin/api/2025-04/graphql.json"
+    headers = {
+        "Content-Type": "application/json",
+        "X-Shopify-Access-Token": ACCESS_TOKEN
+    }
+    payload = {"query": query}
+    if variables is not None:
+        payload["variables"] = variables
+    body = json.dumps(payload)
+    throttle = get_shopify_throttle()
+    for attempt in range(_throttle_retries() + 1):
+        cost = throttle.estimate(operation)
+        waited = throttle.acquire(cost)
+        if waited > 0.5:
+            print(f"⏳ Waited {waited:.1f}s for Shopify query cost budget ({operation})")
+        with track("shopify", operation) as call:
+            call["request_bytes"] = len(body.encode("utf-8"))
+            try:
+                resp = get_http_session().post(url, headers=headers, data=body, timeout=_request_timeout())
+                call["response_bytes"] = len(resp.content)
+                result = resp.json()
+            except Exception as e:
+                raise ShopifyRequestError(f"Shopify {operation} request failed: {e}") from e
+        throttle.update(result.get("extensions"), operation)
+        if not is_throttled(result) or attempt == _throttle_retries():
+            return result
+        delay = max(throttle.wait_for_restore(throttle.estimate(operation)), 1.0)
+        print(f"⏳ Shopify throttled {operation}; retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+SHOP_METADATA_QUERY = """
+query shopMetadata {
+  publications(first: 10) {
+    edges {
+      node {
+        id
+        name
+      }
+    }
+  }
+  locations(first: 10) {
+    edges {
+      node {
+        id
+        name
+      }
+    }
+  }
+}
+"""
+
+_shop_metadata: Dict[str, Any] = {}
+_shop_metadata_lock = threading.Lock()
+
+def _shop_metadata_ttl() -> float:
+    return getattr(config, "SHOP_METADATA_TTL", 3600)
+
+def _fetch_shop_metadata() -> Dict[str, Any]:
+    """Online Store publication ID and default location ID in one query."""
+    result = shopify_graphql(SHOP_METADATA_QUERY, operation="shopMetadata")
+    if result.get("errors"):
+        raise Exception(f"Shop metadata query error: {result['errors']}")
+    data = result.get("data") or {}
+    
+    # Find the Online Store publication
+    publication_id = None
+    for edge in data.get("publications", {}).get("edges", []):
+        if "Online Store" in edge["node"]["name"]:
+            publication_id = edge["node"]["id"]
+            break
+    if not publication_id:
+        raise Exception("Online Store publication ID not found!")
+    
+    locations = data.get("locations", {}).get("edges", [])
+    if not locations:
+        raise Exception("No locations found")
+    
+    return {
+        "publication_id": publication_id,
+        "location_id": locations[0]["node"]["id"],
+        "fetched_at": time.time()
+    }
+
+def get_shop_metadata(refresh: bool = False) -> Dict[str, Any]:
+    """
+    Shop-level IDs every publish needs, fetched once and kept for
+    config.SHOP_METADATA_TTL seconds (default 3600).
+    
+    Args:
+        refresh: Ignore the cached copy and query Shopify again
         
-        url = f"https://{SHOP}/admin/api/2025-04/graphql.json"
-        headers = {
-            "Content-Type": "application/json",
-            "X-Shopify-Access-Token": ACCESS_TOKEN
+    Returns:
+        Dict with "publication_id", "location_id" and "fetched_at"
+    """
+    with _shop_metadata_lock:
+        fresh = _shop_metadata and time.time() - _shop_metadata["fetched_at"] < _shop_metadata_ttl()
+        if refresh or not fresh:
+            _shop_metadata.clear()
+            _shop_metadata.update(_fetch_shop_metadata())
+            print(f"✅ Shop metadata: publication {_shop_metadata['publication_id']}, "
+                  f"location {_shop_metadata['location_id']}")
+        return dict(_shop_metadata)
+
+def invalidate_shop_metadata():
+    """Forget the cached shop IDs so the next publish fetches them again."""
+    with _shop_metadata_lock:
+        _shop_metadata.clear()
+
+def warm_shop_metadata():
+    """Fill the shop metadata cache ahead of the first publish (failures are only logged)."""
+    try:
+        get_shop_metadata()
+    except Exception as e:
+        print(f"⚠️ Could not prefetch Shopify shop metadata: {e}")
+
+def _with_shop_metadata(step, description: str):
+    """
+    Run step(shop_metadata); if Shopify rejects the cached publication or location
+    ID (ShopMetadataError), refresh the IDs and run it once more. Other failures
+    are raised as they are: the step may not be safe to repeat.
+    """
+    try:
+        return step(get_shop_metadata())
+    except ShopMetadataError as e:
+        print(f"⚠️ {description} failed ({e}); refreshing shop metadata and retrying")
+        return step(get_shop_metadata(refresh=True))
+
+PUBLISH_MUTATION = """
+mutation publishProduct($id: ID!, $input: [PublicationInput!]!) {
+  publishablePublish(id: $id, input: $input) {
+    publishable {
+      ... on Product {
+        id
+        title
+        status
+        publishedAt
+        handle
+        onlineStoreUrl
+      }
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+PRODUCT_SET_MUTATION = """
+mutation productSet($input: ProductSetInput!, $synchronous: Boolean!, $identifier: ProductSetIdentifiers) {
+  productSet(input: $input, synchronous: $synchronous, identifier: $identifier) {
+    product {
+      id
+      title
+      handle
+      variants(first: 1) {
+        nodes {
+          id
+          sku
+          price
+        }
+      }
+    }
+    userErrors {
+      field
+      message
+      code
+    }
+  }
+}
+"""
+
+def _publish_mode() -> str:
+    return getattr(config, "SHOPIFY_PUBLISH_MODE", "productSet")
+
+def _live_url(product: Dict[str, Any]) -> str:
+    """Storefront URL from a product payload ("" if it has neither URL nor handle)."""
+    if product.get("onlineStoreUrl"):
+        return product["onlineStoreUrl"]
+    if product.get("handle"):
+        return f"https://{SHOP}/products/{product['handle']}"
+    return ""
+
+def publish_to_online_store(product_id: str) -> Dict[str, Any]:
+    """
+    Publish a product to the Online Store publication.
+    
+    Returns:
+        The published product (id, handle, onlineStoreUrl, ...)
+    """
+    def publish(shop: Dict[str, Any]) -> Dict[str, Any]:
+        publish_variables = {
+            "id": product_id,
+            "input": [{"publicationId": shop["publication_id"]}]
         }
         
-        # Step 1: Get Online Store publication ID
-        print("🔄 Step 1: Getting Online Store publication ID...")
-        publications_query = """
-        query {
-          publications(first: 10) {
-            edges {
-              node {
-                id
-                name
-              }
+        publish_response = shopify_graphql(PUBLISH_MUTATION, publish_variables, operation="publishablePublish")
+        
+        if publish_response.get("errors"):
+            raise Exception(f"Publish error: {publish_response['errors']}")
+        
+        publish_data = (publish_response.get("data") or {}).get("publishablePublish") or {}
+        _raise_user_errors(publish_data.get("userErrors"), "Publish")
+        return publish_data.get("publishable") or {}
+    
+    return _with_shop_metadata(publish, "Publishing")
+
+def create_product_set_input(product_input: Dict[str, Any], media: List[Dict[str, str]],
+                             metadata: Dict[str, Any], location_id: str,
+                             set_inventory: bool = True) -> Dict[str, Any]:
+    """
+    ProductSetInput for a single-variant product with its SKU, price, stock and images.
+
+    Pass set_inventory=False for in-place updates (productSet with an identifier)
+    so the live stock level is left alone; only new products get the initial quantity.
+    """
+    variant = {
+        "optionValues": [{"optionName": "Title", "name": "Default Title"}],
+        "price": str(metadata.get('price', '100.00')),
+        "inventoryItem": {"sku": metadata.get('sku', 'DEFAULT-SKU'), "tracked": True}
+    }
+    if set_inventory:
+        variant["inventoryQuantities"] = [
+            {
+                "locationId": location_id,
+                "name": "available",
+                "quantity": 100
             }
-          }
+        ]
+    return {
+        **product_input,
+        "productOptions": [{"name": "Title", "values": [{"name": "Default Title"}]}],
+        "variants": [variant],
+        "files": [
+            {"originalSource": item["originalSource"], "contentType": item.get("mediaContentType", "IMAGE")}
+            for item in media
+        ]
+    }
+
+def _index_enabled() -> bool:
+    return getattr(config, "SHOPIFY_INDEX_ENABLED", True)
+
+_index_db = None
+_index_lock = threading.Lock()
+
+def shopify_index():
+    """
+    The ListingDatabase holding the SKU -> Shopify ID index (shared by all
+    publishes in this process), or None if config.SHOPIFY_INDEX_ENABLED is off.
+    """
+    global _index_db
+    if not _index_enabled():
+        return None
+    from .listing_database import ListingDatabase
+    
+    path = os.path.abspath(getattr(config, "LISTING_DB_PATH", "listing_ready_products.db"))
+    with _index_lock:
+        if _index_db is None or _index_db[0] != path:
+            _index_db = (path, ListingDatabase(path))
+        return _index_db[1]
+
+def publish_content_hash(product_input: Dict[str, Any], media: List[Dict[str, str]], metadata: Dict[str, Any]) -> str:
+    """Hash of everything a publish sends (copy, media, SKU, price); equal hashes need no update."""
+    import hashlib
+    
+    content = [product_input, [item.get("originalSource") for item in media],
+               metadata.get('sku', 'DEFAULT-SKU'), str(metadata.get('price', '100.00'))]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _first_variant_id(product: Dict[str, Any]):
+    nodes = ((product.get("variants") or {}).get("nodes")) or []
+    return nodes[0]["id"] if nodes else None
+
+def _indexed_result(entry: Dict[str, Any], product_input: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    product_id = entry["product_id"]
+    return {
+        'success': True,
+        'title': product_input['title'],
+        'live_url': entry.get("live_url") or "",
+        'product_id': product_id,
+        'variant_id': entry.get("variant_id"),
+        'handle': entry.get("handle"),
+        'sku': metadata.get('sku', 'DEFAULT-SKU'),
+        'price': metadata.get('price', '100.00'),
+        'admin_url': f"https://{SHOP}/admin/products/{product_id.split('/')[-1]}",
+        'unchanged': True
+    }
+
+def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[str, str]], metadata: Dict[str, Any],
+                               copy: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    Publish a product to Shopify, as an upsert keyed by SKU.
+    
+    `copy` (the generated title/description and their language) is stored in
+    the index so a later publish of the same SKU can reuse it.
+    
+    The SKU -> Shopify ID index (see shopify_index()) decides what happens:
+    - same content as the last publish: nothing is sent ('unchanged': True)
+    - published before with other content: productSet updates that product
+      in place (one round trip; 'updated': True)
+    - not published yet (or deleted in Shopify since): the product is created
+    
+    config.SHOPIFY_PUBLISH_MODE selects how products are created:
+    - "productSet" (default): one productSet mutation creates the product with its
+      variant, SKU, price, inventory and images, then publishablePublish makes it
+      live and returns its URL (two round trips)
+    - "legacy": productCreate, publishablePublish and productVariantsBulkCreate
+    
+    Returns: {'success': bool, 'title': str, 'live_url': str, 'product_id': str, 'error': str}
+    A failed result carries 'product_id' if the product had already been created.
+    """
+    sku = metadata.get('sku', 'DEFAULT-SKU')
+    index = shopify_index()
+    content_hash = publish_content_hash(product_input, media, metadata)
+    entry = index.get_shopify_ids([sku]).get(sku) if index else None
+    
+    if entry and entry.get("published") and entry.get("content_hash") == content_hash:
+        print(f"♻️ SKU {sku} is unchanged since its last publish ({entry['product_id']}); skipping")
+        return _indexed_result(entry, product_input, metadata)
+    
+    result = None
+    if entry:
+        result = update_product_with_product_set(entry, product_input, media, metadata)
+        if result is None:
+            print(f"⚠️ Indexed product {entry['product_id']} for SKU {sku} no longer exists; creating it again")
+            index.remove_shopify_ids([sku])
+    if result is None:
+        if _publish_mode() == "legacy":
+            result = publish_product_step_by_step(product_input, media, metadata)
+        else:
+            result = publish_product_with_product_set(product_input, media, metadata)
+    
+    if index is not None and result.get('success'):
+        index.put_shopify_ids({sku: {
+            "product_id": result['product_id'],
+            "variant_id": result.get('variant_id'),
+            "handle": result.get('handle'),
+            "live_url": result.get('live_url'),
+            "content_hash": content_hash,
+            "copy": copy,
+            "published": True
+        }})
+    return result
+
+def update_product_with_product_set(entry: Dict[str, Any], product_input: Dict[str, Any], media: List[Dict[str, str]],
+                                    metadata: Dict[str, Any]) -> Any:
+    """
+    Overwrite an indexed product with productSet (publishing it if it is not live yet).
+    
+    Returns:
+        A publish_product_to_shopify result with 'updated': True, or None if
+        the product no longer exists in Shopify
+    """
+    product_id = entry["product_id"]
+    sku = metadata.get('sku', 'DEFAULT-SKU')
+    try:
+        print(f"🔄 Updating {product_id} for SKU {sku} with productSet")
+        
+        def update(shop: Dict[str, Any]):
+            variables = {
+                "input": create_product_set_input(product_input, media, metadata, shop["location_id"],
+                                                  set_inventory=False),
+                "synchronous": True,
+                "identifier": {"id": product_id}
+            }
+            result = shopify_graphql(PRODUCT_SET_MUTATION, variables, operation="productSet")
+            if result.get("errors"):
+                raise Exception(f"productSet error: {result['errors']}")
+            data = (result.get("data") or {}).get("productSet") or {}
+            errors = data.get("userErrors") or []
+            if any(e.get("code") == "PRODUCT_DOES_NOT_EXIST" or "does not exist" in (e.get("message") or "")
+                   for e in errors):
+                return None
+            _raise_user_errors(errors, "productSet")
+            return data["product"]
+        
+        product = _with_shop_metadata(update, "productSet update")
+        if product is None:
+            return None
+        
+        live_url = entry.get("live_url") or _live_url(product)
+        if not entry.get("published"):
+            live_url = _live_url(publish_to_online_store(product_id)) or _live_url(product)
+        print(f"✅ Product updated: {live_url}")
+        
+        return {
+            'success': True,
+            'title': product_input['title'],
+            'live_url': live_url,
+            'product_id': product_id,
+            'variant_id': _first_variant_id(product) or entry.get("variant_id"),
+            'handle': product.get("handle"),
+            'sku': sku,
+            'price': metadata.get('price', '100.00'),
+            'admin_url': f"https://{SHOP}/admin/products/{product_id.split('/')[-1]}",
+            'updated': True
         }
-        """
+    
+    except Exception as e:
+        print(f"❌ Shopify update failed: {str(e)}")
+        return {
+            'success': False,
+            'title': product_input.get('title', 'Unknown'),
+            'product_id': product_id,
+            'error': str(e)
+        }
+
+def _create_failure(product_input: Dict[str, Any], product_id: Any, error: Exception) -> Dict[str, Any]:
+    """
+    Failed create result. If the create request itself failed in transit the
+    product may exist anyway, so the result is marked 'retryable': False.
+    """
+    result = {
+        'success': False,
+        'title': product_input.get('title', 'Unknown'),
+        'product_id': product_id,
+        'error': str(error)
+    }
+    if product_id is None and isinstance(error, ShopifyRequestError):
+        result['retryable'] = False
+        result['error'] += " (the product may have been created; run shopify_bulk --reconcile before publishing it again)"
+    return result
+
+def publish_product_with_product_set(product_input: Dict[str, Any], media: List[Dict[str, str]], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """productSet + publishablePublish; same result shape as publish_product_to_shopify."""
+    product_id = None
+    sku = metadata.get('sku', 'DEFAULT-SKU')
+    price = metadata.get('price', '100.00')
+    try:
+        print(f"🔄 Publishing {product_input.get('title', 'Unknown')} with productSet ({len(media)} media)")
         
-        resp = requests.post(url, headers=headers, json={"query": publications_query})
-        result = resp.json()
+        def create(shop: Dict[str, Any]) -> Dict[str, Any]:
+            variables = {
+                "input": create_product_set_input(product_input, media, metadata, shop["location_id"]),
+                "synchronous": True
+            }
+            result = shopify_graphql(PRODUCT_SET_MUTATION, variables, operation="productSet")
+            if result.get("errors"):
+                raise Exception(f"productSet error: {result['errors']}")
+            data = (result.get("data") or {}).get("productSet") or {}
+            _raise_user_errors(data.get("userErrors"), "productSet")
+            return data["product"]
         
-        if result.get("errors"):
-            raise Exception(f"Publications query error: {result['errors']}")
+        product = _with_shop_metadata(create, "productSet")
+        product_id = product["id"]
+        print(f"✅ Product created with ID: {product_id}")
         
-        # Find the Online Store publication
-        publication_id = None
-        for edge in result["data"]["publications"]["edges"]:
-            if "Online Store" in edge["node"]["name"]:
-                publication_id = edge["node"]["id"]
-                break
+        published = publish_to_online_store(product_id)
+        live_url = _live_url(published) or _live_url(product)
+        print(f"✅ Product published: {live_url}")
         
-        if not publication_id:
-            raise Exception("Online Store publication ID not found!")
+        return {
+            'success': True,
+            'title': product_input['title'],
+            'live_url': live_url,
+            'product_id': product_id,
+            'variant_id': _first_variant_id(product),
+            'handle': product.get("handle"),
+            'sku': sku,
+            'price': price,
+            'admin_url': f"https://{SHOP}/admin/products/{product_id.split('/')[-1]}"
+        }
+    
+    except Exception as e:
+        print(f"❌ Shopify publish failed: {str(e)}")
+        return _create_failure(product_input, product_id, e)
+
+def publish_product_step_by_step(product_input: Dict[str, Any], media: List[Dict[str, str]], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Use the existing shopify_listing.py logic to publish a product
+    Returns: {'success': bool, 'title': str, 'live_url': str, 'product_id': str, 'error': str}
+    A failed result carries 'product_id' if the product had already been created.
+    """
+    product_id = None
+    try:
+        print(f"🔄 Starting Shopify publish for product: {product_input.get('title', 'Unknown')}")
+        print(f"🔄 Media count: {len(media)}")
         
-        print(f"✅ Found publication ID: {publication_id}")
+        # Step 1: Shop-level IDs (cached across publishes)
+        get_shop_metadata()
         
         # Step 2: Create Product
         print("🔄 Step 2: Creating product...")
@@ -773,8 +1334,7 @@ def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[s
         }
         """
         variables = {"input": product_input, "media": media}
-        resp = requests.post(url, headers=headers, json={"query": create_product_query, "variables": variables})
-        result = resp.json()
+        result = shopify_graphql(create_product_query, variables, operation="productCreate")
         
         if result.get("errors"):
             raise Exception(f"Product creation error: {result['errors']}")
@@ -787,69 +1347,11 @@ def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[s
         
         # Step 3: Publish the product
         print("🔄 Step 3: Publishing product...")
-        publish_mutation = """
-        mutation publishProduct($id: ID!, $input: [PublicationInput!]!) {
-          publishablePublish(id: $id, input: $input) {
-            publishable {
-              ... on Product {
-                id
-                title
-                status
-                publishedAt
-              }
-            }
-            userErrors {
-              field
-              message
-            }
-          }
-        }
-        """
-        
-        publish_variables = {
-            "id": product_id,
-            "input": [{"publicationId": publication_id}]
-        }
-        
-        publish_response = requests.post(url, headers=headers, json={"query": publish_mutation, "variables": publish_variables}).json()
-        
-        if publish_response.get("errors"):
-            raise Exception(f"Publish error: {publish_response['errors']}")
-        
-        publish_data = publish_response.get("data", {}).get("publishablePublish", {})
-        if publish_data.get("userErrors"):
-            raise Exception(f"Publish user errors: {publish_data['userErrors']}")
-        
+        published = publish_to_online_store(product_id)
         print("✅ Product published successfully")
         
-        # Step 4: Get default location ID
-        print("🔄 Step 4: Getting location ID...")
-        locations_query = """
-        query {
-          locations(first: 10) {
-            edges {
-              node {
-                id
-                name
-              }
-            }
-          }
-        }
-        """
-        
-        locations_response = requests.post(url, headers=headers, json={"query": locations_query}).json()
-        if locations_response.get("errors"):
-            raise Exception(f"Location error: {locations_response['errors']}")
-        
-        locations_data = locations_response.get("data", {}).get("locations", {}).get("edges", [])
-        if not locations_data:
-            raise Exception("No locations found")
-        
-        location_id = locations_data[0]["node"]["id"]
-        print(f"✅ Found location ID: {location_id}")
-        
-        # Step 5: Update variant with SKU, price, and inventory
-        print("🔄 Step 5: Updating variant...")
+        # Step 4: Update variant with SKU, price, and inventory at the default location
+        print("🔄 Step 4: Updating variant...")
         sku = metadata.get('sku', 'DEFAULT-SKU')
         price = metadata.get('price', '100.00')
         
@@ -870,59 +1372,57 @@ def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[s
         }
         """
         
-        update_variant_variables = {
-            "productId": product_id,
-            "variants": [
-                {
-                    "price": str(price),
-                    "inventoryItem": {"sku": sku},
-                    "inventoryQuantities": [
-                        {
-                            "availableQuantity": 100,
-                            "locationId": location_id
-                        }
-                    ]
-                }
-            ],
-            "strategy": "REMOVE_STANDALONE_VARIANT"
-        }
+        def update_variant(shop: Dict[str, Any]):
+            update_variant_variables = {
+                "productId": product_id,
+                "variants": [
+                    {
+                        "price": str(price),
+                        "inventoryItem": {"sku": sku},
+                        "inventoryQuantities": [
+                            {
+                                "availableQuantity": 100,
+                                "locationId": shop["location_id"]
+                            }
+                        ]
+                    }
+                ],
+                "strategy": "REMOVE_STANDALONE_VARIANT"
+            }
         
-        update_variant_response = requests.post(url, headers=headers, json={"query": update_variant_mutation, "variables": update_variant_variables}).json()
+            update_variant_response = shopify_graphql(update_variant_mutation, update_variant_variables, operation="productVariantsBulkCreate")
         
-        if update_variant_response.get("errors"):
-            raise Exception(f"Variant update error: {update_variant_response['errors']}")
+            if update_variant_response.get("errors"):
+                raise Exception(f"Variant update error: {update_variant_response['errors']}")
         
-        update_variant_data = update_variant_response.get("data", {}).get("productVariantsBulkCreate", {})
-        if update_variant_data.get("userErrors"):
-            raise Exception(f"Variant update user errors: {update_variant_data['userErrors']}")
+            update_variant_data = update_variant_response.get("data", {}).get("productVariantsBulkCreate", {})
+            _raise_user_errors(update_variant_data.get("userErrors"), "Variant update")
+            return update_variant_data.get("productVariants") or []
         
+        variants = _with_shop_metadata(update_variant, "Variant update")
         print("✅ Variant updated successfully")
         
-        # Step 6: Get the live product URL
-        print("🔄 Step 6: Getting product URL...")
-        get_product_query = """
-        query getProduct($id: ID!) {
-          product(id: $id) {
-            id
-            title
-            handle
-            onlineStoreUrl
-          }
-        }
-        """
-        
-        product_response = requests.post(url, headers=headers, json={"query": get_product_query, "variables": {"id": product_id}}).json()
-        if product_response.get("errors"):
-            raise Exception(f"Product URL error: {product_response['errors']}")
-        
-        product_data = product_response.get("data", {}).get("product", {})
-        handle = product_data.get("handle")
-        online_store_url = product_data.get("onlineStoreUrl")
-        
-        if online_store_url:
-            live_url = online_store_url
-        else:
-            live_url = f"https://{SHOP}/products/{handle}"
+        # Step 5: Get the live product URL (already in the publish response when
+        # the product is live on the Online Store)
+        live_url = _live_url(published)
+        if not live_url:
+            print("🔄 Step 5: Getting product URL...")
+            get_product_query = """
+            query getProduct($id: ID!) {
+              product(id: $id) {
+                id
+                title
+                handle
+                onlineStoreUrl
+              }
+            }
+            """
+            
+            product_response = shopify_graphql(get_product_query, {"id": product_id}, operation="product")
+            if product_response.get("errors"):
+                raise Exception(f"Product URL error: {product_response['errors']}")
+            
+            live_url = _live_url(product_response.get("data", {}).get("product", {}))
         
         print(f"✅ Product URL: {live_url}")
         
@@ -931,6 +1431,8 @@ def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[s
             'title': product_input['title'],
             'live_url': live_url,
             'product_id': product_id,
+            'variant_id': variants[0]["id"] if variants else None,
+            'handle': published.get("handle"),
             'sku': sku,
             'price': price,
             'admin_url': f"https://{SHOP}/admin/products/{product_id.split('/')[-1]}"
@@ -938,15 +1440,11 @@ def publish_product_to_shopify(product_input: Dict[str, Any], media: List[Dict[s
         
     except Exception as e:
         print(f"❌ Shopify publish failed: {str(e)}")
-        return {
-            'success': False,
-            'title': product_input.get('title', 'Unknown'),
-            'error': str(e)
-        }
+        return _create_failure(product_input, product_id, e)
 
 def generate_ai_title(metadata: Dict[str, Any], language: str = "en") -> str:
     """Generate AI-written product title."""
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7, request_timeout=15)
+    llm = get_llm("shopify_title")
     
     product_data = f"""
 SKU: {metadata.get('sku', 'N/A')}
@@ -995,7 +1493,7 @@ Title:"""
 
 def generate_ai_description(metadata: Dict[str, Any], language: str = "en") -> str:
     """Generate AI-written product description."""
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7, request_timeout=15)
+    llm = get_llm("shopify_description")
     
     product_data = f"""
 SKU: {metadata.get('sku', 'N/A')}
@@ -1049,7 +1547,7 @@ def generate_shopify_response(successful_products: List[Dict], failed_products:
     if not successful_products:
         return "❌ No products were successfully published to Shopify."
     
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3, request_timeout=10)
+    llm = get_llm("shopify_response")
     
     # Check if any product has Chinese characters to determine language
     has_chinese = any('\u4e00' <= char <= '\u9fff' for char in str(successful_products))
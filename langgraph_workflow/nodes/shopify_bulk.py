@@ -0,0 +1,511 @@
+"""
+Catalog-scale publishing through Shopify's bulk mutation API.
+
+    report = bulk_publish_catalog("all_new_skus_us.json")
+
+    python -m langgraph_workflow.nodes.shopify_bulk all_new_skus_us.json [--limit 50] [--no-publish]
+    python -m langgraph_workflow.nodes.shopify_bulk --reconcile
+
+Publishing a region's catalog one product at a time costs several GraphQL
+calls per SKU and quickly runs into the shop's rate limit. In bulk mode:
+
+1. every catalog product becomes one line of productSet variables (title,
+   description, single variant with SKU/price/stock, images), written as JSONL,
+2. the file goes to a staged upload target (stagedUploadsCreate + one POST),
+3. bulkOperationRunMutation runs productSet over the whole file as one job,
+   which is polled until it finishes,
+4. a second bulk job runs publishablePublish for the created products,
+5. the result files are matched to SKUs by line number and recorded in the
+   listing database (status "listed" / "listing_failed", see
+   ListingDatabase.record_listing_results) and in its SKU -> Shopify ID index.
+
+Pushes are upserts: SKUs whose content hash matches the index are skipped and
+indexed SKUs with changed content are updated in place, so a rerun only sends
+what changed. reconcile_shopify_index() rebuilds the index from the shop with
+one bulk products query (--reconcile on the command line).
+
+Shopify runs one bulk mutation per shop at a time. Titles come from the
+catalog names; no LLM copy is generated at this scale.
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+from langgraph_workflow.utils.clients import get_http_session
+from langgraph_workflow.utils.metrics import track
+from .shopify_agent import (
+    PUBLISH_MUTATION, SHOP, create_media_for_products, create_product_input_from_metadata,
+    create_product_set_input, get_shop_metadata, publish_content_hash, shopify_graphql
+)
+
+STAGED_UPLOAD_MUTATION = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets {
+      url
+      resourceUrl
+      parameters {
+        name
+        value
+      }
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+BULK_RUN_MUTATION = """
+mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+    bulkOperation {
+      id
+      status
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+BULK_STATUS_QUERY = """
+query bulkOperationStatus($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation {
+      id
+      status
+      errorCode
+      objectCount
+      url
+      partialDataUrl
+    }
+  }
+}
+"""
+
+BULK_PRODUCT_SET_MUTATION = """
+mutation productSet($input: ProductSetInput!, $identifier: ProductSetIdentifiers) {
+  productSet(input: $input, identifier: $identifier) {
+    product {
+      id
+      handle
+      variants(first: 1) {
+        nodes {
+          id
+        }
+      }
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+BULK_QUERY_MUTATION = """
+mutation bulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation {
+      id
+      status
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+PRODUCTS_EXPORT_QUERY = """
+{
+  products {
+    edges {
+      node {
+        id
+        handle
+        onlineStoreUrl
+        variants {
+          edges {
+            node {
+              id
+              sku
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+FINISHED_STATUSES = ("COMPLETED", "FAILED", "CANCELED", "EXPIRED")
+
+def _poll_interval() -> float:
+    return getattr(config, "SHOPIFY_BULK_POLL_INTERVAL", 5)
+
+def _bulk_timeout() -> float:
+    return getattr(config, "SHOPIFY_BULK_TIMEOUT", 3600)
+
+def catalog_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Search-result style metadata for a raw catalog entry (all_new_skus_*.json),
+    with the same fields embeddings/upsert_giga_to_pinecone.py indexes.
+    """
+    import re
+
+    attributes = product.get("attributes") or ""
+    color = material = scene = None
+    if isinstance(attributes, str):
+        match = re.search(r"main_color='([^']*)'", attributes)
+        color = match.group(1) if match else None
+        match = re.search(r"main_material='([^']*)'", attributes)
+        material = match.group(1) if match else None
+        match = re.search(r"scene=([^,)]*)", attributes)
+        scene = match.group(1) if match and match.group(1) != "None" else None
+    elif isinstance(attributes, dict):
+        color, material, scene = attributes.get("main_color"), attributes.get("main_material"), attributes.get("scene")
+
+    image_urls = product.get("image_urls") or []
+    main_image_url = product.get("main_image_url", "")
+    if not image_urls and main_image_url:
+        image_urls = [main_image_url]
+
+    metadata = {key: product[key] for key in (
+        "sku", "name", "price", "category", "category_code", "weight", "length", "width", "height",
+        "weight_kg", "length_cm", "width_cm", "height_cm", "US", "EU"
+    ) if product.get(key) is not None}
+    for key, value in (("color", color), ("material", material), ("scene", scene)):
+        if value is not None:
+            metadata[key] = value
+    metadata["characteristics_text"] = " ".join(product.get("characteristics") or [])
+    metadata["image_urls"] = image_urls
+    metadata["main_image_url"] = main_image_url
+    metadata["total_images"] = len(image_urls)
+    return metadata
+
+def load_catalog(path: str, limit: int = None) -> List[Dict[str, Any]]:
+    """Catalog metadata from a JSON file, one entry per SKU (first occurrence wins)."""
+    with open(path, "r") as f:
+        products = json.load(f)
+    metadatas = []
+    seen = set()
+    for product in products:
+        sku = product.get("sku")
+        if sku and sku not in seen:
+            seen.add(sku)
+            metadatas.append(catalog_metadata(product))
+    return metadatas[:limit] if limit else metadatas
+
+def to_jsonl(lines: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+
+def stage_upload(data: bytes, filename: str = "bulk_op_vars.jsonl") -> str:
+    """
+    Upload a bulk variables file to a staged upload target.
+
+    Returns:
+        The stagedUploadPath to pass to bulkOperationRunMutation
+    """
+    result = shopify_graphql(STAGED_UPLOAD_MUTATION, {"input": [{
+        "resource": "BULK_MUTATION_VARIABLES",
+        "filename": filename,
+        "mimeType": "text/jsonl",
+        "httpMethod": "POST"
+    }]}, operation="stagedUploadsCreate")
+    if result.get("errors"):
+        raise Exception(f"Staged upload error: {result['errors']}")
+    staged = (result.get("data") or {}).get("stagedUploadsCreate") or {}
+    if staged.get("userErrors"):
+        raise Exception(f"Staged upload user errors: {staged['userErrors']}")
+
+    target = staged["stagedTargets"][0]
+    fields = {param["name"]: param["value"] for param in target["parameters"]}
+    with track("shopify", "stagedUpload") as call:
+        call["request_bytes"] = len(data)
+        # The file must come after the signed form fields
+        resp = get_http_session().post(target["url"], data=fields,
+                                       files={"file": (filename, data, "text/jsonl")}, timeout=120)
+        resp.raise_for_status()
+    return fields["key"]
+
+def run_bulk_mutation(mutation: str, lines: List[Dict[str, Any]]) -> str:
+    """Stage the variables and start a bulk mutation; returns the bulk operation ID."""
+    path = stage_upload(to_jsonl(lines))
+    result = shopify_graphql(BULK_RUN_MUTATION, {"mutation": mutation, "stagedUploadPath": path},
+                             operation="bulkOperationRunMutation")
+    if result.get("errors"):
+        raise Exception(f"Bulk operation error: {result['errors']}")
+    data = (result.get("data") or {}).get("bulkOperationRunMutation") or {}
+    if data.get("userErrors"):
+        raise Exception(f"Bulk operation user errors: {data['userErrors']}")
+    operation_id = data["bulkOperation"]["id"]
+    print(f"📦 Started bulk operation {operation_id} ({len(lines)} lines)")
+    return operation_id
+
+def wait_for_bulk_operation(operation_id: str, poll_interval: float = None, timeout: float = None) -> Dict[str, Any]:
+    """
+    Poll a bulk operation until it reaches a final status.
+
+    Returns:
+        The BulkOperation (status, errorCode, objectCount, url, partialDataUrl)
+
+    Raises:
+        TimeoutError: if it is still running after `timeout` seconds
+    """
+    poll_interval = poll_interval if poll_interval is not None else _poll_interval()
+    deadline = time.monotonic() + (timeout if timeout is not None else _bulk_timeout())
+    while True:
+        result = shopify_graphql(BULK_STATUS_QUERY, {"id": operation_id}, operation="bulkOperationStatus")
+        if result.get("errors"):
+            raise Exception(f"Bulk status error: {result['errors']}")
+        operation = (result.get("data") or {}).get("node") or {}
+        if operation.get("status") in FINISHED_STATUSES:
+            print(f"📦 Bulk operation {operation_id}: {operation['status']} ({operation.get('objectCount')} objects)")
+            return operation
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Bulk operation {operation_id} still {operation.get('status')}")
+        time.sleep(poll_interval)
+
+def fetch_bulk_results(operation: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """Result lines of a finished bulk operation keyed by input line number."""
+    url = operation.get("url") or operation.get("partialDataUrl")
+    if not url:
+        return {}
+    with track("shopify", "bulkResults") as call:
+        resp = get_http_session().get(url, timeout=120)
+        resp.raise_for_status()
+        call["response_bytes"] = len(resp.content)
+    results = {}
+    for line in resp.content.decode("utf-8").splitlines():
+        if line.strip():
+            entry = json.loads(line)
+            results[entry.get("__lineNumber", len(results))] = entry
+    return results
+
+def _run_and_collect(mutation: str, lines: List[Dict[str, Any]], field: str) -> tuple:
+    """Run one bulk job; returns (operation_id, [payload or None per line])."""
+    operation_id = run_bulk_mutation(mutation, lines)
+    operation = wait_for_bulk_operation(operation_id)
+    if operation.get("status") != "COMPLETED":
+        print(f"⚠️ Bulk operation {operation_id} ended {operation.get('status')}: {operation.get('errorCode')}")
+    results = fetch_bulk_results(operation)
+    return operation_id, [((results.get(i) or {}).get("data") or {}).get(field) for i in range(len(lines))]
+
+def _line_error(payload: Optional[Dict[str, Any]]) -> Optional[str]:
+    if payload is None:
+        return "No result returned for this line"
+    if payload.get("userErrors"):
+        return str(payload["userErrors"])
+    return None
+
+def bulk_publish(metadatas: List[Dict[str, Any]], publish: bool = True, validate_images: bool = True,
+                 db=None) -> Dict[str, Any]:
+    """
+    Create, update (and publish) many products with bulk operations.
+
+    SKUs in the SKU -> Shopify ID index whose content hash matches are skipped;
+    indexed SKUs with other content are updated in place (productSet with an
+    identifier) and everything else is created. Indexed SKUs keep the title and
+    description they were published with; new ones are titled with the catalog name.
+
+    Args:
+        metadatas: Product metadata (search-result / catalog_metadata format)
+        publish: Also publish new products to the Online Store
+        validate_images: Check images against the 25MP limit first (ranged probes)
+        db: ListingDatabase to reconcile into (default: the configured one)
+
+    Returns:
+        Report dict with "total", "skipped", "created", "updated", "published",
+        "failed" (list of {"sku", "error"}), "operations" and "seconds"
+    """
+    from .listing_database import ListingDatabase
+
+    start = time.perf_counter()
+    db = db or ListingDatabase()
+    report = {"total": len(metadatas), "skipped": 0, "created": 0, "updated": 0, "published": 0,
+              "failed": [], "operations": []}
+    metadatas = [m for m in metadatas if m.get("sku")]
+    indexed = db.get_shopify_ids([m["sku"] for m in metadatas])
+
+    shop = get_shop_metadata()
+    if validate_images:
+        media_by_sku = create_media_for_products(metadatas)
+    else:
+        media_by_sku = {
+            m["sku"]: [{"originalSource": url, "mediaContentType": "IMAGE"} for url in m.get("image_urls", [])]
+            for m in metadatas
+        }
+
+    pending, lines, hashes = [], [], {}
+    for metadata in metadatas:
+        sku = metadata["sku"]
+        entry = indexed.get(sku)
+        # Keep the copy an earlier publish stored, so the two publish paths agree
+        copy = (entry or {}).get("copy") or {}
+        if copy.get("title"):
+            product_input = create_product_input_from_metadata(metadata, copy["title"], copy.get("description", ""))
+        else:
+            product_input = create_product_input_from_metadata(metadata, (metadata.get("name") or sku)[:255], "")
+        media = media_by_sku.get(sku, [])
+        hashes[sku] = publish_content_hash(product_input, media, metadata)
+        if entry and entry.get("published") and entry.get("content_hash") == hashes[sku]:
+            report["skipped"] += 1
+            continue
+        # Updates leave the live stock alone; only new products get the initial quantity
+        line = {"input": create_product_set_input(product_input, media, metadata, shop["location_id"],
+                                                  set_inventory=not entry)}
+        if entry:
+            line["identifier"] = {"id": entry["product_id"]}
+        pending.append(metadata)
+        lines.append(line)
+    if not pending:
+        print("ℹ️ Every SKU is already on Shopify and unchanged")
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    operation_id, created = _run_and_collect(BULK_PRODUCT_SET_MUTATION, lines, "productSet")
+    report["operations"].append(operation_id)
+
+    results = {}
+    deleted = []
+    for metadata, payload in zip(pending, created):
+        sku = metadata["sku"]
+        entry = indexed.get(sku)
+        error = _line_error(payload)
+        product = (payload or {}).get("product") or {}
+        if error or not product.get("id"):
+            if entry and "does not exist" in (error or ""):
+                deleted.append(sku)
+                error = "Product was deleted in Shopify; it will be created again on the next run"
+            results[sku] = {"success": False, "error": error or "No product created", "metadata": metadata,
+                            "bulk_operation_id": operation_id}
+            continue
+        product_id = product["id"]
+        nodes = (product.get("variants") or {}).get("nodes") or []
+        results[sku] = {
+            "success": True,
+            "product_id": product_id,
+            "variant_id": nodes[0]["id"] if nodes else None,
+            "handle": product.get("handle"),
+            "live_url": (entry or {}).get("live_url") or
+                        (f"https://{SHOP}/products/{product['handle']}" if product.get("handle") else ""),
+            "admin_url": f"https://{SHOP}/admin/products/{product_id.split('/')[-1]}",
+            "published": bool(entry and entry.get("published")),
+            "metadata": metadata,
+            "bulk_operation_id": operation_id
+        }
+        report["updated" if entry else "created"] += 1
+    if deleted:
+        db.remove_shopify_ids(deleted)
+
+    to_publish = [sku for sku, result in results.items() if result["success"] and not result["published"]]
+    if publish and to_publish:
+        publish_lines = [{"id": results[sku]["product_id"], "input": [{"publicationId": shop["publication_id"]}]}
+                         for sku in to_publish]
+        publish_id, published = _run_and_collect(PUBLISH_MUTATION, publish_lines, "publishablePublish")
+        report["operations"].append(publish_id)
+        for sku, payload in zip(to_publish, published):
+            error = _line_error(payload)
+            if error:
+                # The product exists but is not on the Online Store yet
+                results[sku].update({"success": False, "error": f"Created but not published: {error}"})
+                continue
+            publishable = payload.get("publishable") or {}
+            if publishable.get("onlineStoreUrl"):
+                results[sku]["live_url"] = publishable["onlineStoreUrl"]
+            results[sku]["published"] = True
+            report["published"] += 1
+
+    # Index every product that exists now, published or not, so no rerun creates it twice
+    db.put_shopify_ids({
+        sku: {**{key: result.get(key) for key in ("product_id", "variant_id", "handle", "live_url", "published")},
+              "content_hash": hashes[sku] if result["published"] else None}
+        for sku, result in results.items() if result.get("product_id")
+    })
+    db.record_listing_results(results)
+    report["failed"] = [{"sku": sku, "error": r["error"]} for sku, r in results.items() if not r["success"]]
+    report["seconds"] = time.perf_counter() - start
+    print(f"📊 Bulk publish: {report['created']} created, {report['updated']} updated, "
+          f"{report['published']} published, {len(report['failed'])} failed, "
+          f"{report['skipped']} unchanged, {report['seconds']:.1f}s")
+    return report
+
+def reconcile_shopify_index(db=None) -> Dict[str, Any]:
+    """
+    Rebuild the SKU -> Shopify ID index from the shop with one bulk products query.
+
+    Products found by SKU are added or corrected (their content hash is kept if
+    the product ID matches, otherwise cleared so the next publish updates them);
+    indexed SKUs whose product is gone from the shop are removed.
+
+    Returns:
+        Dict with "found", "removed", "operation" and "seconds"
+    """
+    from .listing_database import ListingDatabase
+
+    start = time.perf_counter()
+    db = db or ListingDatabase()
+    result = shopify_graphql(BULK_QUERY_MUTATION, {"query": PRODUCTS_EXPORT_QUERY}, operation="bulkOperationRunQuery")
+    if result.get("errors"):
+        raise Exception(f"Bulk query error: {result['errors']}")
+    data = (result.get("data") or {}).get("bulkOperationRunQuery") or {}
+    if data.get("userErrors"):
+        raise Exception(f"Bulk query user errors: {data['userErrors']}")
+    operation_id = data["bulkOperation"]["id"]
+    operation = wait_for_bulk_operation(operation_id)
+    if operation.get("status") != "COMPLETED":
+        raise Exception(f"Bulk query {operation_id} ended {operation.get('status')}: {operation.get('errorCode')}")
+
+    products, found = {}, {}
+    for line in fetch_bulk_results(operation).values():
+        if "__parentId" not in line:
+            products[line["id"]] = line
+        elif line.get("sku"):
+            product = products.get(line["__parentId"], {"id": line["__parentId"]})
+            # A SKU listed twice keeps its first product
+            found.setdefault(line["sku"], {
+                "product_id": product["id"],
+                "variant_id": line["id"],
+                "handle": product.get("handle"),
+                "live_url": product.get("onlineStoreUrl"),
+                "published": bool(product.get("onlineStoreUrl"))
+            })
+    db.put_shopify_ids(found)
+    gone = [sku for sku, entry in db.get_shopify_ids().items() if entry["product_id"] not in products]
+    removed = db.remove_shopify_ids(gone)
+    report = {"found": len(found), "removed": removed, "operation": operation_id,
+              "seconds": time.perf_counter() - start}
+    print(f"📊 Shopify index reconciled: {len(found)} SKUs found, {removed} removed")
+    return report
+
+def bulk_publish_catalog(path: str, limit: int = None, **kwargs) -> Dict[str, Any]:
+    """bulk_publish for every SKU in a catalog file (e.g. all_new_skus_us.json)."""
+    return bulk_publish(load_catalog(path, limit), **kwargs)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish a catalog file to Shopify with bulk operations")
+    parser.add_argument("catalog", nargs="?", help="Catalog JSON, e.g. all_new_skus_us.json")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N SKUs")
+    parser.add_argument("--no-publish", action="store_true", help="Create products without publishing them")
+    parser.add_argument("--skip-image-check", action="store_true", help="Do not probe images for the 25MP limit")
+    parser.add_argument("--reconcile", action="store_true", help="Rebuild the SKU -> Shopify ID index from the shop first")
+    args = parser.parse_args()
+    if not args.catalog and not args.reconcile:
+        parser.error("a catalog file or --reconcile is required")
+
+    if args.reconcile:
+        print(json.dumps(reconcile_shopify_index(), indent=2))
+    if args.catalog:
+        report = bulk_publish_catalog(args.catalog, args.limit, publish=not args.no_publish,
+                                      validate_images=not args.skip_image_check)
+        print(json.dumps(report, indent=2))
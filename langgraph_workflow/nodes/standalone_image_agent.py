@@ -10,7 +10,7 @@ import tempfile
 import requests
 from typing import Dict, List, Optional
 from langchain.schema import AIMessage, HumanMessage
-from .image_agent import ImageAgent, generate_replicate_prompt
+from .image_agent import ImageAgent, generate_replicate_prompt, wants_regenerate
 
 
 def standalone_image_agent_node(state):
@@ -135,7 +135,8 @@ def _process_uploaded_files_standalone(agent: ImageAgent, state: Dict, uploaded_
             # Process the image using the same logic as the workflow image agent
             result = agent.image_processor.process_local_image(
                 image_path=file_path,
-                instruction=enhanced_prompt
+                instruction=enhanced_prompt,
+                use_cache=not wants_regenerate(user_query)
             )
             
             if result and result.get("status") == "success":
@@ -0,0 +1,114 @@
+"""
+Process-wide SDK clients, created on first use.
+
+boto3, replicate, pinecone and openai are only imported when a client is first
+requested, so importing the workflow (API workers, LangGraph CLI) stays cheap
+and every node shares one client per service instead of building its own.
+
+`set_client()` installs a replacement for any of them (used by the offline
+benchmarks to swap in local stand-ins).
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+import config
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the cached client `name`, creating it with `factory` if needed."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+def set_client(name: str, client: Any):
+    """Install `client` under `name` (e.g. "replicate", "s3:us-east-1", "http")."""
+    with _clients_lock:
+        _clients[name] = client
+
+def reset_clients():
+    """Drop every cached client so the next call creates fresh ones."""
+    with _clients_lock:
+        _clients.clear()
+
+def get_replicate_client():
+    """Shared Replicate client."""
+    def factory():
+        import replicate
+        return replicate.Client(api_token=config.REPLICATE_API_TOKEN)
+    return _get_or_create("replicate", factory)
+
+def get_s3_client(region: Optional[str] = None):
+    """Shared boto3 S3 client for the given region (defaults to config.AWS_REGION)."""
+    region = region or config.AWS_REGION
+
+    def factory():
+        import boto3
+        return boto3.client(
+            "s3",
+            region_name=region,
+            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY
+        )
+    return _get_or_create(f"s3:{region}", factory)
+
+def get_openai_client():
+    """Shared OpenAI SDK client (used for embeddings)."""
+    def factory():
+        import openai
+        return openai.OpenAI(api_key=config.OPENAI_API_KEY)
+    return _get_or_create("openai", factory)
+
+def get_pinecone_index():
+    """Shared handle to the product Pinecone index."""
+    def factory():
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=config.PINECONE_API_KEY)
+        return pc.Index(config.INDEX_NAME)
+    return _get_or_create("pinecone_index", factory)
+
+def get_http_session():
+    """Shared pooled requests.Session for plain HTTP calls (image downloads, Shopify GraphQL)."""
+    def factory():
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        pool_size = getattr(config, "HTTP_POOL_SIZE", 20)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    return _get_or_create("http", factory)
+
+def get_storage():
+    """
+    Shared content-addressed image storage (see utils/storage.py).
+
+    config.STORAGE_BACKEND = "local" stores files under config.LOCAL_STORAGE_DIR;
+    otherwise S3 is used, or None is returned while S3_BUCKET_NAME is unset.
+    """
+    from langgraph_workflow.utils import storage
+
+    if getattr(config, "STORAGE_BACKEND", "s3") == "local":
+        return _get_or_create("storage", lambda: storage.LocalStorage(
+            getattr(config, "LOCAL_STORAGE_DIR", "local_storage"),
+            getattr(config, "LOCAL_STORAGE_BASE_URL", None)
+        ))
+
+    bucket = getattr(config, "S3_BUCKET_NAME", None)
+    if not bucket or bucket == "your-image-bucket":
+        return None
+    return _get_or_create("storage", lambda: storage.S3Storage(
+        get_s3_client(),
+        bucket,
+        config.AWS_REGION,
+        multipart_threshold=getattr(config, "S3_MULTIPART_THRESHOLD", 8 * storage.MB),
+        multipart_chunksize=getattr(config, "S3_MULTIPART_CHUNKSIZE", 8 * storage.MB),
+        max_concurrency=getattr(config, "S3_MAX_CONCURRENCY", 8)
+    ))
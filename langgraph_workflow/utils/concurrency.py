@@ -0,0 +1,121 @@
+"""
+Bounded parallel execution for slow external jobs (Replicate edits, uploads, ...).
+
+    outcomes = run_bounded(edit_one, images, max_workers=4, timeout=180)
+
+Jobs run on worker threads with at most `max_workers` in flight. Each outcome
+comes back in input order as a dict:
+
+    {"status": "success", "result": <return value>, "seconds": 1.2}
+    {"status": "error", "error": "...", "seconds": 0.4}
+    {"status": "timeout", "error": "...", "seconds": 180.0}
+    {"status": "cancelled", "error": "..."}
+
+A job that exceeds `timeout` is reported as timed out at once, but threads
+cannot be killed: it keeps its slot until its thread actually returns (the
+late result is discarded), so no more than `max_workers` calls ever run at
+the same time. Jobs should therefore end on their own, e.g. through their own
+request timeouts. Setting `cancel_event` stops new jobs from starting and
+abandons the running ones.
+`on_outcome(index, outcome)` is called as each job finishes, for progress
+reporting. Trace IDs and other context variables are copied into the workers.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+def _outcome_for(fn: Callable, item: Any, context: contextvars.Context) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        result = context.run(fn, item)
+        return {"status": "success", "result": result, "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"status": "error", "error": str(e), "seconds": time.perf_counter() - start}
+
+def run_bounded(fn: Callable[[Any], Any], items: List[Any], max_workers: int = 4,
+                timeout: Optional[float] = None, cancel_event: Optional[threading.Event] = None,
+                on_outcome: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                poll_interval: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Run fn(item) for every item with bounded parallelism.
+
+    Args:
+        fn: Job function, called once per item on a worker thread
+        items: Job inputs
+        max_workers: Maximum number of jobs in flight
+        timeout: Seconds a single job may run before it is reported as timed out
+            (None = no limit); its slot is only reused once it returns
+        cancel_event: When set, pending jobs are cancelled and running jobs abandoned
+        on_outcome: Called with (index, outcome) as each job finishes
+        poll_interval: How often timeouts and cancellation are checked
+
+    Returns:
+        One outcome dict per item, in input order
+    """
+    items = list(items)
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    if not items:
+        return []
+
+    finished: "queue.Queue" = queue.Queue()
+    running: Dict[int, float] = {}
+    abandoned = set()  # timed out, but their threads still hold a slot
+    next_index = 0
+    max_workers = max(1, max_workers)
+
+    def worker(index: int, item: Any, context: contextvars.Context):
+        finished.put((index, _outcome_for(fn, item, context)))
+
+    def settle(index: int, outcome: Dict[str, Any]):
+        outcomes[index] = outcome
+        if on_outcome:
+            try:
+                on_outcome(index, outcome)
+            except Exception as e:
+                print(f"⚠️ Progress callback failed: {e}")
+
+    # Once every job has started and settled, abandoned threads are left to finish alone
+    while next_index < len(items) or running:
+        if cancel_event is not None and cancel_event.is_set():
+            for index in list(running) + list(range(next_index, len(items))):
+                settle(index, {"status": "cancelled", "error": "Cancelled"})
+            running.clear()
+            break
+
+        while len(running) + len(abandoned) < max_workers and next_index < len(items):
+            thread = threading.Thread(
+                target=worker,
+                args=(next_index, items[next_index], contextvars.copy_context()),
+                name=f"bounded-job-{next_index}",
+                daemon=True
+            )
+            running[next_index] = time.monotonic()
+            thread.start()
+            next_index += 1
+
+        wait = poll_interval
+        if timeout is not None and running:
+            earliest = min(running.values()) + timeout
+            wait = max(0.0, min(wait, earliest - time.monotonic()))
+        try:
+            index, outcome = finished.get(timeout=wait)
+            # Results of abandoned (timed out) jobs are dropped; their slot is free again
+            abandoned.discard(index)
+            if index in running:
+                del running[index]
+                settle(index, outcome)
+        except queue.Empty:
+            pass
+
+        if timeout is not None:
+            now = time.monotonic()
+            for index, started in list(running.items()):
+                if now - started >= timeout:
+                    del running[index]
+                    abandoned.add(index)
+                    settle(index, {"status": "timeout", "error": f"Timed out after {timeout:.0f}s", "seconds": now - started})
+
+    return outcomes
@@ -0,0 +1,156 @@
+"""
+Content-addressed cache of image edit results.
+
+    key = edit_cache_key(file_source(path), english_prompt, "jpg")
+    entry = get_cached_edit(key)             # None on a miss
+    put_cached_edit(key, modified_url, source_url=url, prompt=english_prompt,
+                    output_format="jpg")     # after a successful Flux Kontext run
+
+The key is a SHA-256 over the source (hash of the file bytes for uploads, the
+URL for catalog images), the normalized Replicate prompt, the output format
+and the model, so the same edit requested in another session, a retry or a
+re-uploaded file reuses the earlier result instead of paying for a new run.
+
+Entries are persisted to config.IMAGE_EDIT_CACHE_PATH (default
+image_edit_cache.json). They expire after config.IMAGE_EDIT_CACHE_TTL seconds
+(Replicate only serves replicate.delivery outputs for about an hour, so the
+default is 3600; raise it once outputs are copied to durable storage) and the
+least recently used entries are evicted past config.IMAGE_EDIT_CACHE_MAX_ENTRIES.
+Hits only update memory; their use times reach the file with the next put or
+eviction. Set config.IMAGE_EDIT_CACHE_ENABLED = False to turn the cache off.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+from langgraph_workflow.utils.storage import file_sha256
+
+_entries: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_loaded = False
+
+def _cache_path() -> str:
+    return getattr(config, "IMAGE_EDIT_CACHE_PATH", "image_edit_cache.json")
+
+def _ttl() -> float:
+    return getattr(config, "IMAGE_EDIT_CACHE_TTL", 3600)
+
+def _max_entries() -> int:
+    return getattr(config, "IMAGE_EDIT_CACHE_MAX_ENTRIES", 2000)
+
+def cache_enabled() -> bool:
+    return getattr(config, "IMAGE_EDIT_CACHE_ENABLED", True)
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the edit."""
+    return re.sub(r"\s+", " ", prompt or "").strip().rstrip(".!。！").lower()
+
+def file_source(path: str) -> str:
+    """Cache source for a local file: the SHA-256 of its bytes."""
+    return f"sha256:{file_sha256(path)}"
+
+def url_source(url: str) -> str:
+    """Cache source for a remote image: its URL."""
+    return f"url:{url}"
+
+def edit_cache_key(source: str, prompt: str, output_format: str = "jpg", model: str = "black-forest-labs/flux-kontext-pro") -> str:
+    payload = json.dumps([source, normalize_prompt(prompt), output_format, model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load():
+    """Read the persisted cache once (lock held)."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(_cache_path(), "r") as f:
+            _entries.update(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+def _save():
+    """Drop expired / least recently used entries and write the cache atomically (lock held)."""
+    now = time.time()
+    for key in [k for k, e in _entries.items() if now - e["created_at"] > _ttl()]:
+        del _entries[key]
+    if len(_entries) > _max_entries():
+        by_use = sorted(_entries.values(), key=lambda e: e["last_used_at"])
+        for entry in by_use[:len(_entries) - _max_entries()]:
+            del _entries[entry["key"]]
+    path = _cache_path()
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(_entries, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not persist image edit cache: {e}")
+
+def get_cached_edit(key: str) -> Optional[Dict[str, Any]]:
+    """Cached entry for `key`, or None if missing, expired or the cache is disabled."""
+    if not cache_enabled():
+        return None
+    with _lock:
+        _load()
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry["created_at"] > _ttl():
+            del _entries[key]
+            return None
+        # Persisted with the next write; rewriting the file per hit would serialize readers
+        entry["last_used_at"] = now
+        entry["hits"] = entry.get("hits", 0) + 1
+        print(f"♻️ Image edit cache hit ({entry['hits']} hits): {entry['modified_url']}")
+        return dict(entry)
+
+def put_cached_edit(key: str, modified_url: str, source_url: str = None, prompt: str = None, output_format: str = None):
+    """Remember a successful edit."""
+    if not cache_enabled() or not modified_url:
+        return
+    now = time.time()
+    with _lock:
+        _load()
+        _entries[key] = {
+            "key": key,
+            "modified_url": modified_url,
+            "source_url": source_url,
+            "prompt": prompt,
+            "output_format": output_format,
+            "created_at": now,
+            "last_used_at": now,
+            "hits": 0,
+        }
+        _save()
+
+def evict_cached_edit(key: str) -> bool:
+    """Remove one entry; returns True if it existed."""
+    with _lock:
+        _load()
+        existed = _entries.pop(key, None) is not None
+        if existed:
+            _save()
+        return existed
+
+def clear_edit_cache():
+    """Remove every entry (memory and the persisted file)."""
+    global _loaded
+    with _lock:
+        _entries.clear()
+        _loaded = True
+        _save()
+
+def reset_edit_cache():
+    """Forget the in-memory copy so the next lookup reloads the persisted file."""
+    global _loaded
+    with _lock:
+        _entries.clear()
+        _loaded = False
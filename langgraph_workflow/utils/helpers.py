@@ -1,12 +1,11 @@
-from langchain_community.chat_models import ChatOpenAI
-import openai
-import config
-from langdetect import detect
+from langgraph_workflow.utils.llm_registry import get_llm
+from langgraph_workflow.utils.clients import get_openai_client, get_pinecone_index
+from langgraph_workflow.utils.metrics import track
 
 # Helper: Use GPT to generate search queries from user query
 def generate_search_queries(user_query, n=3):
     # Use GPT-4o for better performance
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.1, request_timeout=10)
+    llm = get_llm("search_queries")
     prompt = f"""You are a product search expert. The user wants to find products and has given this query: '{user_query}'
 
 Your task is to generate {n} effective search terms (5-8 words each) that will help find the most relevant products.
@@ -57,27 +56,31 @@ Return the search terms as a JSON array: ["term1", "term2"]"""
 
 # Helper: Pinecone search for a query
 def pinecone_search(query, top_k=10, filter=None):
-    openai.api_key = config.OPENAI_API_KEY
-    from pinecone import Pinecone
-    pc = Pinecone(api_key=config.PINECONE_API_KEY)
-    index = pc.Index(config.INDEX_NAME)
+    index = get_pinecone_index()
     # Embed query
-    embedding_response = openai.embeddings.create(
-        input=query,
-        model="text-embedding-3-small"
-    )
+    with track("openai_embeddings", "text-embedding-3-small") as call:
+        call["request_bytes"] = len(query.encode("utf-8"))
+        embedding_response = get_openai_client().embeddings.create(
+            input=query,
+            model="text-embedding-3-small"
+        )
+        usage = getattr(embedding_response, "usage", None)
+        call["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
     query_vector = embedding_response.data[0].embedding
     # Always filter to only non-image vectors (i.e., product/item vectors)
     combined_filter = {"type": {"$ne": "image"}}
     if filter:
         combined_filter = {"$and": [combined_filter, filter]}
     search_kwargs = dict(vector=query_vector, top_k=top_k, include_metadata=True, filter=combined_filter)
-    results = index.query(**search_kwargs)
+    with track("pinecone", "query") as call:
+        results = index.query(**search_kwargs)
+        call["response_bytes"] = sum(len(str(m.get('metadata') or {})) for m in results['matches'])
     return results['matches']
 
 # Helper: Detect language
 def detect_language(text):
     try:
+        from langdetect import detect
         lang_code = detect(text)
         print(f"🔍 Language detection result: {lang_code} for text: {text[:50]}...")
         
@@ -118,7 +121,7 @@ def slim_product(product):
 # Helper: Summarize results with GPT
 def summarize_results(user_query, products, language=None):
     # Use GPT-4o for better performance and quality
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3, request_timeout=15)
+    llm = get_llm("summarize")
     
     # Limit the number of products to process to avoid token limits
     max_products = 8  # Reduced from 8
@@ -0,0 +1,199 @@
+"""
+Downscale oversized images and publish the result by URL.
+
+    url = compressed_image_url(image_url, max_megapixels=25)
+
+Shopify rejects images above 25 megapixels and can only import media from a
+public URL. An oversized image is downloaded once, resized in memory, encoded
+as JPEG and stored through the shared storage (utils/storage.py) under
+"compressed/<sha256>.jpg". The original -> compressed mapping is persisted to
+config.COMPRESSED_IMAGES_PATH (default compressed_images.json), so later
+publishes of the same product reuse the stored copy without downloading the
+original again.
+
+Resizes run in a process pool so that several products are handled on separate
+cores (config.IMAGE_RESIZE_PROCESSES workers, default one per core on
+multi-core hosts; 0 resizes in the calling thread), and JPEGs are decoded at
+reduced scale (draft mode).
+
+Without configured storage the original URL is returned unchanged: there is
+nowhere public to put the smaller copy.
+"""
+
+import json
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+import config
+from langgraph_workflow.utils.clients import get_http_session, get_storage
+from langgraph_workflow.utils.image_probe import remember_dimensions
+from langgraph_workflow.utils.metrics import track
+
+_entries: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_loaded = False
+_pool = None
+_pool_lock = threading.Lock()
+
+def _cache_path() -> str:
+    return getattr(config, "COMPRESSED_IMAGES_PATH", "compressed_images.json")
+
+def _load():
+    """Read the persisted mapping once (lock held)."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(_cache_path(), "r") as f:
+            _entries.update(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+def _save():
+    """Write the mapping atomically (lock held)."""
+    path = _cache_path()
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(_entries, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not persist compressed image map: {e}")
+
+def reset_compressed_images():
+    """Forget the in-memory copy so the next lookup reloads the persisted file."""
+    global _loaded
+    with _lock:
+        _entries.clear()
+        _loaded = False
+
+def _read_source(image_url: str) -> bytes:
+    if not image_url.startswith(("http://", "https://")):
+        path = image_url[len("file://"):] if image_url.startswith("file://") else image_url
+        with open(path, "rb") as f:
+            return f.read()
+    with track("image_fetch", "download") as call:
+        response = get_http_session().get(image_url, timeout=30)
+        response.raise_for_status()
+        call["response_bytes"] = len(response.content)
+    return response.content
+
+def downscale_jpeg(data: bytes, max_megapixels: float, quality: int = 85) -> Dict[str, Any]:
+    """
+    Resize encoded image bytes to fit within max_megapixels and re-encode as JPEG.
+
+    JPEGs are decoded in draft mode (libjpeg scales by 1/2, 1/4 or 1/8 while
+    decoding), and the remaining factor is applied with reduce() before the
+    final LANCZOS pass, so a 40MP photo is never fully decoded.
+
+    Returns:
+        Dict with "data" (JPEG bytes), "width", "height", "new_width",
+        "new_height" and "cpu_seconds"
+    """
+    from PIL import Image
+
+    cpu_start = time.process_time()
+    with Image.open(BytesIO(data)) as img:
+        width, height = img.size
+        ratio = (max_megapixels * 1_000_000 / (width * height)) ** 0.5
+        new_width = max(1, int(width * ratio))
+        new_height = max(1, int(height * ratio))
+        if img.format == "JPEG":
+            img.draft("RGB", (new_width, new_height))
+        resized = img.convert("RGB").resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    out = BytesIO()
+    resized.save(out, "JPEG", quality=quality, optimize=True)
+    return {"data": out.getvalue(), "width": width, "height": height,
+            "new_width": new_width, "new_height": new_height,
+            "cpu_seconds": time.process_time() - cpu_start}
+
+def _resize_processes() -> int:
+    # A single core gains nothing from a pool but the pickling overhead
+    cores = os.cpu_count() or 1
+    return getattr(config, "IMAGE_RESIZE_PROCESSES", cores if cores > 1 else 0)
+
+def _get_pool():
+    """Process pool for resizes, created on first use (None when disabled)."""
+    global _pool
+    if _resize_processes() <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: forking a process that runs request threads can deadlock
+            _pool = ProcessPoolExecutor(max_workers=_resize_processes(),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_resize_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def downscale(data: bytes, max_megapixels: float) -> Dict[str, Any]:
+    """downscale_jpeg on a worker process (inline if the pool is disabled or broken)."""
+    from concurrent.futures.process import BrokenProcessPool
+
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            return pool.submit(downscale_jpeg, data, max_megapixels).result()
+        except BrokenProcessPool as e:
+            print(f"⚠️ Resize pool failed ({e}); resizing in-process")
+            shutdown_resize_pool()
+    return downscale_jpeg(data, max_megapixels)
+
+def cached_compressed_image(image_url: str, max_megapixels: float = 25) -> Optional[Dict[str, Any]]:
+    """The stored compressed copy of `image_url`, if one was made before."""
+    with _lock:
+        _load()
+        entry = _entries.get(f"{image_url}|{max_megapixels}")
+    return {**entry, "cached": True} if entry else None
+
+def compressed_image_url(image_url: str, max_megapixels: float = 25) -> Optional[Dict[str, Any]]:
+    """
+    Public URL of a copy of `image_url` that fits within max_megapixels.
+
+    The caller is expected to have checked that the image is too large.
+
+    Returns:
+        Dict with "url", "width", "height", "new_width", "new_height" and
+        "cached", or None if no storage is configured
+
+    Raises:
+        Exception: if the image cannot be downloaded, decoded or stored
+    """
+    cached = cached_compressed_image(image_url, max_megapixels)
+    if cached:
+        return cached
+
+    storage = get_storage()
+    if storage is None:
+        print("⚠️ No image storage configured; cannot publish a compressed copy")
+        return None
+
+    with track("image", "resize") as call:
+        source = _read_source(image_url)
+        call["request_bytes"] = len(source)
+        resized = downscale(source, max_megapixels)
+        call["response_bytes"] = len(resized["data"])
+    print(f"🖼️ Resized {resized['width']}x{resized['height']} -> {resized['new_width']}x{resized['new_height']} "
+          f"in {resized['cpu_seconds'] * 1000:.0f}ms CPU")
+    url = storage.put_bytes(resized["data"], ".jpg", prefix="compressed", content_type="image/jpeg")
+    remember_dimensions(url, resized["new_width"], resized["new_height"], "JPEG")
+
+    entry = {key: resized[key] for key in ("width", "height", "new_width", "new_height", "cpu_seconds")}
+    entry["url"] = url
+    with _lock:
+        _load()
+        _entries[f"{image_url}|{max_megapixels}"] = entry
+        _save()
+    return {**entry, "cached": False}
@@ -0,0 +1,463 @@
+"""
+Asynchronous Replicate image-edit jobs.
+
+    job = submit_job({"prompt": ..., "input_image": url, "output_format": "jpg"}, metadata={"sku": sku})
+    job = wait_for_job(job["id"], timeout=180)        # blocking callers
+    get_job(job["id"])                                # or check back later
+
+A job is a Replicate prediction created with predictions.create(), so no
+worker sits on an open HTTP request while the model runs. Job records are
+kept in a SQLite database at config.IMAGE_JOBS_PATH (default image_jobs.db;
+an existing image_jobs.json is imported once), one row per job, and
+unfinished ones are resumed after a restart. Every API worker process shares
+that database: a job submitted by one worker can be read, cancelled or
+settled by a webhook in another.
+
+A background thread polls unfinished predictions with exponential backoff
+(config.IMAGE_JOB_POLL_INITIAL .. IMAGE_JOB_POLL_MAX seconds). When
+config.REPLICATE_WEBHOOK_URL and REPLICATE_WEBHOOK_SECRET are set, Replicate
+also calls that URL on completion and handle_webhook() settles the job immediately; polling then
+only runs at the slow interval as a fallback. A finished job is never
+overwritten, whichever process reports it first.
+
+These functions block on the database and a process-wide lock; call them
+from async code through run_in_threadpool.
+
+Job record:
+    {
+        "id": prediction id,
+        "status": "starting" | "processing" | "succeeded" | "failed" | "canceled",
+        "progress": 0.0-1.0 or None,
+        "output_url": str or None,
+        "error": str or None,
+        "input": {...},
+        "metadata": {...},
+        "created_at" / "updated_at" / "completed_at": unix time
+    }
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+from langgraph_workflow.utils.clients import get_replicate_client
+from langgraph_workflow.utils.edit_cache import put_cached_edit
+from langgraph_workflow.utils.metrics import track
+
+FLUX_KONTEXT_MODEL = "black-forest-labs/flux-kontext-pro"
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+MAX_JOBS = 1000
+
+_PROGRESS_PATTERN = re.compile(r"(\d{1,3})%\|")
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_next_poll: Dict[str, tuple] = {}  # job id -> (next poll time, current interval)
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_loaded = False
+_conn: Optional[sqlite3.Connection] = None
+_poller: Optional[threading.Thread] = None
+
+def _jobs_path() -> str:
+    path = getattr(config, "IMAGE_JOBS_PATH", "image_jobs.db")
+    # Older configs name the JSON file; keep the jobs beside it in SQLite
+    return os.path.splitext(path)[0] + ".db" if path.endswith(".json") else path
+
+def _poll_initial() -> float:
+    return getattr(config, "IMAGE_JOB_POLL_INITIAL", 0.5)
+
+def _poll_max() -> float:
+    return getattr(config, "IMAGE_JOB_POLL_MAX", 5.0)
+
+def _webhook_url() -> Optional[str]:
+    # Unsigned deliveries are refused (see main_api), so only ask for them with a secret
+    if not getattr(config, "REPLICATE_WEBHOOK_SECRET", None):
+        return None
+    return getattr(config, "REPLICATE_WEBHOOK_URL", None)
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(_jobs_path(), check_same_thread=False, isolation_level=None,
+                           timeout=getattr(config, "LISTING_DB_BUSY_TIMEOUT", 30))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            data TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs(status)")
+    return conn
+
+def _import_legacy_json():
+    """Copy jobs from the old image_jobs.json into an empty table (lock held)."""
+    legacy_path = os.path.splitext(_jobs_path())[0] + ".json"
+    if not os.path.exists(legacy_path) or _conn.execute("SELECT 1 FROM image_jobs LIMIT 1").fetchone():
+        return
+    try:
+        with open(legacy_path, "r") as f:
+            legacy = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not import image jobs from {legacy_path}: {e}")
+        return
+    _conn.executemany("INSERT OR IGNORE INTO image_jobs (id, status, created_at, data) VALUES (?, ?, ?, ?)",
+                      [(job["id"], job["status"], job["created_at"], json.dumps(job)) for job in legacy.values()])
+    print(f"📦 Imported {len(legacy)} image jobs from {legacy_path}")
+
+def _load():
+    """Open the job database once and schedule unfinished jobs for polling (lock held)."""
+    global _loaded, _conn
+    if _loaded:
+        return
+    _loaded = True
+    _conn = _connect()
+    _import_legacy_json()
+    now = time.time()
+    placeholders = ", ".join("?" * len(TERMINAL_STATUSES))
+    rows = _conn.execute(f"SELECT data FROM image_jobs WHERE status NOT IN ({placeholders})",
+                         TERMINAL_STATUSES).fetchall()
+    for (data,) in rows:
+        job = json.loads(data)
+        _jobs[job["id"]] = job
+        _next_poll[job["id"]] = (now, _poll_initial())
+    if _next_poll:
+        print(f"🔄 Resuming {len(_next_poll)} unfinished image jobs")
+
+def _save(job: Dict[str, Any]):
+    """
+    Write one job, unless its stored row is already finished (lock held).
+
+    Drops the oldest finished jobs past MAX_JOBS, from the database and memory.
+    """
+    placeholders = ", ".join("?" * len(TERMINAL_STATUSES))
+    try:
+        _conn.execute(f"""
+            INSERT INTO image_jobs (id, status, created_at, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET status = excluded.status, data = excluded.data
+            WHERE image_jobs.status NOT IN ({placeholders})
+        """, (job["id"], job["status"], job["created_at"], json.dumps(job), *TERMINAL_STATUSES))
+        if job["status"] in TERMINAL_STATUSES:
+            _conn.execute(f"""
+                DELETE FROM image_jobs WHERE id IN (
+                    SELECT id FROM image_jobs WHERE status IN ({placeholders})
+                    ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (*TERMINAL_STATUSES, MAX_JOBS))
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not persist image job {job['id']}: {e}")
+    if len(_jobs) > MAX_JOBS:
+        finished = sorted((j for j in _jobs.values() if j["status"] in TERMINAL_STATUSES),
+                          key=lambda j: j["created_at"])
+        for old in finished[:len(_jobs) - MAX_JOBS]:
+            del _jobs[old["id"]]
+
+def _refresh(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The job as stored in the database, adopted into memory if another process
+    changed it (lock held). None if the job is unknown.
+    """
+    row = _conn.execute("SELECT data FROM image_jobs WHERE id = ?", (job_id,)).fetchone()
+    job = _jobs.get(job_id)
+    if row is None:
+        return job
+    stored = json.loads(row[0])
+    if job is None or (job["status"] not in TERMINAL_STATUSES and
+                       (stored["status"] in TERMINAL_STATUSES or stored["updated_at"] > job["updated_at"])):
+        _jobs[job_id] = job = stored
+        if job["status"] in TERMINAL_STATUSES:
+            _next_poll.pop(job_id, None)
+            _changed.notify_all()
+    return job
+
+# ---------------------------------------------------------------------------
+# Job updates
+# ---------------------------------------------------------------------------
+
+def _output_url(output: Any) -> Optional[str]:
+    if output is None:
+        return None
+    if isinstance(output, list):
+        return str(output[0]) if output else None
+    if hasattr(output, "url"):
+        return str(output.url)
+    return str(output)
+
+def _progress(logs: Optional[str]) -> Optional[float]:
+    matches = _PROGRESS_PATTERN.findall(logs or "")
+    return min(100, int(matches[-1])) / 100 if matches else None
+
+def _apply_prediction(job: Dict[str, Any], status: str, output: Any = None, error: Any = None, logs: str = None):
+    """Copy prediction fields onto a job record (lock held)."""
+    job["status"] = status
+    job["updated_at"] = time.time()
+    progress = _progress(logs)
+    if progress is not None:
+        job["progress"] = progress
+    if status == "succeeded":
+        job["output_url"] = _output_url(output)
+        job["progress"] = 1.0
+        if job["metadata"].get("cache_key"):
+            put_cached_edit(job["metadata"]["cache_key"], job["output_url"], source_url=job["input"].get("input_image"),
+                            prompt=job["input"].get("prompt"), output_format=job["input"].get("output_format"))
+    if status in ("failed", "canceled"):
+        job["error"] = str(error) if error else f"Prediction {status}"
+    if status in TERMINAL_STATUSES:
+        job["completed_at"] = job["updated_at"]
+        _next_poll.pop(job["id"], None)
+        print(f"🎨 Image job {job['id']} {status} in {job['completed_at'] - job['created_at']:.1f}s")
+
+def _settled(job_id: str, previous: Dict[str, Any]):
+    """Persist and wake waiters after a job changed (lock held)."""
+    if _jobs[job_id] == previous:
+        return
+    _save(_jobs[job_id])
+    _changed.notify_all()
+
+# ---------------------------------------------------------------------------
+# Polling
+# ---------------------------------------------------------------------------
+
+def _poll_once(job_id: str):
+    client = get_replicate_client()
+    try:
+        with track("replicate", "predictions.get"):
+            prediction = client.predictions.get(job_id)
+    except Exception as e:
+        print(f"⚠️ Polling image job {job_id} failed: {e}")
+        return
+    with _lock:
+        job = _refresh(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            return
+        previous = dict(job)
+        _apply_prediction(job, prediction.status, getattr(prediction, "output", None),
+                          getattr(prediction, "error", None), getattr(prediction, "logs", None))
+        _settled(job_id, previous)
+
+def _poll_loop():
+    while True:
+        with _lock:
+            now = time.time()
+            due = [job_id for job_id, (at, _) in _next_poll.items() if at <= now]
+            for job_id in due:
+                _, interval = _next_poll[job_id]
+                # Backoff; with a webhook configured polling is only a slow fallback
+                interval = _poll_max() if _webhook_url() else min(interval * 1.5, _poll_max())
+                _next_poll[job_id] = (now + interval, interval)
+            if not due:
+                wake_at = min((at for at, _ in _next_poll.values()), default=now + _poll_max())
+                _changed.wait(timeout=max(0.05, wake_at - now))
+                continue
+        for job_id in due:
+            _poll_once(job_id)
+
+def _ensure_poller():
+    """Start the polling thread on first use (lock held)."""
+    global _poller
+    if _poller is None or not _poller.is_alive():
+        _poller = threading.Thread(target=_poll_loop, name="image-job-poller", daemon=True)
+        _poller.start()
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def submit_job(input_data: Dict[str, Any], metadata: Dict[str, Any] = None, model: str = FLUX_KONTEXT_MODEL) -> Dict[str, Any]:
+    """
+    Create a Replicate prediction and start tracking it.
+
+    Args:
+        input_data: Model input (prompt, input_image, output_format, ...)
+        metadata: Caller data stored with the job (sku, session_id, original_file, ...)
+        model: Replicate model name
+
+    Returns:
+        The new job record
+    """
+    params = {}
+    if _webhook_url():
+        params = {"webhook": _webhook_url(), "webhook_events_filter": ["start", "completed"]}
+
+    client = get_replicate_client()
+    with track("replicate", "predictions.create") as call:
+        call["request_bytes"] = len(json.dumps(input_data).encode("utf-8"))
+        prediction = client.predictions.create(model=model, input=input_data, **params)
+
+    now = time.time()
+    job = {
+        "id": prediction.id,
+        "model": model,
+        "status": prediction.status or "starting",
+        "progress": None,
+        "output_url": None,
+        "error": None,
+        "input": input_data,
+        "metadata": metadata or {},
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": None,
+    }
+    with _lock:
+        _load()
+        _jobs[job["id"]] = job
+        previous = {}
+        _apply_prediction(job, job["status"], getattr(prediction, "output", None),
+                          getattr(prediction, "error", None), getattr(prediction, "logs", None))
+        if job["status"] not in TERMINAL_STATUSES:
+            _next_poll[job["id"]] = (now + _poll_initial(), _poll_initial())
+            _ensure_poller()
+        _settled(job["id"], previous)
+        print(f"🎨 Submitted image job {job['id']}")
+        return dict(job)
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Current job record, or None if unknown."""
+    with _lock:
+        _load()
+        job = _refresh(job_id)
+        if job is not None and job["status"] not in TERMINAL_STATUSES:
+            _next_poll.setdefault(job_id, (time.time(), _poll_initial()))
+            _ensure_poller()
+        return dict(job) if job else None
+
+def list_jobs(**metadata_filter) -> List[Dict[str, Any]]:
+    """Jobs whose metadata matches every keyword (e.g. list_jobs(session_id="abc")), newest first."""
+    with _lock:
+        _load()
+        rows = _conn.execute("SELECT data FROM image_jobs ORDER BY created_at DESC").fetchall()
+    jobs = (json.loads(data) for (data,) in rows)
+    return [j for j in jobs if all(j["metadata"].get(k) == v for k, v in metadata_filter.items())]
+
+def wait_for_job(job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Block until the job finishes or `timeout` seconds pass.
+
+    Changes made by this process wake the caller at once; the database is
+    re-read every IMAGE_JOB_POLL_MAX seconds for jobs settled elsewhere.
+
+    Returns:
+        The job record (still unfinished if the timeout expired)
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    with _lock:
+        _load()
+        _ensure_poller()
+        while True:
+            job = _refresh(job_id)
+            if job is None:
+                raise KeyError(f"Unknown image job {job_id}")
+            if job["status"] in TERMINAL_STATUSES:
+                return dict(job)
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return dict(job)
+            _changed.wait(timeout=_poll_max() if remaining is None else min(remaining, _poll_max()))
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Ask Replicate to cancel an unfinished job."""
+    job = get_job(job_id)
+    if job is None or job["status"] in TERMINAL_STATUSES:
+        return job
+    try:
+        get_replicate_client().predictions.cancel(job_id)
+    except Exception as e:
+        print(f"⚠️ Cancelling image job {job_id} failed: {e}")
+    with _lock:
+        job = _refresh(job_id)
+        if job["status"] in TERMINAL_STATUSES:
+            return dict(job)
+        previous = dict(job)
+        _apply_prediction(job, "canceled")
+        _settled(job_id, previous)
+        return dict(job)
+
+def verify_webhook_signature(headers: Dict[str, str], body: bytes, secret: str, tolerance: float = None) -> bool:
+    """
+    Check Replicate's webhook-signature header.
+
+    The signed content is "{webhook-id}.{webhook-timestamp}.{body}", HMAC-SHA256
+    with the base64 part of the "whsec_..." signing secret. Deliveries whose
+    timestamp is more than `tolerance` seconds (config.REPLICATE_WEBHOOK_TOLERANCE,
+    default 300) away from now are rejected, so a captured request cannot be replayed.
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature", "")
+    if not webhook_id or not timestamp or not signatures:
+        return False
+    tolerance = getattr(config, "REPLICATE_WEBHOOK_TOLERANCE", 300) if tolerance is None else tolerance
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+    except ValueError:
+        return False
+    key = base64.b64decode(secret.split("_", 1)[-1])
+    signed = f"{webhook_id}.{timestamp}.".encode("utf-8") + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    return any(hmac.compare_digest(expected, sig.split(",", 1)[-1]) for sig in signatures.split())
+
+def handle_webhook(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Apply a Replicate webhook payload (a prediction object) to its job.
+
+    Returns:
+        The updated job record, or None if the prediction is not one of ours
+    """
+    job_id = payload.get("id")
+    with _lock:
+        _load()
+        job = _refresh(job_id)
+        if job is None:
+            return None
+        if job["status"] in TERMINAL_STATUSES:
+            return dict(job)
+        previous = dict(job)
+        _apply_prediction(job, payload.get("status", job["status"]), payload.get("output"),
+                          payload.get("error"), payload.get("logs"))
+        _settled(job_id, previous)
+        return dict(job)
+
+def resolve_modified_images(modified_images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fill in entries the image agent left as "pending" once their job finished.
+
+    Entries carry the job ID in "job_id"; finished ones get status/modified_url
+    (or error) from the job record. Other entries are returned unchanged.
+    """
+    resolved = []
+    for entry in modified_images or []:
+        if entry.get("status") == "pending" and entry.get("job_id"):
+            job = get_job(entry["job_id"])
+            if job and job["status"] == "succeeded":
+                entry = {**entry, "status": "success", "modified_url": job["output_url"]}
+            elif job and job["status"] in TERMINAL_STATUSES:
+                entry = {**entry, "status": "error", "error": job["error"]}
+            elif job:
+                entry = {**entry, "progress": job["progress"]}
+        resolved.append(entry)
+    return resolved
+
+def reset_jobs():
+    """Forget every job in memory and close the database (its contents are left alone)."""
+    global _loaded, _conn
+    with _lock:
+        _jobs.clear()
+        _next_poll.clear()
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+        _loaded = False
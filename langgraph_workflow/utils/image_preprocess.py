@@ -0,0 +1,144 @@
+"""
+Local pre-processing for uploaded photos before they go to S3 and Replicate.
+
+    prepared = preprocess_image("/tmp/upload.jpg")
+    url = storage.put_file(prepared["path"])
+    ...
+    discard_preprocessed(prepared)
+
+Flux Kontext works at roughly one megapixel, so sending a 12MP phone photo only
+costs upload time and Replicate input bandwidth. Each image is:
+
+1. rotated according to its EXIF orientation (phones store portrait shots
+   sideways and the model ignores the tag),
+2. downscaled so its longest side is at most config.IMAGE_PREPROCESS_MAX_SIDE,
+3. re-encoded as config.IMAGE_PREPROCESS_FORMAT (WEBP by default; EXIF and
+   other metadata are dropped).
+
+Files that are already upright, small enough and JPEG/WEBP are used as-is.
+Set config.IMAGE_PREPROCESS_ENABLED = False to send originals.
+"""
+
+import os
+import tempfile
+from typing import Any, Dict
+
+import config
+from langgraph_workflow.utils.metrics import track
+
+# Formats that are already compact enough to send without re-encoding
+_PASSTHROUGH_FORMATS = ("JPEG", "WEBP")
+_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+_EXIF_ORIENTATION = 0x0112
+
+def preprocess_enabled() -> bool:
+    return getattr(config, "IMAGE_PREPROCESS_ENABLED", True)
+
+def _max_side() -> int:
+    return getattr(config, "IMAGE_PREPROCESS_MAX_SIDE", 1440)
+
+def _target_format() -> str:
+    return getattr(config, "IMAGE_PREPROCESS_FORMAT", "WEBP").upper()
+
+def _quality() -> int:
+    return getattr(config, "IMAGE_PREPROCESS_QUALITY", 90)
+
+def preprocess_image(path: str, max_side: int = None, target_format: str = None) -> Dict[str, Any]:
+    """
+    Prepare a local image for upload.
+
+    Args:
+        path: Local image path
+        max_side: Longest side in pixels (default config.IMAGE_PREPROCESS_MAX_SIDE)
+        target_format: PIL format name to re-encode to (default config.IMAGE_PREPROCESS_FORMAT)
+
+    Returns:
+        Dict with the file to upload ("path"), its "width", "height", "format" and
+        "bytes", the "original_width", "original_height" and "original_bytes", the
+        applied "steps" and "changed" (True if "path" is a new temporary file)
+    """
+    from PIL import Image, ImageOps
+
+    max_side = max_side or _max_side()
+    target_format = (target_format or _target_format()).upper()
+    original_bytes = os.path.getsize(path)
+
+    with track("image", "preprocess") as call:
+        call["request_bytes"] = original_bytes
+        with Image.open(path) as source:
+            source_format = source.format
+            original_width, original_height = source.size
+            steps = []
+
+            img = source
+            if source.getexif().get(_EXIF_ORIENTATION, 1) != 1:
+                img = ImageOps.exif_transpose(source)
+                steps.append("exif_transpose")
+
+            if max(img.size) > max_side:
+                ratio = max_side / max(img.size)
+                new_size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
+                steps.append("downscale")
+
+            if not steps and source_format in _PASSTHROUGH_FORMATS:
+                return {
+                    "path": path,
+                    "width": original_width,
+                    "height": original_height,
+                    "format": source_format,
+                    "bytes": original_bytes,
+                    "original_width": original_width,
+                    "original_height": original_height,
+                    "original_bytes": original_bytes,
+                    "steps": [],
+                    "changed": False
+                }
+
+            has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            if has_alpha and target_format == "JPEG":
+                # JPEG has no alpha channel: flatten onto white like a product shot
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            steps.append(f"encode_{target_format.lower()}")
+
+            fd, out_path = tempfile.mkstemp(prefix="preprocessed_", suffix=_EXTENSIONS.get(target_format, ".img"))
+            os.close(fd)
+            try:
+                save_args = {"quality": _quality()}
+                if target_format == "JPEG":
+                    save_args["optimize"] = True
+                img.save(out_path, target_format, **save_args)
+            except Exception:
+                os.remove(out_path)
+                raise
+            width, height = img.size
+
+        size = os.path.getsize(out_path)
+        call["response_bytes"] = size
+
+    print(f"🖼️ Preprocessed {os.path.basename(path)}: {original_width}x{original_height} "
+          f"({original_bytes / 1024:.0f}KB) -> {width}x{height} {target_format} ({size / 1024:.0f}KB)")
+    return {
+        "path": out_path,
+        "width": width,
+        "height": height,
+        "format": target_format,
+        "bytes": size,
+        "original_width": original_width,
+        "original_height": original_height,
+        "original_bytes": original_bytes,
+        "steps": steps,
+        "changed": True
+    }
+
+def discard_preprocessed(prepared: Dict[str, Any]):
+    """Remove the temporary file created by preprocess_image, if any."""
+    if prepared.get("changed"):
+        try:
+            os.remove(prepared["path"])
+        except OSError:
+            pass
@@ -0,0 +1,136 @@
+"""
+Image dimension probe with a per-URL cache.
+
+    info = probe_image(url)      # {"width": 2048, "height": 1536, "format": "JPEG", ...}
+
+Listing validation and Shopify media preparation only need width and height,
+which sit in the first few kilobytes of a JPEG/PNG/WEBP. The probe asks for a
+byte range (config.IMAGE_PROBE_RANGE_BYTES, default 64KB) and feeds it to PIL's
+incremental parser, stopping as soon as the header is decoded; servers that
+ignore Range are read as a stream and closed early. Only if the header cannot
+be found in those bytes is the whole image downloaded.
+
+Results are cached per URL (local paths are keyed by path, size and mtime) for
+the life of the process; the least recently used entries are dropped past
+config.IMAGE_PROBE_CACHE_SIZE. Callers that produce a new image (resize,
+compression) can seed the cache with remember_dimensions().
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+import config
+from langgraph_workflow.utils.clients import get_http_session
+from langgraph_workflow.utils.metrics import track
+
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _range_bytes() -> int:
+    return getattr(config, "IMAGE_PROBE_RANGE_BYTES", 64 * 1024)
+
+def _cache_size() -> int:
+    return getattr(config, "IMAGE_PROBE_CACHE_SIZE", 4096)
+
+def _local_path(location: str) -> str:
+    """Filesystem path for a local file or file:// URL, None for remote URLs."""
+    if location.startswith("file://"):
+        return location[len("file://"):]
+    if "://" in location:
+        return None
+    return location
+
+def _cache_key(location: str) -> str:
+    path = _local_path(location)
+    if path is None:
+        return location
+    stat = os.stat(path)
+    return f"path:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def _remember(key: str, info: Dict[str, Any]):
+    with _cache_lock:
+        _cache[key] = info
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+
+def remember_dimensions(location: str, width: int, height: int, image_format: str = None):
+    """Seed the cache for an image whose size is already known (e.g. one we just wrote)."""
+    _remember(_cache_key(location), {"width": width, "height": height, "format": image_format, "bytes_read": 0})
+
+def clear_probe_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _probe_file(path: str) -> Dict[str, Any]:
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return {"width": img.width, "height": img.height, "format": img.format, "bytes_read": 0}
+
+def _probe_url(url: str, timeout: float) -> Dict[str, Any]:
+    from PIL import ImageFile
+
+    parser = ImageFile.Parser()
+    bytes_read = 0
+    with track("image_fetch", "probe") as call:
+        response = get_http_session().get(
+            url, timeout=timeout, stream=True,
+            headers={"Range": f"bytes=0-{_range_bytes() - 1}"}
+        )
+        try:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=8192):
+                bytes_read += len(chunk)
+                parser.feed(chunk)
+                if parser.image is not None or bytes_read >= _range_bytes():
+                    break
+        finally:
+            response.close()
+            call["response_bytes"] = bytes_read
+
+    if parser.image is not None:
+        image = parser.image
+        return {"width": image.width, "height": image.height, "format": image.format, "bytes_read": bytes_read}
+
+    # Header not within the first bytes (huge EXIF block, progressive oddities): read it all
+    from io import BytesIO
+    from PIL import Image
+
+    with track("image_fetch", "download") as call:
+        response = get_http_session().get(url, timeout=timeout)
+        response.raise_for_status()
+        call["response_bytes"] = len(response.content)
+    with Image.open(BytesIO(response.content)) as img:
+        return {"width": img.width, "height": img.height, "format": img.format,
+                "bytes_read": bytes_read + len(response.content)}
+
+def probe_image(location: str, timeout: float = 10) -> Dict[str, Any]:
+    """
+    Dimensions of an image URL or local file, fetching as little as possible.
+
+    Args:
+        location: http(s) URL, file:// URL or local file path
+        timeout: Request timeout in seconds
+
+    Returns:
+        Dict with "width", "height", "format" and "bytes_read" (0 for cache hits)
+
+    Raises:
+        Exception: if the image cannot be fetched or decoded
+    """
+    key = _cache_key(location)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return {**cached, "bytes_read": 0}
+
+    if key.startswith("path:"):
+        info = _probe_file(_local_path(location))
+    else:
+        info = _probe_url(location, timeout)
+    _remember(key, info)
+    return info
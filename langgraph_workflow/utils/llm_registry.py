@@ -0,0 +1,224 @@
+"""
+Shared chat model registry for every LLM hop in the workflow.
+
+Nodes ask for a model by *purpose* (e.g. "planning", "shopify_title") instead of
+building a new ChatOpenAI per call. Clients are cached per
+(model, temperature, timeout, max_tokens) and all of them share one pooled
+keep-alive HTTP client, so consecutive LLM calls reuse TLS connections.
+
+Per-purpose settings can be overridden from config:
+
+    LLM_PURPOSE_OVERRIDES = {"planning": {"model": "gpt-4o-mini"}}
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+import config
+from langgraph_workflow.utils.metrics import record_call
+
+# Default model settings per purpose. timeout is in seconds (None = SDK default).
+LLM_PURPOSES: Dict[str, Dict[str, Any]] = {
+    # Routing / search
+    "planning": {"model": "gpt-4o", "temperature": 0.1, "timeout": 10},
+    "search_strategy": {"model": "gpt-4o", "temperature": 0.7, "timeout": None},
+    "search_queries": {"model": "gpt-4o", "temperature": 0.1, "timeout": 10},
+    "summarize": {"model": "gpt-4o", "temperature": 0.3, "timeout": 15},
+    "filter_results": {"model": "gpt-4o", "temperature": 0.3, "timeout": 15},
+    # Chat
+    "chat": {"model": "gpt-4o", "temperature": 0.3, "timeout": None},
+    "chat_fallback": {"model": "gpt-4o", "temperature": 0.3, "timeout": None},
+    # Product selection / intent
+    "product_selection": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    "shopify_product_selection": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    "image_product_selection": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    "confirmation_intent": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    # Image pipeline
+    "image_request_analysis": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    "sku_identification": {"model": "gpt-4o-mini", "temperature": 0.1, "timeout": None, "max_tokens": 50},
+    "image_edit_plan": {"model": "gpt-4o", "temperature": 0.1, "timeout": None, "max_tokens": 300},
+    "replicate_prompt": {"model": "gpt-4o", "temperature": 0.3, "timeout": None},
+    "translate_instruction": {"model": "gpt-4o", "temperature": 0.1, "timeout": None},
+    # Shopify copy
+    "shopify_title": {"model": "gpt-4o", "temperature": 0.7, "timeout": 15},
+    "shopify_description": {"model": "gpt-4o", "temperature": 0.7, "timeout": 15},
+    "shopify_response": {"model": "gpt-4o", "temperature": 0.3, "timeout": 10},
+}
+
+DEFAULT_PURPOSE_SETTINGS = {"model": "gpt-4o", "temperature": 0.1, "timeout": None}
+
+_clients: Dict[Tuple, Any] = {}
+_bound: Dict[str, Any] = {}
+_lock = threading.Lock()
+_http_client = None
+_call_counter = None
+_chat_model_factory = None
+
+def get_purpose_settings(purpose: str) -> Dict[str, Any]:
+    """Resolve model settings for a purpose, applying config.LLM_PURPOSE_OVERRIDES."""
+    settings = {**DEFAULT_PURPOSE_SETTINGS, **LLM_PURPOSES.get(purpose, {})}
+    overrides = getattr(config, "LLM_PURPOSE_OVERRIDES", {}) or {}
+    settings.update(overrides.get(purpose, {}))
+    return settings
+
+def _get_http_client():
+    """One pooled keep-alive HTTP client shared by every chat model."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=getattr(config, "LLM_MAX_CONNECTIONS", 20),
+                max_keepalive_connections=getattr(config, "LLM_MAX_KEEPALIVE_CONNECTIONS", 10),
+                keepalive_expiry=60
+            )
+        )
+    return _http_client
+
+def _get_call_counter():
+    global _call_counter
+    if _call_counter is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMCallCounter(BaseCallbackHandler):
+            """Counts calls, errors and token usage per purpose and per model, and feeds utils.metrics."""
+
+            def __init__(self):
+                self.lock = threading.Lock()
+                self.calls = defaultdict(int)
+                self.errors = defaultdict(int)
+                self.tokens = defaultdict(lambda: {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+                self.model_calls = defaultdict(int)
+                self.run_purposes = {}
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+                metadata = metadata or {}
+                purpose = metadata.get("llm_purpose", "unknown")
+                model = metadata.get("llm_model", "unknown")
+                request_bytes = sum(
+                    len(str(getattr(message, "content", "")).encode("utf-8"))
+                    for batch in messages for message in batch
+                )
+                with self.lock:
+                    self.calls[purpose] += 1
+                    self.model_calls[model] += 1
+                    self.run_purposes[run_id] = (purpose, time.perf_counter(), request_bytes)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+                with self.lock:
+                    purpose, started, request_bytes = self.run_purposes.pop(run_id, ("unknown", None, 0))
+                    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                        self.tokens[purpose][key] += usage.get(key, 0) or 0
+                response_bytes = sum(
+                    len((generation.text or "").encode("utf-8"))
+                    for generations in response.generations for generation in generations
+                )
+                if started is not None:
+                    record_call(
+                        "openai_chat", purpose, time.perf_counter() - started,
+                        request_bytes=request_bytes,
+                        response_bytes=response_bytes,
+                        prompt_tokens=usage.get("prompt_tokens", 0) or 0,
+                        completion_tokens=usage.get("completion_tokens", 0) or 0
+                    )
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                with self.lock:
+                    purpose, started, request_bytes = self.run_purposes.pop(run_id, ("unknown", None, 0))
+                    self.errors[purpose] += 1
+                if started is not None:
+                    record_call("openai_chat", purpose, time.perf_counter() - started,
+                                error=type(error).__name__, request_bytes=request_bytes)
+
+        _call_counter = LLMCallCounter()
+    return _call_counter
+
+def get_chat_model(model: str = "gpt-4o", temperature: float = 0.1, timeout: Optional[float] = None, max_tokens: Optional[int] = None):
+    """Return the shared ChatOpenAI client for these settings, creating it once."""
+    key = (model, temperature, timeout, max_tokens)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                from langchain_openai import ChatOpenAI
+                kwargs = {
+                    "model": model,
+                    "temperature": temperature,
+                    "api_key": config.OPENAI_API_KEY,
+                    "http_client": _get_http_client(),
+                    "callbacks": [_get_call_counter()]
+                }
+                if timeout is not None:
+                    kwargs["timeout"] = timeout
+                if max_tokens is not None:
+                    kwargs["max_tokens"] = max_tokens
+                client = ChatOpenAI(**kwargs)
+                _clients[key] = client
+    return client
+
+def set_chat_model_factory(factory: Optional[Callable[[str, Dict[str, Any]], Any]]):
+    """
+    Replace ChatOpenAI with `factory(purpose, settings)` for every purpose (None restores it).
+
+    Used by the offline benchmarks to plug in a fake chat model; cached clients are dropped.
+    """
+    global _chat_model_factory
+    with _lock:
+        _chat_model_factory = factory
+        _clients.clear()
+        _bound.clear()
+
+def get_llm(purpose: str):
+    """
+    Return the chat model configured for `purpose`.
+
+    The returned runnable is shared across calls and threads; it supports
+    `.invoke(prompt)` exactly like a ChatOpenAI instance.
+    """
+    bound = _bound.get(purpose)
+    if bound is None:
+        settings = get_purpose_settings(purpose)
+        run_config = {
+            "tags": [f"purpose:{purpose}"],
+            "metadata": {"llm_purpose": purpose, "llm_model": settings["model"]}
+        }
+        if _chat_model_factory is not None:
+            client = _chat_model_factory(purpose, settings)
+            run_config["callbacks"] = [_get_call_counter()]
+        else:
+            client = get_chat_model(
+                model=settings["model"],
+                temperature=settings["temperature"],
+                timeout=settings.get("timeout"),
+                max_tokens=settings.get("max_tokens")
+            )
+        bound = client.with_config(run_config)
+        with _lock:
+            _bound.setdefault(purpose, bound)
+            bound = _bound[purpose]
+    return bound
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Snapshot of LLM call counters (calls, errors, tokens) per purpose and model."""
+    counter = _get_call_counter()
+    with counter.lock:
+        return {
+            "calls": dict(counter.calls),
+            "errors": dict(counter.errors),
+            "tokens": {purpose: dict(usage) for purpose, usage in counter.tokens.items()},
+            "model_calls": dict(counter.model_calls),
+            "clients": len(_clients)
+        }
+
+def reset_llm_stats():
+    """Reset all LLM call counters."""
+    counter = _get_call_counter()
+    with counter.lock:
+        counter.calls.clear()
+        counter.errors.clear()
+        counter.tokens.clear()
+        counter.model_calls.clear()
+        counter.run_purposes.clear()
@@ -0,0 +1,278 @@
+"""
+In-process latency / token / payload instrumentation for the agent hot path.
+
+Every graph node and every external call (OpenAI chat and embeddings, Pinecone,
+Replicate, S3, Shopify GraphQL, Giga API) is recorded under a (kind, name) pair:
+
+    with track("pinecone", "query") as call:
+        results = index.query(...)
+        call["response_bytes"] = len(results)
+
+Metrics are exposed in Prometheus text format by `render_prometheus()` (served
+at /metrics by main_api) and as a dict with p50/p95 by `get_metrics_snapshot()`.
+Spans are also attached to the current trace ID so a single request can be
+inspected after the fact.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (LLM and Replicate calls run long)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Raw samples kept per series for percentile estimates
+SAMPLE_WINDOW = 1024
+# Number of recent traces kept for /traces/{trace_id}
+MAX_TRACES = 500
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+
+class _Series:
+    __slots__ = ("bucket_counts", "count", "sum", "samples")
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+_lock = threading.Lock()
+_latency: Dict[Tuple[str, str], _Series] = {}
+_errors: Dict[Tuple[str, str], int] = defaultdict(int)
+_tokens: Dict[Tuple[str, str, str], int] = defaultdict(int)
+_payload: Dict[Tuple[str, str, str], int] = defaultdict(int)
+_cache_lookups: Dict[Tuple[str, str], int] = defaultdict(int)
+_traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+# ---------------------------------------------------------------------------
+# Trace IDs
+# ---------------------------------------------------------------------------
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+def set_trace_id(trace_id: Optional[str]):
+    """Set the trace ID for the current context; returns a token for reset_trace_id()."""
+    return _trace_id.set(trace_id)
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """Spans recorded for a trace, in completion order."""
+    with _lock:
+        return list(_traces.get(trace_id, []))
+
+def _record_span(kind: str, name: str, seconds: float, error: Optional[str], extra: Dict[str, Any]):
+    trace_id = _trace_id.get()
+    if not trace_id:
+        return
+    span = {"kind": kind, "name": name, "duration_s": round(seconds, 6), "ended_at": time.time()}
+    if error:
+        span["error"] = error
+    span.update({k: v for k, v in extra.items() if v})
+    with _lock:
+        spans = _traces.get(trace_id)
+        if spans is None:
+            spans = _traces[trace_id] = []
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+        spans.append(span)
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+def observe_latency(kind: str, name: str, seconds: float):
+    with _lock:
+        series = _latency.get((kind, name))
+        if series is None:
+            series = _latency[(kind, name)] = _Series()
+        series.observe(seconds)
+
+def inc_error(kind: str, name: str):
+    with _lock:
+        _errors[(kind, name)] += 1
+
+def add_tokens(kind: str, name: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    with _lock:
+        if prompt_tokens:
+            _tokens[(kind, name, "prompt")] += prompt_tokens
+        if completion_tokens:
+            _tokens[(kind, name, "completion")] += completion_tokens
+
+def add_payload(kind: str, name: str, request_bytes: int = 0, response_bytes: int = 0):
+    with _lock:
+        if request_bytes:
+            _payload[(kind, name, "request")] += request_bytes
+        if response_bytes:
+            _payload[(kind, name, "response")] += response_bytes
+
+def count_cache(cache: str, hit: bool):
+    """Count one lookup in an in-process cache (result "hit" or "miss")."""
+    with _lock:
+        _cache_lookups[(cache, "hit" if hit else "miss")] += 1
+
+def record_call(kind: str, name: str, seconds: float, error: Optional[str] = None,
+                request_bytes: int = 0, response_bytes: int = 0,
+                prompt_tokens: int = 0, completion_tokens: int = 0):
+    """Record one finished call (used where a context manager does not fit, e.g. callbacks)."""
+    observe_latency(kind, name, seconds)
+    if error:
+        inc_error(kind, name)
+    add_payload(kind, name, request_bytes, response_bytes)
+    add_tokens(kind, name, prompt_tokens, completion_tokens)
+    _record_span(kind, name, seconds, error, {
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens
+    })
+
+@contextmanager
+def track(kind: str, name: str):
+    """
+    Time a block and record it under (kind, name).
+
+    The yielded dict may be filled with request_bytes, response_bytes,
+    prompt_tokens and completion_tokens. Exceptions are counted as errors and re-raised.
+    """
+    call = {"request_bytes": 0, "response_bytes": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    start = time.perf_counter()
+    error = None
+    try:
+        yield call
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record_call(kind, name, time.perf_counter() - start, error, **call)
+
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """Wrap a LangGraph node so every execution is recorded as kind 'node'."""
+    @functools.wraps(fn)
+    def node(state):
+        with track("node", name):
+            return fn(state)
+    return node
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def get_process_memory_bytes() -> int:
+    """Current resident set size of this process (falls back to peak RSS off Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def get_metrics_snapshot() -> Dict[str, Any]:
+    """Metrics as a dict: latency (count, sum, p50, p95, max), errors, tokens, payload, cache lookups."""
+    with _lock:
+        latency = {}
+        for (kind, name), series in _latency.items():
+            samples = list(series.samples)
+            latency[f"{kind}:{name}"] = {
+                "count": series.count,
+                "sum_s": series.sum,
+                "p50_s": _percentile(samples, 50),
+                "p95_s": _percentile(samples, 95),
+                "max_s": max(samples) if samples else 0.0
+            }
+        return {
+            "latency": latency,
+            "errors": {f"{k}:{n}": v for (k, n), v in _errors.items()},
+            "tokens": {f"{k}:{n}:{t}": v for (k, n, t), v in _tokens.items()},
+            "payload_bytes": {f"{k}:{n}:{d}": v for (k, n, d), v in _payload.items()},
+            "cache_lookups": {f"{c}:{r}": v for (c, r), v in _cache_lookups.items()},
+            "process_resident_memory_bytes": get_process_memory_bytes()
+        }
+
+def reset_metrics():
+    with _lock:
+        _latency.clear()
+        _errors.clear()
+        _tokens.clear()
+        _payload.clear()
+        _cache_lookups.clear()
+        _traces.clear()
+
+def _labels(**labels) -> str:
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP agent_latency_seconds Latency of graph nodes and external calls.",
+        "# TYPE agent_latency_seconds histogram"
+    ]
+    with _lock:
+        for (kind, name), series in sorted(_latency.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, series.bucket_counts):
+                cumulative += count
+                lines.append(f"agent_latency_seconds_bucket{_labels(kind=kind, name=name, le=bound)} {cumulative}")
+            lines.append(f"agent_latency_seconds_bucket{_labels(kind=kind, name=name, le='+Inf')} {series.count}")
+            lines.append(f"agent_latency_seconds_sum{_labels(kind=kind, name=name)} {series.sum:.6f}")
+            lines.append(f"agent_latency_seconds_count{_labels(kind=kind, name=name)} {series.count}")
+
+        lines += ["# HELP agent_errors_total Failed node executions and external calls.",
+                  "# TYPE agent_errors_total counter"]
+        for (kind, name), value in sorted(_errors.items()):
+            lines.append(f"agent_errors_total{_labels(kind=kind, name=name)} {value}")
+
+        lines += ["# HELP agent_tokens_total LLM and embedding token usage.",
+                  "# TYPE agent_tokens_total counter"]
+        for (kind, name, token_type), value in sorted(_tokens.items()):
+            lines.append(f"agent_tokens_total{_labels(kind=kind, name=name, type=token_type)} {value}")
+
+        lines += ["# HELP agent_payload_bytes_total Request/response payload bytes of external calls.",
+                  "# TYPE agent_payload_bytes_total counter"]
+        for (kind, name, direction), value in sorted(_payload.items()):
+            lines.append(f"agent_payload_bytes_total{_labels(kind=kind, name=name, direction=direction)} {value}")
+
+        lines += ["# HELP agent_cache_lookups_total In-process cache lookups by result.",
+                  "# TYPE agent_cache_lookups_total counter"]
+        for (cache, result), value in sorted(_cache_lookups.items()):
+            lines.append(f"agent_cache_lookups_total{_labels(cache=cache, result=result)} {value}")
+
+    lines += ["# HELP process_resident_memory_bytes Resident memory size in bytes.",
+              "# TYPE process_resident_memory_bytes gauge",
+              f"process_resident_memory_bytes {get_process_memory_bytes()}"]
+    return "\n".join(lines) + "\n"
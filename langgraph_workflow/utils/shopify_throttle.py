@@ -0,0 +1,110 @@
+"""
+Client-side mirror of Shopify's GraphQL cost bucket.
+
+    throttle = get_shopify_throttle()
+    throttle.acquire(estimated_cost)        # blocks while the bucket is too empty
+    ... POST the query ...
+    throttle.update(body.get("extensions"), operation)
+
+The Admin API gives every shop a bucket of query cost points (1000 on standard
+plans) that refills at `restoreRate` points per second; a query whose requested
+cost exceeds what is left fails with a THROTTLED error. Every response carries
+the current state in `extensions.cost.throttleStatus`, so the throttle keeps the
+last reported level, refills it locally with the reported restore rate and
+makes callers wait until their query fits. Parallel publishers therefore slow
+down as the bucket drains instead of collecting THROTTLED errors.
+
+Costs are estimated per operation from the last `requestedQueryCost` seen
+(config.SHOPIFY_DEFAULT_QUERY_COST, default 10, before the first response). A
+margin of config.SHOPIFY_COST_RESERVE points (default 50) is left in the bucket
+for other clients of the same shop.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+
+def _default_cost() -> float:
+    return getattr(config, "SHOPIFY_DEFAULT_QUERY_COST", 10)
+
+def _reserve() -> float:
+    return getattr(config, "SHOPIFY_COST_RESERVE", 50)
+
+def is_throttled(body: Dict[str, Any]) -> bool:
+    """True if a GraphQL response was rejected by the cost limiter."""
+    for error in body.get("errors") or []:
+        if isinstance(error, dict) and (error.get("extensions") or {}).get("code") == "THROTTLED":
+            return True
+    return False
+
+class CostThrottle:
+    """Tracks the shop's available query cost between responses."""
+
+    def __init__(self, maximum: float = 1000, restore_rate: float = 50):
+        self.maximum = maximum
+        self.restore_rate = restore_rate
+        self.available = maximum
+        self._updated_at = time.monotonic()
+        self._costs: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        """Apply the restore rate since the last update (lock held)."""
+        now = time.monotonic()
+        self.available = min(self.maximum, self.available + (now - self._updated_at) * self.restore_rate)
+        self._updated_at = now
+
+    def estimate(self, operation: str) -> float:
+        with self._cond:
+            return self._costs.get(operation, _default_cost())
+
+    def acquire(self, cost: float) -> float:
+        """
+        Wait until `cost` points (plus the reserve) are available and take them.
+
+        Returns:
+            Seconds spent waiting
+        """
+        start = time.monotonic()
+        with self._cond:
+            # Never ask for more than the bucket can ever hold
+            needed = min(cost + _reserve(), self.maximum)
+            while True:
+                self._refill()
+                if self.available >= needed:
+                    self.available -= cost
+                    return time.monotonic() - start
+                delay = (needed - self.available) / max(self.restore_rate, 1)
+                self._cond.wait(delay)
+
+    def update(self, extensions: Optional[Dict[str, Any]], operation: str = None):
+        """Adopt the bucket state reported in a response's `extensions`."""
+        cost = (extensions or {}).get("cost") or {}
+        status = cost.get("throttleStatus") or {}
+        with self._cond:
+            if operation and cost.get("requestedQueryCost") is not None:
+                self._costs[operation] = cost["requestedQueryCost"]
+            if status:
+                self.maximum = status.get("maximumAvailable", self.maximum)
+                self.restore_rate = status.get("restoreRate", self.restore_rate)
+                self.available = status.get("currentlyAvailable", self.available)
+                self._updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    def wait_for_restore(self, cost: float) -> float:
+        """Seconds until `cost` points are back, for sleeping after a THROTTLED error."""
+        with self._cond:
+            self._refill()
+            return max(0.0, (cost - self.available) / max(self.restore_rate, 1))
+
+_throttle = CostThrottle()
+
+def get_shopify_throttle() -> CostThrottle:
+    return _throttle
+
+def reset_shopify_throttle():
+    """Start from a full bucket (tests, or after switching shops)."""
+    global _throttle
+    _throttle = CostThrottle()
@@ -0,0 +1,181 @@
+"""
+Content-addressed object storage for images the pipeline has to publish by URL
+(uploads sent to Replicate, compressed listing images).
+
+    storage = get_storage()                       # from utils.clients
+    url = storage.put_file("/tmp/photo.jpg")      # uploads/<sha256>.jpg
+
+Objects are keyed by the SHA-256 of their bytes, so uploading the same file
+again costs one HEAD request (or nothing, if this process already saw the key)
+instead of a full PUT.
+
+Backends:
+- S3Storage: the shared boto3 client with a tuned transfer manager (multipart
+  above config.S3_MULTIPART_THRESHOLD, config.S3_MAX_CONCURRENCY parts in flight).
+- LocalStorage: files under a directory, served as file:// URLs (or under
+  config.LOCAL_STORAGE_BASE_URL). Selected with config.STORAGE_BACKEND = "local";
+  used by tests and offline runs.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional, Set
+
+from langgraph_workflow.utils.metrics import track
+
+MB = 1024 * 1024
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file's bytes, read in 1MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_key(path: str, prefix: str = "uploads") -> str:
+    """Object key for a file: <prefix>/<sha256><extension>."""
+    extension = os.path.splitext(path)[1].lower() or ".bin"
+    return f"{prefix}/{file_sha256(path)}{extension}"
+
+class S3Storage:
+    """Content-addressed uploads to one S3 bucket."""
+
+    def __init__(self, client, bucket: str, region: str, multipart_threshold: int = 8 * MB,
+                 multipart_chunksize: int = 8 * MB, max_concurrency: int = 8):
+        from boto3.s3.transfer import TransferConfig
+
+        self.client = client
+        self.bucket = bucket
+        self.region = region
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
+        self._known_keys: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def url_for(self, key: str) -> str:
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def exists(self, key: str) -> bool:
+        """True if the object is already in the bucket (HEAD request, remembered per process)."""
+        if key in self._known_keys:
+            return True
+        from botocore.exceptions import ClientError
+        with track("s3", "head_object"):
+            try:
+                self.client.head_object(Bucket=self.bucket, Key=key)
+            except ClientError as e:
+                # Not found is the normal first-upload answer, not a failed call
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return False
+                raise
+        with self._lock:
+            self._known_keys.add(key)
+        return True
+
+    def put_file(self, path: str, key: Optional[str] = None, prefix: str = "uploads") -> str:
+        """
+        Upload a file unless an object with the same key exists, and return its public URL.
+
+        Args:
+            path: Local file path
+            key: Explicit object key (defaults to the content-hash key under `prefix`)
+            prefix: Key prefix for content-hash keys
+
+        Returns:
+            Public URL of the object
+        """
+        key = key or content_key(path, prefix)
+        if self.exists(key):
+            print(f"♻️ Already in S3, skipping upload: {key}")
+            return self.url_for(key)
+
+        extra_args = {"ACL": "public-read"}
+        content_type = mimetypes.guess_type(path)[0]
+        if content_type:
+            extra_args["ContentType"] = content_type
+        with track("s3", "upload_file") as call:
+            call["request_bytes"] = os.path.getsize(path)
+            self.client.upload_file(path, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        with self._lock:
+            self._known_keys.add(key)
+        return self.url_for(key)
+
+    def put_bytes(self, data: bytes, extension: str, prefix: str = "uploads", content_type: Optional[str] = None) -> str:
+        """Upload in-memory bytes under <prefix>/<sha256><extension> unless already stored."""
+        import io
+
+        key = f"{prefix}/{hashlib.sha256(data).hexdigest()}{extension}"
+        if self.exists(key):
+            print(f"♻️ Already in S3, skipping upload: {key}")
+            return self.url_for(key)
+
+        extra_args = {"ACL": "public-read"}
+        content_type = content_type or mimetypes.guess_type(f"x{extension}")[0]
+        if content_type:
+            extra_args["ContentType"] = content_type
+        with track("s3", "upload_fileobj") as call:
+            call["request_bytes"] = len(data)
+            self.client.upload_fileobj(io.BytesIO(data), self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        with self._lock:
+            self._known_keys.add(key)
+        return self.url_for(key)
+
+class LocalStorage:
+    """Filesystem stand-in with the same interface as S3Storage."""
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/") if base_url else None
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def url_for(self, key: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{key}"
+        return f"file://{self._path(key)}"
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    @staticmethod
+    def _write_atomically(target: str, write):
+        """Call write(file) on a private temp file beside `target`, then move it into place."""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put_file(self, path: str, key: Optional[str] = None, prefix: str = "uploads") -> str:
+        key = key or content_key(path, prefix)
+        target = self._path(key)
+        if not os.path.exists(target):
+            with track("local_storage", "put_file") as call:
+                call["request_bytes"] = os.path.getsize(path)
+                with open(path, "rb") as source:
+                    self._write_atomically(target, lambda f: shutil.copyfileobj(source, f))
+        return self.url_for(key)
+
+    def put_bytes(self, data: bytes, extension: str, prefix: str = "uploads", content_type: Optional[str] = None) -> str:
+        key = f"{prefix}/{hashlib.sha256(data).hexdigest()}{extension}"
+        target = self._path(key)
+        if not os.path.exists(target):
+            with track("local_storage", "put_bytes") as call:
+                call["request_bytes"] = len(data)
+                self._write_atomically(target, lambda f: f.write(data))
+        return self.url_for(key)
@@ -1,7 +1,7 @@
 # main.py
 import os
 import config
-from langgraph_workflow.graph_build import create_graph
+from langgraph_workflow.graph_build import get_graph
 from langchain_core.messages import HumanMessage
 import uuid
 
@@ -9,7 +9,7 @@ import uuid
 os.environ["OPENAI_API_KEY"] = config.OPENAI_API_KEY
 
 # Create LangGraph
-graph = create_graph()
+graph = get_graph()
 
 # Visualize graph
 from IPython.display import Image, display
@@ -1,13 +1,19 @@
 from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any, Union
-from langgraph_workflow.graph_build import create_graph
-from fastapi.responses import JSONResponse
+from langgraph_workflow.graph_build import get_graph
+from fastapi.responses import JSONResponse, PlainTextResponse
+from langgraph_workflow.utils.metrics import (
+    new_trace_id, set_trace_id, reset_trace_id, get_trace, record_call, render_prometheus
+)
+from langgraph_workflow.utils import image_jobs
 from dotenv import load_dotenv
 import os
 import config
 import asyncio
+import weakref
 from contextlib import asynccontextmanager
 from fastapi.responses import StreamingResponse
 import json
@@ -17,7 +23,6 @@ from langchain_core.messages import HumanMessage, AIMessage
 import time
 import tempfile
 import base64
-from langchain_community.chat_models import ChatOpenAI
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -27,6 +32,10 @@ async def lifespan(app: FastAPI):
     session_store.clear()
     GLOBAL_STATE = None
     print("✅ All session memory cleared - starting fresh!")
+    if getattr(config, "SHOPIFY_PREFETCH_SHOP_METADATA", True):
+        # Publication/location IDs are per-shop constants: fetch them in the background
+        from langgraph_workflow.nodes.shopify_agent import warm_shop_metadata
+        asyncio.get_running_loop().run_in_executor(None, warm_shop_metadata)
     yield
     # Shutdown
     print("🛑 Backend shutting down...")
@@ -40,9 +49,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Type", "X-Requested-With", "Cache-Control", "Connection"],
+    expose_headers=["Content-Type", "X-Requested-With", "Cache-Control", "Connection", "X-Trace-ID"],
 )
 
+@app.middleware("http")
+async def trace_middleware(request: Request, call_next):
+    """Tag each request with a trace ID (X-Request-ID if given) and record its latency."""
+    trace_id = request.headers.get("X-Request-ID") or new_trace_id()
+    token = set_trace_id(trace_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        response = await call_next(request)
+        if response.status_code >= 500:
+            error = f"HTTP {response.status_code}"
+        response.headers["X-Trace-ID"] = trace_id
+        return response
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        route = request.scope.get("route")
+        name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+        record_call("http", name, time.perf_counter() - start, error=error)
+        reset_trace_id(token)
+
 # # Add timeout middleware
 # @app.middleware("http")
 # async def timeout_middleware(request: Request, call_next):
@@ -55,8 +86,6 @@ app.add_middleware(
 #             content={"error": "Request timeout", "message": "The request took too long to process"}
 #         )
 
-graph = create_graph()
-
 load_dotenv()
 
 print("OPENAI_API_KEY loaded:", os.getenv("OPENAI_API_KEY"))
@@ -67,6 +96,15 @@ os.environ["OPENAI_API_KEY"] = config.OPENAI_API_KEY
 # In-memory session store (for dev)
 session_store = {}
 GLOBAL_STATE = None
+# Held while a session's turn runs; entries disappear once no request uses them
+_session_locks = weakref.WeakValueDictionary()
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    """The lock serializing requests for one session (event loop thread only)."""
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
 
 def clear_session_memory():
     """Clear all session memory to start fresh."""
@@ -201,7 +239,8 @@ async def chat(request: Request):
         "incorporate_previous": False,
     }
     # Run the graph
-    result = graph.invoke(state, config={"configurable": {"thread_id": session_id}})
+    async with _session_lock(session_id):
+        result = await run_in_threadpool(get_graph().invoke, state, config={"configurable": {"thread_id": session_id}})
     # Extract the assistant's reply
     reply = result["messages"][-1].content if result.get("messages") else ""
     return {"response": reply}
@@ -233,102 +272,105 @@ async def chat_completions(request: ChatRequest):
         
         session_id = request.session_id or "default"
         
-        # Get or create session state
-        if session_id not in session_store:
-            session_store[session_id] = {
-                "messages": [],
-                "search_results": [],
-                "parsed_intent": {},
-                "image_modification_request": {},
-                "modified_images": [],
-                "awaiting_confirmation": False,
-                "incorporate_previous": False,
-                "uploaded_files": [],
-                "action_type": "general",
-            }
+        # Turns of one session run one at a time: they read and write its
+        # session_store entry and its graph checkpoint
+        async with _session_lock(session_id):
+            # Get or create session state
+            if session_id not in session_store:
+                session_store[session_id] = {
+                    "messages": [],
+                    "search_results": [],
+                    "parsed_intent": {},
+                    "image_modification_request": {},
+                    "modified_images": [],
+                    "awaiting_confirmation": False,
+                    "incorporate_previous": False,
+                    "uploaded_files": [],
+                    "action_type": "general",
+                }
         
-        session_state = session_store[session_id]
+            session_state = session_store[session_id]
         
-        # IMPORTANT: Clear uploaded files at the beginning of each request to prevent accumulation
-        session_state["uploaded_files"] = []
+            # IMPORTANT: Clear uploaded files at the beginning of each request to prevent accumulation
+            session_state["uploaded_files"] = []
         
-        # Save base64 images as uploaded files (only from current request)
-        if base64_images:
-            new_uploaded_files = save_base64_images_to_session(base64_images, session_id)
-            session_state["uploaded_files"] = new_uploaded_files  # Replace, don't extend
-            print(f"📁 Added {len(new_uploaded_files)} uploaded files to session (current request only)")
-        else:
-            print(f"📁 No uploaded files in current request")
+            # Save base64 images as uploaded files (only from current request)
+            if base64_images:
+                new_uploaded_files = save_base64_images_to_session(base64_images, session_id)
+                session_state["uploaded_files"] = new_uploaded_files  # Replace, don't extend
+                print(f"📁 Added {len(new_uploaded_files)} uploaded files to session (current request only)")
+            else:
+                print(f"📁 No uploaded files in current request")
         
-        # Add new message to session (append instead of overwrite)
-        if session_state["messages"]:
-            # Append only the new messages that aren't already in the session
-            existing_messages = session_state["messages"]
-            new_messages = []
+            # Add new message to session (append instead of overwrite)
+            if session_state["messages"]:
+                # Append only the new messages that aren't already in the session
+                existing_messages = session_state["messages"]
+                new_messages = []
             
-            for msg in messages:
-                # Check if this message is already in the session
-                is_duplicate = False
-                for existing_msg in existing_messages:
-                    if (isinstance(msg, type(existing_msg)) and 
-                        msg.content == existing_msg.content):
-                        is_duplicate = True
-                        break
+                for msg in messages:
+                    # Check if this message is already in the session
+                    is_duplicate = False
+                    for existing_msg in existing_messages:
+                        if (isinstance(msg, type(existing_msg)) and 
+                            msg.content == existing_msg.content):
+                            is_duplicate = True
+                            break
                 
-                if not is_duplicate:
-                    new_messages.append(msg)
+                    if not is_duplicate:
+                        new_messages.append(msg)
             
-            # Append new messages to existing ones
-            session_state["messages"].extend(new_messages)
-        else:
-            # First time, just set the messages
-            session_state["messages"] = messages
-        
-        # Prepare state for LangGraph
-        state = {
-            "messages": session_state["messages"],
-            "search_results": session_state.get("search_results", []),
-            "parsed_intent": session_state.get("parsed_intent", {}),
-            "image_modification_request": session_state.get("image_modification_request", {}),
-            "modified_images": session_state.get("modified_images", []),
-            "awaiting_confirmation": session_state.get("awaiting_confirmation", False),
-            "incorporate_previous": session_state.get("incorporate_previous", False),
-            "uploaded_files": session_state.get("uploaded_files", []),
-            "action_type": session_state.get("action_type", "general"),
-        }
+                # Append new messages to existing ones
+                session_state["messages"].extend(new_messages)
+            else:
+                # First time, just set the messages
+                session_state["messages"] = messages
+        
+            # Prepare state for LangGraph
+            state = {
+                "messages": session_state["messages"],
+                "search_results": session_state.get("search_results", []),
+                "parsed_intent": session_state.get("parsed_intent", {}),
+                "image_modification_request": session_state.get("image_modification_request", {}),
+                "modified_images": session_state.get("modified_images", []),
+                "awaiting_confirmation": session_state.get("awaiting_confirmation", False),
+                "incorporate_previous": session_state.get("incorporate_previous", False),
+                "uploaded_files": session_state.get("uploaded_files", []),
+                "action_type": session_state.get("action_type", "general"),
+            }
         
-        # Debug: Check what's in the state
-        print(f"🔍 Debug - State uploaded_files count: {len(state.get('uploaded_files', []))}")
-        print(f"🔍 Debug - Session uploaded_files count: {len(session_state.get('uploaded_files', []))}")
-        
-        # Run the graph
-        result = graph.invoke(state, config={"configurable": {"thread_id": session_id}})
-        
-        # Update session state - preserve search_results if not returned by graph
-        update_data = {
-            "parsed_intent": result.get("parsed_intent", {}),
-            "image_modification_request": result.get("image_modification_request", {}),
-            "modified_images": result.get("modified_images", []),
-            "awaiting_confirmation": result.get("awaiting_confirmation", False),
-            "incorporate_previous": result.get("incorporate_previous", False),
-            "uploaded_files": result.get("uploaded_files", []),
-            "action_type": result.get("action_type", session_state.get("action_type", "general")),
-        }
+            # Debug: Check what's in the state
+            print(f"🔍 Debug - State uploaded_files count: {len(state.get('uploaded_files', []))}")
+            print(f"🔍 Debug - Session uploaded_files count: {len(session_state.get('uploaded_files', []))}")
+        
+            # Run the graph
+            result = await run_in_threadpool(get_graph().invoke, state, config={"configurable": {"thread_id": session_id}})
+        
+            # Update session state - preserve search_results if not returned by graph
+            update_data = {
+                "parsed_intent": result.get("parsed_intent", {}),
+                "image_modification_request": result.get("image_modification_request", {}),
+                "modified_images": result.get("modified_images", []),
+                "awaiting_confirmation": result.get("awaiting_confirmation", False),
+                "incorporate_previous": result.get("incorporate_previous", False),
+                "uploaded_files": result.get("uploaded_files", []),
+                "action_type": result.get("action_type", session_state.get("action_type", "general")),
+            }
         
-        # Always preserve search_results - only update if new ones are returned
-        if "search_results" in result:
-            update_data["search_results"] = result["search_results"]
-            print(f"🔍 Session Update: Graph returned {len(result['search_results'])} search results")
-        else:
-            # Preserve existing search_results if not returned by graph
-            existing_results = session_state.get("search_results", [])
-            update_data["search_results"] = existing_results
-            print(f"🔍 Session Update: Preserving {len(existing_results)} existing search results")
+            # Always preserve search_results - only update if new ones are returned
+            if "search_results" in result:
+                update_data["search_results"] = result["search_results"]
+                print(f"🔍 Session Update: Graph returned {len(result['search_results'])} search results")
+            else:
+                # Preserve existing search_results if not returned by graph
+                existing_results = session_state.get("search_results", [])
+                update_data["search_results"] = existing_results
+                print(f"🔍 Session Update: Preserving {len(existing_results)} existing search results")
         
-        session_store[session_id].update(update_data)
+            session_store[session_id].update(update_data)
         
-        # IMPORTANT: Clear uploaded files after processing to prevent accumulation
-        session_store[session_id]["uploaded_files"] = []
+            # IMPORTANT: Clear uploaded files after processing to prevent accumulation
+            session_store[session_id]["uploaded_files"] = []
         
         # Get the last AI message or use image agent response
         ai_messages = [msg for msg in result["messages"] if isinstance(msg, AIMessage)]
@@ -445,102 +487,105 @@ async def chat_completions_json(request: ChatRequest):
         
         session_id = request.session_id or "default"
         
-        # Get or create session state
-        if session_id not in session_store:
-            session_store[session_id] = {
-                "messages": [],
-                "search_results": [],
-                "parsed_intent": {},
-                "image_modification_request": {},
-                "modified_images": [],
-                "awaiting_confirmation": False,
-                "incorporate_previous": False,
-                "uploaded_files": [],
-                "action_type": "general",
-            }
+        # Turns of one session run one at a time: they read and write its
+        # session_store entry and its graph checkpoint
+        async with _session_lock(session_id):
+            # Get or create session state
+            if session_id not in session_store:
+                session_store[session_id] = {
+                    "messages": [],
+                    "search_results": [],
+                    "parsed_intent": {},
+                    "image_modification_request": {},
+                    "modified_images": [],
+                    "awaiting_confirmation": False,
+                    "incorporate_previous": False,
+                    "uploaded_files": [],
+                    "action_type": "general",
+                }
         
-        session_state = session_store[session_id]
+            session_state = session_store[session_id]
         
-        # IMPORTANT: Clear uploaded files at the beginning of each request to prevent accumulation
-        session_state["uploaded_files"] = []
+            # IMPORTANT: Clear uploaded files at the beginning of each request to prevent accumulation
+            session_state["uploaded_files"] = []
         
-        # Save base64 images as uploaded files (only from current request)
-        if base64_images:
-            new_uploaded_files = save_base64_images_to_session(base64_images, session_id)
-            session_state["uploaded_files"] = new_uploaded_files  # Replace, don't extend
-            print(f"📁 Added {len(new_uploaded_files)} uploaded files to session (current request only)")
-        else:
-            print(f"📁 No uploaded files in current request")
+            # Save base64 images as uploaded files (only from current request)
+            if base64_images:
+                new_uploaded_files = save_base64_images_to_session(base64_images, session_id)
+                session_state["uploaded_files"] = new_uploaded_files  # Replace, don't extend
+                print(f"📁 Added {len(new_uploaded_files)} uploaded files to session (current request only)")
+            else:
+                print(f"📁 No uploaded files in current request")
         
-        # Add new message to session (append instead of overwrite)
-        if session_state["messages"]:
-            # Append only the new messages that aren't already in the session
-            existing_messages = session_state["messages"]
-            new_messages = []
+            # Add new message to session (append instead of overwrite)
+            if session_state["messages"]:
+                # Append only the new messages that aren't already in the session
+                existing_messages = session_state["messages"]
+                new_messages = []
             
-            for msg in messages:
-                # Check if this message is already in the session
-                is_duplicate = False
-                for existing_msg in existing_messages:
-                    if (isinstance(msg, type(existing_msg)) and 
-                        msg.content == existing_msg.content):
-                        is_duplicate = True
-                        break
+                for msg in messages:
+                    # Check if this message is already in the session
+                    is_duplicate = False
+                    for existing_msg in existing_messages:
+                        if (isinstance(msg, type(existing_msg)) and 
+                            msg.content == existing_msg.content):
+                            is_duplicate = True
+                            break
                 
-                if not is_duplicate:
-                    new_messages.append(msg)
+                    if not is_duplicate:
+                        new_messages.append(msg)
             
-            # Append new messages to existing ones
-            session_state["messages"].extend(new_messages)
-        else:
-            # First time, just set the messages
-            session_state["messages"] = messages
-        
-        # Prepare state for LangGraph
-        state = {
-            "messages": session_state["messages"],
-            "search_results": session_state.get("search_results", []),
-            "parsed_intent": session_state.get("parsed_intent", {}),
-            "image_modification_request": session_state.get("image_modification_request", {}),
-            "modified_images": session_state.get("modified_images", []),
-            "awaiting_confirmation": session_state.get("awaiting_confirmation", False),
-            "incorporate_previous": session_state.get("incorporate_previous", False),
-            "uploaded_files": session_state.get("uploaded_files", []),
-            "action_type": session_state.get("action_type", "general"),
-        }
+                # Append new messages to existing ones
+                session_state["messages"].extend(new_messages)
+            else:
+                # First time, just set the messages
+                session_state["messages"] = messages
+        
+            # Prepare state for LangGraph
+            state = {
+                "messages": session_state["messages"],
+                "search_results": session_state.get("search_results", []),
+                "parsed_intent": session_state.get("parsed_intent", {}),
+                "image_modification_request": session_state.get("image_modification_request", {}),
+                "modified_images": session_state.get("modified_images", []),
+                "awaiting_confirmation": session_state.get("awaiting_confirmation", False),
+                "incorporate_previous": session_state.get("incorporate_previous", False),
+                "uploaded_files": session_state.get("uploaded_files", []),
+                "action_type": session_state.get("action_type", "general"),
+            }
         
-        # Debug: Check what's in the state
-        print(f"🔍 Debug - State uploaded_files count: {len(state.get('uploaded_files', []))}")
-        print(f"🔍 Debug - Session uploaded_files count: {len(session_state.get('uploaded_files', []))}")
-        
-        # Run the graph
-        result = graph.invoke(state, config={"configurable": {"thread_id": session_id}})
-        
-        # Update session state - preserve search_results if not returned by graph
-        update_data = {
-            "parsed_intent": result.get("parsed_intent", {}),
-            "image_modification_request": result.get("image_modification_request", {}),
-            "modified_images": result.get("modified_images", []),
-            "awaiting_confirmation": result.get("awaiting_confirmation", False),
-            "incorporate_previous": result.get("incorporate_previous", False),
-            "uploaded_files": result.get("uploaded_files", []),
-            "action_type": result.get("action_type", session_state.get("action_type", "general")),
-        }
+            # Debug: Check what's in the state
+            print(f"🔍 Debug - State uploaded_files count: {len(state.get('uploaded_files', []))}")
+            print(f"🔍 Debug - Session uploaded_files count: {len(session_state.get('uploaded_files', []))}")
+        
+            # Run the graph
+            result = await run_in_threadpool(get_graph().invoke, state, config={"configurable": {"thread_id": session_id}})
+        
+            # Update session state - preserve search_results if not returned by graph
+            update_data = {
+                "parsed_intent": result.get("parsed_intent", {}),
+                "image_modification_request": result.get("image_modification_request", {}),
+                "modified_images": result.get("modified_images", []),
+                "awaiting_confirmation": result.get("awaiting_confirmation", False),
+                "incorporate_previous": result.get("incorporate_previous", False),
+                "uploaded_files": result.get("uploaded_files", []),
+                "action_type": result.get("action_type", session_state.get("action_type", "general")),
+            }
         
-        # Always preserve search_results - only update if new ones are returned
-        if "search_results" in result:
-            update_data["search_results"] = result["search_results"]
-            print(f"🔍 Session Update: Graph returned {len(result['search_results'])} search results")
-        else:
-            # Preserve existing search_results if not returned by graph
-            existing_results = session_state.get("search_results", [])
-            update_data["search_results"] = existing_results
-            print(f"🔍 Session Update: Preserving {len(existing_results)} existing search results")
+            # Always preserve search_results - only update if new ones are returned
+            if "search_results" in result:
+                update_data["search_results"] = result["search_results"]
+                print(f"🔍 Session Update: Graph returned {len(result['search_results'])} search results")
+            else:
+                # Preserve existing search_results if not returned by graph
+                existing_results = session_state.get("search_results", [])
+                update_data["search_results"] = existing_results
+                print(f"🔍 Session Update: Preserving {len(existing_results)} existing search results")
         
-        session_store[session_id].update(update_data)
+            session_store[session_id].update(update_data)
         
-        # IMPORTANT: Clear uploaded files after processing to prevent accumulation
-        session_store[session_id]["uploaded_files"] = []
+            # IMPORTANT: Clear uploaded files after processing to prevent accumulation
+            session_store[session_id]["uploaded_files"] = []
         
         # Get the last AI message or use image agent response
         ai_messages = [msg for msg in result["messages"] if isinstance(msg, AIMessage)]
@@ -655,6 +700,72 @@ async def info():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: node / external call latency, tokens, payload sizes, errors, RSS."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{trace_id}")
+async def trace(trace_id: str):
+    """Spans (graph nodes and external calls) recorded for one request."""
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return {"trace_id": trace_id, "spans": spans}
+
+@app.get("/v1/image-jobs/{job_id}")
+async def get_image_job(job_id: str):
+    """Status, progress and output URL of an asynchronous image edit."""
+    job = await run_in_threadpool(image_jobs.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Image job {job_id} not found")
+    return job
+
+@app.get("/v1/image-jobs/{job_id}/events")
+async def image_job_events(job_id: str):
+    """Server-sent events with the job record whenever its status or progress changes."""
+    if not await run_in_threadpool(image_jobs.get_job, job_id):
+        raise HTTPException(status_code=404, detail=f"Image job {job_id} not found")
+
+    async def generate_events():
+        last = None
+        while True:
+            job = await run_in_threadpool(image_jobs.get_job, job_id)
+            state = (job["status"], job["progress"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(job)}\n\n"
+            if job["status"] in image_jobs.TERMINAL_STATUSES:
+                yield "data: [DONE]\n\n"
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(generate_events(), media_type="text/event-stream")
+
+@app.delete("/v1/image-jobs/{job_id}")
+async def cancel_image_job(job_id: str):
+    """Cancel an unfinished image edit."""
+    job = await run_in_threadpool(image_jobs.cancel_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Image job {job_id} not found")
+    return job
+
+@app.post("/v1/replicate/webhook")
+async def replicate_webhook(request: Request):
+    """
+    Completion callback from Replicate (set config.REPLICATE_WEBHOOK_URL to this route).
+    Deliveries must be signed with config.REPLICATE_WEBHOOK_SECRET; without a
+    secret the route accepts nothing.
+    """
+    body = await request.body()
+    secret = getattr(config, "REPLICATE_WEBHOOK_SECRET", None)
+    if not secret:
+        raise HTTPException(status_code=403, detail="Replicate webhooks require REPLICATE_WEBHOOK_SECRET")
+    if not image_jobs.verify_webhook_signature(request.headers, body, secret):
+        raise HTTPException(status_code=401, detail="Invalid or expired webhook signature")
+    job = await run_in_threadpool(image_jobs.handle_webhook, json.loads(body))
+    return {"ok": True, "job_id": job["id"] if job else None}
+
 @app.get("/v1/models")
 async def list_models():
     """List available models (for compatibility with OpenAI API)."""
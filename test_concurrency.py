@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded parallel executor used by the image agent (no external services needed)
+"""
+
+import threading
+import time
+
+from langgraph_workflow.utils.concurrency import run_bounded
+
+def test_order_and_parallelism():
+    """Outcomes keep input order and wall time is close to the slowest job"""
+    print("🧪 Testing order and parallelism")
+    delays = [0.3, 0.1, 0.2, 0.05]
+    in_flight = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def job(delay):
+        with lock:
+            in_flight.append(delay)
+            peak[0] = max(peak[0], len(in_flight))
+        time.sleep(delay)
+        with lock:
+            in_flight.remove(delay)
+        return delay * 10
+
+    start = time.perf_counter()
+    outcomes = run_bounded(job, delays, max_workers=4)
+    elapsed = time.perf_counter() - start
+
+    assert [o["result"] for o in outcomes] == [3.0, 1.0, 2.0, 0.5]
+    assert all(o["status"] == "success" for o in outcomes)
+    assert elapsed < 0.5, elapsed
+    assert peak[0] == 4
+
+    peak[0] = 0
+    run_bounded(job, delays, max_workers=2)
+    assert peak[0] == 2
+    print(f"✅ Ordered results in {elapsed:.2f}s")
+
+def test_errors_timeouts_and_progress():
+    """Failures and timeouts are reported per job without stopping the others"""
+    print("🧪 Testing errors and timeouts")
+
+    def job(item):
+        if item == "boom":
+            raise RuntimeError("replicate failed")
+        if item == "slow":
+            time.sleep(1.0)
+        return item.upper()
+
+    seen = []
+    start = time.perf_counter()
+    outcomes = run_bounded(job, ["a", "boom", "slow", "b"], max_workers=2, timeout=0.2,
+                           on_outcome=lambda index, outcome: seen.append(index))
+    elapsed = time.perf_counter() - start
+
+    assert [o["status"] for o in outcomes] == ["success", "error", "timeout", "success"]
+    assert outcomes[1]["error"] == "replicate failed"
+    assert outcomes[3]["result"] == "B"
+    assert sorted(seen) == [0, 1, 2, 3]
+    assert elapsed < 0.6, elapsed
+    print(f"✅ Partial results: {[o['status'] for o in outcomes]}")
+
+def test_timed_out_jobs_keep_their_slot():
+    """A timed-out job is reported at once but its slot is only reused after its thread returns"""
+    print("🧪 Testing the bound across timeouts")
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def job(delay):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(delay)
+        with lock:
+            in_flight[0] -= 1
+        return delay
+
+    outcomes = run_bounded(job, [0.4, 0.4, 0.05, 0.05], max_workers=2, timeout=0.1)
+    assert [o["status"] for o in outcomes] == ["timeout", "timeout", "success", "success"]
+    assert peak[0] == 2, peak[0]
+    print(f"✅ Peak concurrency {peak[0]} with 2 workers")
+
+def test_cancellation():
+    """Setting the cancel event abandons running jobs and skips pending ones"""
+    print("🧪 Testing cancellation")
+    cancel = threading.Event()
+    started = []
+
+    def job(item):
+        started.append(item)
+        if item == 0:
+            return "done"
+        cancel.set()
+        time.sleep(1.0)
+        return "late"
+
+    outcomes = run_bounded(job, list(range(5)), max_workers=2, cancel_event=cancel)
+    statuses = [o["status"] for o in outcomes]
+    assert statuses[1] == "cancelled"
+    assert statuses[2:] == ["cancelled"] * 3
+    assert len(started) <= 3
+    print(f"✅ Cancelled: {statuses}")
+
+if __name__ == "__main__":
+    test_order_and_parallelism()
+    test_errors_timeouts_and_progress()
+    test_timed_out_jobs_keep_their_slot()
+    test_cancellation()
+    print("\n🎉 All concurrency tests passed!")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for the content-addressed image edit cache (uses the offline stand-ins)
+"""
+
+import os
+import tempfile
+import time
+
+import config
+from benchmarks.stand_ins import StandInConfig, install_stand_ins, make_jpeg
+from langgraph_workflow.utils import edit_cache, image_jobs
+
+def _setup():
+    workdir = tempfile.mkdtemp()
+    config.IMAGE_EDIT_CACHE_PATH = os.path.join(workdir, "image_edit_cache.json")
+    config.IMAGE_JOBS_PATH = os.path.join(workdir, "image_jobs.json")
+    config.IMAGE_JOB_POLL_INITIAL = 0.02
+    config.IMAGE_JOB_POLL_MAX = 0.05
+    edit_cache.reset_edit_cache()
+    image_jobs.reset_jobs()
+    return workdir
+
+def test_keys_and_eviction():
+    """Keys ignore prompt formatting; entries expire and are evicted LRU"""
+    print("🧪 Testing cache keys and eviction")
+    _setup()
+    source = edit_cache.url_source("https://cdn/a.jpg")
+    assert edit_cache.edit_cache_key(source, "Put it on a balcony.") == edit_cache.edit_cache_key(source, "  put it on a   BALCONY ")
+    assert edit_cache.edit_cache_key(source, "balcony", "jpg") != edit_cache.edit_cache_key(source, "balcony", "png")
+
+    config.IMAGE_EDIT_CACHE_MAX_ENTRIES = 2
+    for name in ("a", "b"):
+        edit_cache.put_cached_edit(name, f"https://out/{name}.jpg")
+        time.sleep(0.01)
+    with open(config.IMAGE_EDIT_CACHE_PATH) as f:
+        persisted = f.read()
+    assert edit_cache.get_cached_edit("a")  # "a" is now the most recently used
+    with open(config.IMAGE_EDIT_CACHE_PATH) as f:
+        assert f.read() == persisted  # hits are written out with the next put
+    edit_cache.put_cached_edit("c", "https://out/c.jpg")
+    assert edit_cache.get_cached_edit("b") is None
+    assert edit_cache.get_cached_edit("a") and edit_cache.get_cached_edit("c")
+
+    # Persisted: a fresh process sees the same entries
+    edit_cache.reset_edit_cache()
+    assert edit_cache.get_cached_edit("c")["modified_url"] == "https://out/c.jpg"
+    assert edit_cache.evict_cached_edit("c") and edit_cache.get_cached_edit("c") is None
+
+    config.IMAGE_EDIT_CACHE_TTL = 0
+    edit_cache.put_cached_edit("d", "https://out/d.jpg")
+    time.sleep(0.01)
+    assert edit_cache.get_cached_edit("d") is None
+    del config.IMAGE_EDIT_CACHE_TTL, config.IMAGE_EDIT_CACHE_MAX_ENTRIES
+    print("✅ Keys, LRU eviction, TTL and persistence work")
+
+def test_processor_reuses_edits():
+    """A repeated edit skips Replicate (and S3 for re-uploaded files) unless regeneration is asked for"""
+    print("🧪 Testing ImageProcessor cache hits")
+    workdir = _setup()
+    stand_ins = install_stand_ins(StandInConfig(replicate_latency=0.05, llm_latency=0))
+    s3 = stand_ins[f"s3:{config.AWS_REGION}"]
+    from langgraph_workflow.nodes.image_agent import ImageProcessor, wants_regenerate
+    processor = ImageProcessor()
+
+    first = processor.process_url_image("https://cdn/chair.jpg", "Put the chair on a balcony")
+    second = processor.process_url_image("https://cdn/chair.jpg", "put the chair on a balcony.")
+    assert first["status"] == second["status"] == "success"
+    assert second["cached"] and second["modified_url"] == first["modified_url"]
+    assert stand_ins["replicate"].calls == 1
+
+    processor.process_url_image("https://cdn/chair.jpg", "Put the chair on a balcony", use_cache=False)
+    assert stand_ins["replicate"].calls == 2
+
+    # Same bytes under a different file name (a re-upload) hit the cache before the S3 upload
+    jpeg = make_jpeg((640, 480))
+    paths = [os.path.join(workdir, name) for name in ("one.jpg", "two.jpg")]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(jpeg)
+    processor.process_local_image(paths[0], "Sunny patio background")
+    uploads = len(s3.objects)
+    result = processor.process_local_image(paths[1], "Sunny patio background")
+    assert result["cached"] and result["original_file"] == paths[1]
+    assert len(s3.objects) == uploads
+    assert stand_ins["replicate"].calls == 3
+
+    assert wants_regenerate("Please regenerate it") and wants_regenerate("重新生成这张图")
+    assert not wants_regenerate("Put it in a garden")
+    print("✅ Cache hits skip Replicate and S3")
+
+if __name__ == "__main__":
+    test_keys_and_eviction()
+    test_processor_reuses_edits()
+    print("\n🎉 All edit cache tests passed!")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for publishing compressed copies of oversized images (no external services needed)
+"""
+
+import os
+import tempfile
+
+import config
+from langgraph_workflow.utils.clients import reset_clients, set_client
+from langgraph_workflow.utils.image_probe import clear_probe_cache
+from langgraph_workflow.utils.image_compress import reset_compressed_images
+from benchmarks.stand_ins import FakeHTTPSession
+
+class CountingSession(FakeHTTPSession):
+    def __init__(self, image_size):
+        super().__init__(image_size, image_latency=0)
+        self.full_downloads = 0
+
+    def get(self, url, timeout=None, stream=False, headers=None, **kwargs):
+        if not (headers or {}).get("Range"):
+            self.full_downloads += 1
+        return super().get(url, timeout=timeout, stream=stream, headers=headers, **kwargs)
+
+def test_oversized_image_is_stored_once():
+    """The compressed copy gets a real URL and later publishes reuse it"""
+    print("🧪 Testing compressed image publishing")
+    from langgraph_workflow.nodes.listing_database import compress_image_url, validate_image_resolution
+
+    names = ("STORAGE_BACKEND", "LOCAL_STORAGE_DIR", "COMPRESSED_IMAGES_PATH")
+    saved = {name: getattr(config, name) for name in names if hasattr(config, name)}
+    with tempfile.TemporaryDirectory() as tmp:
+        config.STORAGE_BACKEND = "local"
+        config.LOCAL_STORAGE_DIR = os.path.join(tmp, "store")
+        config.COMPRESSED_IMAGES_PATH = os.path.join(tmp, "compressed_images.json")
+        reset_clients()
+        reset_compressed_images()
+        clear_probe_cache()
+        session = CountingSession((1600, 1200))
+        set_client("http", session)
+        try:
+            url = "https://cdn.test/large.jpg"
+            assert validate_image_resolution(url, max_megapixels=1)[0] is False
+            compressed = compress_image_url(url, max_megapixels=1)
+            assert compressed.startswith("file://") and "/compressed/" in compressed
+            assert validate_image_resolution(compressed, max_megapixels=1)[0]
+            assert session.full_downloads == 1
+
+            # A new process finds the stored copy without touching the original
+            reset_compressed_images()
+            clear_probe_cache()
+            assert compress_image_url(url, max_megapixels=1) == compressed
+            assert session.full_downloads == 1
+            print(f"✅ Stored once at {compressed}")
+        finally:
+            for name in names:
+                if name in saved:
+                    setattr(config, name, saved[name])
+                else:
+                    delattr(config, name)
+            reset_clients()
+            reset_compressed_images()
+
+def test_draft_decoding_resize():
+    """Large downscales decode the JPEG at reduced scale and report CPU time"""
+    print("🧪 Testing draft-mode resize")
+    from io import BytesIO
+    from PIL import Image
+    from langgraph_workflow.utils.image_compress import downscale_jpeg
+
+    source = BytesIO()
+    Image.new("RGB", (4000, 3000), (90, 90, 200)).save(source, "JPEG")
+    resized = downscale_jpeg(source.getvalue(), max_megapixels=0.75)
+    assert (resized["width"], resized["height"]) == (4000, 3000)
+    assert (resized["new_width"], resized["new_height"]) == (1000, 750)
+    assert resized["cpu_seconds"] > 0
+    with Image.open(BytesIO(resized["data"])) as out:
+        assert out.size == (1000, 750) and out.format == "JPEG"
+    print(f"✅ Resized in {resized['cpu_seconds'] * 1000:.0f}ms CPU")
+
+if __name__ == "__main__":
+    test_oversized_image_is_stored_once()
+    test_draft_decoding_resize()
+    print("\n🎉 All image compression tests passed!")
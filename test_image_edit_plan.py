@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-call image edit planning and local language detection (uses the offline stand-ins)
+"""
+
+import json
+
+from benchmarks.stand_ins import StandInConfig, catalog_to_vectors, install_stand_ins, DEFAULT_CATALOG
+from langgraph_workflow.utils.llm_registry import get_llm_stats, reset_llm_stats
+
+def test_english_skips_translation():
+    """Already-English prompts are not sent to the translation LLM"""
+    print("🧪 Testing local language detection")
+    install_stand_ins(StandInConfig(llm_latency=0))
+    from langgraph_workflow.nodes.image_agent import is_english_text, translate_instruction_to_english
+    reset_llm_stats()
+
+    assert not is_english_text("Remplacer l'arrière-plan")
+    assert is_english_text("Replace the background with a “modern” office — keep the chair.")
+    assert not is_english_text("把背景改成咖啡店")
+    assert not is_english_text("   ")
+
+    prompt = "Replace the background with a modern office, keeping the chair unchanged."
+    assert translate_instruction_to_english(prompt) == prompt
+    assert "translate_instruction" not in get_llm_stats()["calls"]
+
+    translate_instruction_to_english("把背景改成咖啡店")
+    assert get_llm_stats()["calls"]["translate_instruction"] == 1
+    print("✅ Translation only runs for non-English text")
+
+def test_plan_image_edit_single_call():
+    """plan_image_edit returns the SKU and English prompt from one LLM call"""
+    print("🧪 Testing plan_image_edit")
+    install_stand_ins(StandInConfig(llm_latency=0))
+    from langchain_core.messages import HumanMessage
+    from langgraph_workflow.nodes.image_agent import plan_image_edit
+    reset_llm_stats()
+
+    with open(DEFAULT_CATALOG, "r", encoding="utf-8") as f:
+        products = catalog_to_vectors(json.load(f)[:5])
+    search_results = [{"metadata": p["metadata"]} for p in products]
+    sku = search_results[0]["metadata"]["sku"]
+
+    query = f"Put {sku} in a coffee shop, keep it unchanged"
+    plan = plan_image_edit(query, search_results, [HumanMessage(content=query)])
+    assert plan["sku"] == sku, plan
+    assert plan["replicate_prompt"].isascii()
+    assert get_llm_stats()["calls"] == {"image_edit_plan": 1}
+
+    # Earlier edits are shown only under the product they were made to
+    from langgraph_workflow.nodes.image_agent import _format_products_for_llm
+    other = search_results[1]["metadata"]["sku"]
+    listing = _format_products_for_llm(search_results[:2], {other: ["Put it on a beach"]})
+    first, second = listing.split(f"SKU: {other}", 1)
+    assert "beach" not in first and "Previous edit: Put it on a beach" in second
+    print(f"✅ Plan: {plan}")
+
+if __name__ == "__main__":
+    test_english_skips_translation()
+    test_plan_image_edit_single_call()
+    print("\n🎉 All image edit plan tests passed!")
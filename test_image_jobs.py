@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the asynchronous Replicate job subsystem (uses the offline Replicate stand-in)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+
+import config
+from benchmarks.stand_ins import FakeReplicateClient
+from langgraph_workflow.utils import image_jobs
+from langgraph_workflow.utils.clients import set_client
+
+def _setup(latency: float) -> FakeReplicateClient:
+    config.IMAGE_JOBS_PATH = os.path.join(tempfile.mkdtemp(), "image_jobs.json")
+    config.IMAGE_JOB_POLL_INITIAL = 0.05
+    config.IMAGE_JOB_POLL_MAX = 0.1
+    image_jobs.reset_jobs()
+    client = FakeReplicateClient(latency)
+    set_client("replicate", client)
+    return client
+
+def test_submit_and_poll():
+    """submit_job() returns immediately; the poller settles the job"""
+    print("🧪 Testing submit + polling")
+    _setup(latency=0.3)
+
+    start = time.perf_counter()
+    job = image_jobs.submit_job({"prompt": "coffee shop", "input_image": "https://x/a.jpg"}, metadata={"sku": "W1"})
+    assert time.perf_counter() - start < 0.1
+    assert job["status"] == "starting"
+
+    job = image_jobs.wait_for_job(job["id"], timeout=5)
+    assert job["status"] == "succeeded", job
+    assert job["output_url"].startswith("https://replicate.delivery/bench/")
+    assert job["progress"] == 1.0
+    assert image_jobs.list_jobs(sku="W1")[0]["id"] == job["id"]
+    print(f"✅ Job finished in {job['completed_at'] - job['created_at']:.2f}s")
+
+def test_persistence_and_pending_resolution():
+    """Jobs survive a reload and pending modified_images entries get resolved"""
+    print("🧪 Testing persistence")
+    _setup(latency=0.2)
+    job = image_jobs.submit_job({"prompt": "garden", "input_image": "https://x/b.jpg"})
+    pending = [{"sku": "W2", "status": "pending", "job_id": job["id"], "modified_url": None}]
+
+    # Simulate a restart: forget the in-memory state, reload from disk
+    image_jobs.reset_jobs()
+    assert image_jobs.get_job(job["id"])["status"] in ("starting", "processing")
+    image_jobs.wait_for_job(job["id"], timeout=5)
+
+    resolved = image_jobs.resolve_modified_images(pending)
+    assert resolved[0]["status"] == "success"
+    assert resolved[0]["modified_url"] == image_jobs.get_job(job["id"])["output_url"]
+    print("✅ Pending entry resolved after reload")
+
+def test_webhook():
+    """A signed webhook settles the job without waiting for the poller"""
+    print("🧪 Testing webhook")
+    _setup(latency=60)
+    job = image_jobs.submit_job({"prompt": "beach", "input_image": "https://x/c.jpg"})
+
+    secret = "whsec_" + base64.b64encode(b"test-secret").decode()
+    body = b'{"id": "%s", "status": "succeeded", "output": "https://out/c.jpg"}' % job["id"].encode()
+
+    def signed(timestamp):
+        signature = base64.b64encode(hmac.new(b"test-secret", b"msg_1.%d." % timestamp + body,
+                                              hashlib.sha256).digest()).decode()
+        return {"webhook-id": "msg_1", "webhook-timestamp": str(timestamp), "webhook-signature": f"v1,{signature}"}
+
+    headers = signed(int(time.time()))
+    assert image_jobs.verify_webhook_signature(headers, body, secret)
+    assert not image_jobs.verify_webhook_signature(headers, body + b" ", secret)
+    # A replayed delivery carries its original, now stale, timestamp
+    assert not image_jobs.verify_webhook_signature(signed(int(time.time()) - 3600), body, secret)
+
+    updated = image_jobs.handle_webhook({"id": job["id"], "status": "succeeded", "output": "https://out/c.jpg"})
+    assert updated["status"] == "succeeded"
+    assert updated["output_url"] == "https://out/c.jpg"
+    assert image_jobs.handle_webhook({"id": "unknown"}) is None
+    print("✅ Webhook applied")
+
+def test_job_settled_by_another_process():
+    """A job finished by another worker (e.g. its webhook landed there) is seen through the database"""
+    print("🧪 Testing shared job database")
+    import sqlite3
+    _setup(latency=60)
+    job = image_jobs.submit_job({"prompt": "forest", "input_image": "https://x/d.jpg"})
+
+    other = sqlite3.connect(image_jobs._jobs_path())
+    data = {**job, "status": "succeeded", "output_url": "https://out/d.jpg", "updated_at": time.time(),
+            "completed_at": time.time()}
+    with other:
+        other.execute("UPDATE image_jobs SET status = ?, data = ? WHERE id = ?",
+                      ("succeeded", json.dumps(data), job["id"]))
+    other.close()
+
+    settled = image_jobs.wait_for_job(job["id"], timeout=5)
+    assert settled["status"] == "succeeded" and settled["output_url"] == "https://out/d.jpg", settled
+    # The finished row is not overwritten by this process's view
+    assert image_jobs.handle_webhook({"id": job["id"], "status": "failed"})["status"] == "succeeded"
+    print("✅ Job settled elsewhere picked up")
+
+if __name__ == "__main__":
+    test_submit_and_poll()
+    test_persistence_and_pending_resolution()
+    test_webhook()
+    test_job_settled_by_another_process()
+    print("\n🎉 All image job tests passed!")
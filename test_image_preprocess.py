@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for local image pre-processing before Replicate (no external services needed)
+"""
+
+import os
+import tempfile
+
+from PIL import Image
+
+import config
+from benchmarks.stand_ins import StandInConfig, install_stand_ins
+from langgraph_workflow.utils import edit_cache, image_jobs
+from langgraph_workflow.utils.image_preprocess import discard_preprocessed, preprocess_image
+
+def test_rotates_downscales_and_reencodes():
+    """A sideways, oversized phone photo comes out upright, smaller and as WEBP"""
+    print("🧪 Testing orientation fix and downscale")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "phone.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # stored sideways, display rotated 90°
+        Image.new("RGB", (4000, 3000), (200, 30, 30)).save(path, "JPEG", exif=exif)
+
+        prepared = preprocess_image(path, max_side=1000, target_format="WEBP")
+        try:
+            assert prepared["changed"] and prepared["path"] != path
+            assert (prepared["original_width"], prepared["original_height"]) == (4000, 3000)
+            assert (prepared["width"], prepared["height"]) == (750, 1000)
+            assert prepared["steps"] == ["exif_transpose", "downscale", "encode_webp"]
+            with Image.open(prepared["path"]) as out:
+                assert out.format == "WEBP" and out.size == (750, 1000)
+                assert out.getexif().get(0x0112) is None
+            assert prepared["bytes"] < prepared["original_bytes"]
+        finally:
+            discard_preprocessed(prepared)
+        assert not os.path.exists(prepared["path"])
+        print(f"✅ {prepared['original_bytes']} -> {prepared['bytes']} bytes")
+
+def test_small_upright_jpeg_is_used_as_is():
+    """Nothing is rewritten when the upload is already suitable"""
+    print("🧪 Testing pass-through")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "small.jpg")
+        Image.new("RGB", (800, 600), (10, 120, 10)).save(path, "JPEG")
+        prepared = preprocess_image(path, max_side=1000)
+        assert not prepared["changed"] and prepared["path"] == path
+        assert (prepared["width"], prepared["height"]) == (800, 600)
+        discard_preprocessed(prepared)
+        assert os.path.exists(path)
+
+        png = os.path.join(tmp, "cutout.png")
+        Image.new("RGBA", (400, 400), (0, 0, 0, 0)).save(png)
+        prepared = preprocess_image(png, max_side=1000, target_format="JPEG")
+        try:
+            with Image.open(prepared["path"]) as out:
+                assert out.mode == "RGB" and out.getpixel((0, 0)) == (255, 255, 255)
+        finally:
+            discard_preprocessed(prepared)
+        print("✅ Pass-through and alpha flattening")
+
+def test_undecodable_upload_is_sent_as_is():
+    """A file PIL cannot read is uploaded unchanged instead of failing the edit"""
+    print("🧪 Testing pre-processing fallback")
+    with tempfile.TemporaryDirectory() as tmp:
+        config.IMAGE_EDIT_CACHE_PATH = os.path.join(tmp, "image_edit_cache.json")
+        config.IMAGE_JOBS_PATH = os.path.join(tmp, "image_jobs.db")
+        edit_cache.reset_edit_cache()
+        image_jobs.reset_jobs()
+        stand_ins = install_stand_ins(StandInConfig(replicate_latency=0, llm_latency=0))
+        from langgraph_workflow.nodes.image_agent import ImageProcessor
+
+        path = os.path.join(tmp, "photo.heic")
+        with open(path, "wb") as f:
+            f.write(b"\x00\x00\x00\x18ftypheic" + os.urandom(512))
+        result = ImageProcessor().process_local_image(path, "Sunny patio background")
+        assert result["status"] == "success", result
+        assert "input_image" not in result
+        assert list(stand_ins[f"s3:{config.AWS_REGION}"].objects.values()) == [os.path.getsize(path)]
+        image_jobs.reset_jobs()
+        print("✅ Undecodable file uploaded as-is")
+
+if __name__ == "__main__":
+    test_rotates_downscales_and_reencodes()
+    test_small_upright_jpeg_is_used_as_is()
+    test_undecodable_upload_is_sent_as_is()
+    print("\n🎉 All image preprocessing tests passed!")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for the header-only image probe used by listing validation (no external services needed)
+"""
+
+from langgraph_workflow.utils.clients import reset_clients, set_client
+from langgraph_workflow.utils.image_probe import clear_probe_cache, probe_image
+from benchmarks.stand_ins import FakeHTTPSession
+
+class CountingSession(FakeHTTPSession):
+    """Records the bytes served for every GET."""
+
+    def __init__(self, image_size):
+        super().__init__(image_size, image_latency=0)
+        self.requests = []
+
+    def get(self, url, timeout=None, stream=False, headers=None, **kwargs):
+        response = super().get(url, timeout=timeout, stream=stream, headers=headers, **kwargs)
+        self.requests.append({"range": (headers or {}).get("Range"), "bytes": len(response.content)})
+        return response
+
+def _install(image_size):
+    reset_clients()
+    clear_probe_cache()
+    session = CountingSession(image_size)
+    set_client("http", session)
+    return session
+
+def test_probe_reads_header_only_and_caches():
+    """Dimensions come from a ranged read and the second lookup is free"""
+    print("🧪 Testing ranged probe and cache")
+    session = _install((3000, 2000))
+    try:
+        info = probe_image("https://cdn.test/a.jpg")
+        assert (info["width"], info["height"], info["format"]) == (3000, 2000, "JPEG")
+        assert len(session.requests) == 1 and session.requests[0]["range"]
+        assert info["bytes_read"] < len(session.image_bytes())
+
+        again = probe_image("https://cdn.test/a.jpg")
+        assert (again["width"], again["height"]) == (3000, 2000)
+        assert len(session.requests) == 1
+        print(f"✅ Read {info['bytes_read']} of {len(session.image_bytes())} bytes")
+    finally:
+        reset_clients()
+
+def test_compress_downloads_only_when_needed():
+    """Images within the limit are never fully downloaded"""
+    print("🧪 Testing validate/compress fetches")
+    from langgraph_workflow.nodes.listing_database import compress_image_url, validate_image_resolution
+
+    session = _install((1600, 1200))
+    try:
+        url = "https://cdn.test/small.jpg"
+        assert validate_image_resolution(url)[0]
+        assert compress_image_url(url) == url
+        assert [r["range"] is not None for r in session.requests] == [True]
+
+        print("✅ One header read, no download")
+    finally:
+        reset_clients()
+
+if __name__ == "__main__":
+    test_probe_reads_header_only_and_caches()
+    test_compress_downloads_only_when_needed()
+    print("\n🎉 All image probe tests passed!")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite listing database (no external services needed)
+"""
+
+import json
+import os
+import tempfile
+
+from langgraph_workflow.nodes.listing_database import ListingDatabase
+
+def _metadata(sku):
+    return {"sku": sku, "main_image_url": f"https://cdn.test/{sku}/0.jpg",
+            "image_urls": [f"https://cdn.test/{sku}/0.jpg", f"https://cdn.test/{sku}/1.jpg"]}
+
+def test_imports_legacy_json_and_reads_by_sku():
+    """An existing JSON database is imported once and served by SKU"""
+    print("🧪 Testing legacy import and lookups")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = {
+            "A1": {"sku": "A1", "status": "ready_for_listing", "added_at": "2025-01-01T00:00:00"},
+            "B2": {"sku": "B2", "status": "listed", "added_at": "2025-01-02T00:00:00"},
+        }
+        with open(os.path.join(tmp, "listing_ready_products.json"), "w") as f:
+            json.dump(legacy, f)
+
+        db = ListingDatabase(os.path.join(tmp, "listing_ready_products.json"))
+        assert db.db_path.endswith(".db")
+        assert db.list_products() == ["A1", "B2"]
+        assert db.get_product("B2") == legacy["B2"]
+        assert db.get_product("missing") == {}
+        assert db.list_products_by_status("listed") == ["B2"]
+        assert db.remove_product("A1") and not db.remove_product("A1")
+        db.close()
+
+        # The import only happens into an empty database
+        reopened = ListingDatabase(os.path.join(tmp, "listing_ready_products.db"))
+        assert reopened.list_products() == ["B2"]
+        reopened.close()
+        print("✅ Imported and queried")
+
+def test_add_products_round_trip():
+    """Search results and modifications are stored per SKU"""
+    print("🧪 Testing add/update")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ListingDatabase(os.path.join(tmp, "listing.db"))
+        assert db.add_multiple_products_from_search([{"metadata": _metadata("C3")}, {"metadata": {}}]) == ["C3"]
+        assert db.add_product_from_search("C3", _metadata("C3"))
+        product = db.get_product("C3")
+        assert product["status"] == "ready_for_listing"
+        assert product["listing_images"]["primary_image"] == "https://cdn.test/C3/0.jpg"
+
+        assert db.load_products().keys() == {"C3"}
+        db.save_products({"D4": {"sku": "D4", "status": "ready_for_listing"}})
+        assert db.list_products() == ["D4"]
+        db.close()
+        print("✅ Round trip")
+
+def test_bulk_upsert_skips_unchanged_rows():
+    """One batch writes only new or changed products"""
+    print("🧪 Testing bulk upsert")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ListingDatabase(os.path.join(tmp, "listing.db"))
+        products = {f"S{i}": {"sku": f"S{i}", "status": "ready_for_listing", "added_at": f"2025-01-{i + 1:02d}"}
+                    for i in range(30)}
+        assert len(db.upsert_products(products)) == 30
+        assert db.upsert_products(products) == []
+        # Rebuilt from search results: only the timestamps differ
+        restamped = {sku: {**product, "added_at": "2026-01-01"} for sku, product in products.items()}
+        assert db.upsert_products(restamped) == []
+        assert len(db.changes_since(0)) == 30
+
+        changed = dict(products, S3={**products["S3"], "status": "listed"})
+        assert db.upsert_products(changed) == ["S3"]
+        assert db.upsert_products(changed, replace_existing=False) == []
+        assert db.list_products_by_status("listed") == ["S3"]
+
+        results = [{"metadata": {"sku": "S1"}}, {"metadata": {"sku": "NEW"}}, {"metadata": {"sku": "NEW"}}]
+        assert db.add_multiple_products_from_search(results) == ["S1", "NEW"]
+        assert db.get_product("S1") == products["S1"]
+        assert db.get_product("NEW")["status"] == "ready_for_listing"
+        db.close()
+        print("✅ Only changed rows written")
+
+def test_concurrent_modifications_are_not_lost():
+    """Concurrent writers serialize and every change is journaled"""
+    print("🧪 Testing concurrent writers")
+    import threading
+    from langgraph_workflow.utils.image_probe import remember_dimensions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "listing.db")
+        ListingDatabase(path).add_product_from_search("E5", _metadata("E5"))
+        urls = [f"https://replicate.delivery/e5/{i}.jpg" for i in range(8)]
+        for url in urls:
+            remember_dimensions(url, 1024, 768, "JPEG")
+
+        def add(url):
+            db = ListingDatabase(path)
+            assert db.add_modified_product("E5", _metadata("E5"), url, "new background")
+            db.close()
+
+        threads = [threading.Thread(target=add, args=(url,)) for url in urls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db = ListingDatabase(path)
+        # Instances share one connection per file instead of opening one each
+        other = ListingDatabase(path)
+        assert other._conn is db._conn
+        other.close()
+        product = db.get_product("E5")
+        kept = [m["modified_image_url"] for m in product["modifications"]]
+        archived = [m["modified_image_url"] for m in db.get_archived_modifications("E5")]
+        assert len(kept) == 5 and sorted(kept + archived) == sorted(urls)
+        changes = db.changes_since(0)
+        assert [c["op"] for c in changes] == ["add"] + ["modify"] * 8
+        assert changes[-1]["product"] == product
+        assert db.changes_since(changes[-1]["id"]) == []
+        db.close()
+        print(f"✅ {len(urls)} concurrent modifications kept")
+
+def test_read_cache_invalidated_by_writes():
+    """Repeated reads hit memory until any connection commits a change"""
+    print("🧪 Testing the listing read cache")
+    from langgraph_workflow.utils.metrics import get_metrics_snapshot, reset_metrics
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "listing.db")
+        writer = ListingDatabase(path)
+        writer.add_product_from_search("F6", _metadata("F6"))
+        reset_metrics()
+
+        reader = ListingDatabase(path)
+        for _ in range(3):
+            assert reader.get_product("F6")["sku"] == "F6"
+            assert reader.list_products() == ["F6"]
+        lookups = get_metrics_snapshot()["cache_lookups"]
+        assert lookups["listing_products:miss"] == 1 and lookups["listing_products:hit"] == 2
+        assert lookups["listing_skus:miss"] == 1 and lookups["listing_skus:hit"] == 2
+
+        # Callers get their own copy
+        reader.get_product("F6")["status"] = "mutated"
+        assert reader.get_product("F6")["status"] == "ready_for_listing"
+
+        # A write through another connection is visible on the next read
+        writer.add_product_from_search("G7", _metadata("G7"))
+        assert reader.list_products() == ["F6", "G7"]
+        assert writer.remove_product("F6")
+        assert reader.get_product("F6") == {}
+
+        # A load overlapping a commit that another lookup already saw is not cached
+        def racing_load():
+            skus = reader._load_skus()
+            writer.add_product_from_search("H8", _metadata("H8"))
+            reader.get_product("G7")
+            return skus
+
+        assert reader._cache.list_products(racing_load) == ["G7"]
+        assert reader.list_products() == ["G7", "H8"]
+        writer.close()
+        reader.close()
+        print(f"✅ Cache lookups: {get_metrics_snapshot()['cache_lookups']}")
+
+def test_legacy_records_are_compacted():
+    """Old unbounded records are trimmed on first open and stay bounded"""
+    print("🧪 Testing retention and compaction")
+    with tempfile.TemporaryDirectory() as tmp:
+        originals = [f"https://cdn.test/H8/{i}.jpg" for i in range(30)]
+        modifications = [{"modified_image_url": f"https://replicate.delivery/h8/{i}.jpg",
+                          "modified_at": f"2025-02-{i + 1:02d}T00:00:00"} for i in range(12)]
+        legacy = {"H8": {
+            "sku": "H8", "status": "ready_for_listing",
+            "original_metadata": {"sku": "H8", "image_urls": originals},
+            "modified_image_url": modifications[-1]["modified_image_url"],
+            "modifications": modifications,
+            "listing_images": {"all_images": [m["modified_image_url"] for m in reversed(modifications)] + originals}
+        }}
+        with open(os.path.join(tmp, "listing_ready_products.json"), "w") as f:
+            json.dump(legacy, f)
+
+        db = ListingDatabase(os.path.join(tmp, "listing_ready_products.db"))
+        product = db.get_product("H8")
+        assert [m["modified_image_url"] for m in product["modifications"]] == \
+            [m["modified_image_url"] for m in modifications[-5:]]
+        assert len(db.get_archived_modifications("H8")) == 7
+        images = product["listing_images"]["all_images"]
+        assert len(images) == product["listing_images"]["total_images"] == 20
+        assert images[:5] == [m["modified_image_url"] for m in reversed(modifications[-5:])]
+        assert images[5:] == originals[:15]
+        assert db.compact_products() == 0
+
+        from langgraph_workflow.utils.image_probe import remember_dimensions
+        remember_dimensions("https://replicate.delivery/h8/new.jpg", 1024, 768, "JPEG")
+        assert db.add_modified_product("H8", legacy["H8"]["original_metadata"], "https://replicate.delivery/h8/new.jpg", "x")
+        product = db.get_product("H8")
+        assert len(product["modifications"]) == 5 and len(db.get_archived_modifications("H8")) == 8
+        assert product["listing_images"]["all_images"][0] == "https://replicate.delivery/h8/new.jpg"
+        assert len(product["listing_images"]["all_images"]) == 20
+        db.close()
+        print("✅ Records bounded")
+
+if __name__ == "__main__":
+    test_imports_legacy_json_and_reads_by_sku()
+    test_add_products_round_trip()
+    test_bulk_upsert_skips_unchanged_rows()
+    test_concurrent_modifications_are_not_lost()
+    test_read_cache_invalidated_by_writes()
+    test_legacy_records_are_compacted()
+    print("\n🎉 All listing database tests passed!")
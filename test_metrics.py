@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for the latency / token instrumentation layer (no external services needed)
+"""
+
+from langgraph_workflow.utils import metrics
+
+def test_track_records_latency_and_errors():
+    """track() records latency, payload and error counts"""
+    print("🧪 Testing track()")
+    metrics.reset_metrics()
+
+    with metrics.track("pinecone", "query") as call:
+        call["response_bytes"] = 128
+
+    try:
+        with metrics.track("pinecone", "query"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    snapshot = metrics.get_metrics_snapshot()
+    assert snapshot["latency"]["pinecone:query"]["count"] == 2
+    assert snapshot["errors"]["pinecone:query"] == 1
+    assert snapshot["payload_bytes"]["pinecone:query:response"] == 128
+    print("✅ Latency, payload and error counts recorded")
+
+def test_trace_spans():
+    """Spans are attached to the current trace ID, including wrapped nodes"""
+    print("🧪 Testing trace spans")
+    metrics.reset_metrics()
+
+    node = metrics.instrument_node("planning", lambda state: {"plan_action": "gpt4_chat"})
+    token = metrics.set_trace_id("trace-1")
+    try:
+        assert node({}) == {"plan_action": "gpt4_chat"}
+        metrics.record_call("openai_chat", "planning", 0.2, prompt_tokens=10, completion_tokens=3)
+    finally:
+        metrics.reset_trace_id(token)
+
+    spans = metrics.get_trace("trace-1")
+    assert [(s["kind"], s["name"]) for s in spans] == [("node", "planning"), ("openai_chat", "planning")]
+    assert spans[1]["prompt_tokens"] == 10
+    assert metrics.get_trace("missing") == []
+    print(f"✅ Trace spans: {spans}")
+
+def test_prometheus_output():
+    """render_prometheus() emits cumulative histogram buckets and counters"""
+    print("🧪 Testing Prometheus output")
+    metrics.reset_metrics()
+
+    metrics.observe_latency("node", "rag_search", 0.3)
+    metrics.observe_latency("node", "rag_search", 3.0)
+    metrics.add_tokens("openai_chat", "planning", prompt_tokens=7)
+
+    text = metrics.render_prometheus()
+    assert 'agent_latency_seconds_bucket{kind="node",name="rag_search",le="0.5"} 1' in text
+    assert 'agent_latency_seconds_bucket{kind="node",name="rag_search",le="+Inf"} 2' in text
+    assert 'agent_latency_seconds_count{kind="node",name="rag_search"} 2' in text
+    assert 'agent_tokens_total{kind="openai_chat",name="planning",type="prompt"} 7' in text
+    assert "process_resident_memory_bytes" in text
+    print("✅ Prometheus output looks right")
+
+if __name__ == "__main__":
+    test_track_records_latency_and_errors()
+    test_trace_spans()
+    test_prometheus_output()
+    print("\n🎉 All metrics tests passed!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk catalog publishing against the local Shopify stand-in (no external services needed)
+"""
+
+import os
+import tempfile
+
+from langgraph_workflow.nodes.listing_database import ListingDatabase
+from benchmarks.stand_ins import DEFAULT_CATALOG
+from test_shopify_publish import _shopify_test_session
+
+def test_bulk_publish_catalog_reconciles_listing_database():
+    """A catalog push is two bulk jobs; results land in the listing database and reruns skip listed SKUs"""
+    print("🧪 Testing bulk catalog publish")
+    from langgraph_workflow.nodes import shopify_bulk
+
+    with _shopify_test_session(SHOPIFY_BULK_POLL_INTERVAL=0) as http:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ListingDatabase(os.path.join(tmp, "listing.db"))
+            catalog = shopify_bulk.load_catalog(DEFAULT_CATALOG, limit=6)
+            rejected = catalog[3]["sku"]
+            answer = http.shopify._answer
+
+            def reject_one(query, variables):
+                product_input = variables.get("input")
+                if "productSet" in query and isinstance(product_input, dict) and \
+                        product_input["variants"][0]["inventoryItem"]["sku"] == rejected:
+                    return {"data": {"productSet": {"product": None,
+                            "userErrors": [{"field": ["input", "title"], "message": "Title is too long"}]}}}
+                return answer(query, variables)
+
+            http.shopify._answer = reject_one
+            report = shopify_bulk.bulk_publish(catalog, validate_images=False, db=db)
+
+            assert report["created"] == 5 and report["published"] == 5, report
+            assert [f["sku"] for f in report["failed"]] == [rejected]
+            assert len(report["operations"]) == 2
+            ops = http.shopify.operations
+            assert ops["bulkOperationRunMutation"] == 2 and ops["stagedUploadsCreate"] == 2
+            assert "productCreate" not in ops
+
+            listed = db.list_products_by_status("listed")
+            assert sorted(listed) == sorted(m["sku"] for m in catalog if m["sku"] != rejected)
+            product = db.get_product(listed[0])
+            assert product["shopify"]["product_id"].startswith("gid://shopify/Product/")
+            assert product["shopify"]["live_url"].startswith("https://bench.myshopify.com/products/")
+            assert db.get_product(rejected)["status"] == "listing_failed"
+
+            # Rerun: only the failed SKU is sent again
+            http.shopify._answer = answer
+            rerun = shopify_bulk.bulk_publish(catalog, validate_images=False, db=db)
+            assert rerun["skipped"] == 5 and rerun["created"] == 1 and not rerun["failed"], rerun
+
+            # A lost index is rebuilt from the shop; products are then updated, not duplicated
+            published = db.get_shopify_ids()
+            db.remove_shopify_ids(list(published))
+            deleted_sku = catalog[0]["sku"]
+            del http.shopify.products[published[deleted_sku]["product_id"]]
+            reconciled = shopify_bulk.reconcile_shopify_index(db)
+            assert reconciled["found"] == 5, reconciled
+            rebuilt = db.get_shopify_ids()
+            assert deleted_sku not in rebuilt
+            assert all(rebuilt[sku]["product_id"] == published[sku]["product_id"] for sku in rebuilt)
+
+            products_before = len(http.shopify.products)
+            third = shopify_bulk.bulk_publish(catalog, validate_images=False, db=db)
+            assert third["updated"] == 5 and third["created"] == 1 and third["published"] == 1, third
+            assert len(http.shopify.products) == products_before + 1
+            db.close()
+        print(f"✅ {report['created']} products in {len(report['operations'])} bulk jobs, failed SKU retried on rerun")
+
+def test_bulk_publish_keeps_interactive_copy():
+    """A bulk run after an interactive publish keeps the stored AI copy instead of retitling the product"""
+    print("🧪 Testing bulk publish after an interactive publish")
+    from langgraph_workflow.nodes import shopify_agent, shopify_bulk
+
+    with _shopify_test_session(title=lambda metadata, language="en": "Handcrafted " + metadata["name"],
+                               description=lambda metadata, language="en": "Made to last.",
+                               SHOPIFY_BULK_POLL_INTERVAL=0) as http:
+        metadata = shopify_bulk.load_catalog(DEFAULT_CATALOG, limit=1)[0]
+        media = [{"originalSource": url, "mediaContentType": "IMAGE"} for url in metadata.get("image_urls", [])]
+        first = shopify_agent.publish_listing(metadata, media)
+        assert first["success"], first
+
+        http.shopify.operations.clear()
+        report = shopify_bulk.bulk_publish([metadata], validate_images=False, db=shopify_agent.shopify_index())
+        assert report["skipped"] == 1 and report["updated"] == 0, report
+        assert "bulkOperationRunMutation" not in http.shopify.operations
+        assert http.shopify.products[first["product_id"]]["title"] == "Handcrafted " + metadata["name"]
+        print("✅ Bulk run left the interactively published product unchanged")
+
+if __name__ == "__main__":
+    test_bulk_publish_catalog_reconciles_listing_database()
+    test_bulk_publish_keeps_interactive_copy()
+    print("\n🎉 All bulk publishing tests passed!")
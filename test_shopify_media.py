@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test script for parallel Shopify media preparation (no external services needed)
+"""
+
+import time
+
+from langgraph_workflow.utils.clients import reset_clients, set_client
+from langgraph_workflow.utils.image_probe import clear_probe_cache
+from benchmarks.stand_ins import FakeHTTPSession
+
+def test_media_prepared_in_parallel_and_in_order():
+    """Twelve images take about one fetch and keep the catalog order"""
+    print("🧪 Testing parallel media preparation")
+    from langgraph_workflow.nodes.shopify_agent import create_media_for_products, create_media_from_metadata
+
+    reset_clients()
+    clear_probe_cache()
+    set_client("http", FakeHTTPSession((800, 600), image_latency=0.1))
+    try:
+        urls = [f"https://cdn.test/W123/{i}.jpg" for i in range(12)]
+        metadata = {"sku": "W123", "main_image_url": urls[0], "image_urls": urls}
+
+        start = time.perf_counter()
+        media = create_media_from_metadata(metadata, modified_images=[{"url": "https://replicate.delivery/x.jpg"}])
+        elapsed = time.perf_counter() - start
+        assert [m["originalSource"] for m in media] == ["https://replicate.delivery/x.jpg"] + urls[1:]
+        assert elapsed < 0.6, elapsed
+
+        other = {"sku": "W456", "main_image_url": "https://cdn.test/W456/main.jpg", "image_urls": []}
+        by_sku = create_media_for_products([metadata, other])
+        assert [m["originalSource"] for m in by_sku["W123"]] == urls
+        assert [m["originalSource"] for m in by_sku["W456"]] == ["https://cdn.test/W456/main.jpg"]
+        print(f"✅ {len(media)} images prepared in {elapsed:.2f}s")
+    finally:
+        reset_clients()
+
+if __name__ == "__main__":
+    test_media_prepared_in_parallel_and_in_order()
+    print("\n🎉 All Shopify media tests passed!")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Test script for the parallel Shopify publishing pipeline (no external services needed)
+"""
+
+import contextlib
+import os
+import tempfile
+import time
+
+from langgraph_workflow.utils.clients import reset_clients, set_client
+from langgraph_workflow.utils.shopify_throttle import CostThrottle, is_throttled, reset_shopify_throttle
+from benchmarks.stand_ins import FakeHTTPSession
+
+def _use_temporary_index():
+    """
+    Point the listing database (and its Shopify ID index) at a throwaway file, with the
+    index enabled (the benchmark stand-ins turn it off); returns a restore callback
+    """
+    import config
+    tmp = tempfile.TemporaryDirectory()
+    saved = {name: getattr(config, name) for name in ("LISTING_DB_PATH", "SHOPIFY_INDEX_ENABLED") if hasattr(config, name)}
+    config.LISTING_DB_PATH = os.path.join(tmp.name, "listing.db")
+    config.SHOPIFY_INDEX_ENABLED = True
+
+    def restore():
+        for name in ("LISTING_DB_PATH", "SHOPIFY_INDEX_ENABLED"):
+            if name in saved:
+                setattr(config, name, saved[name])
+            else:
+                delattr(config, name)
+        tmp.cleanup()
+    return restore
+
+@contextlib.contextmanager
+def _shopify_test_session(shopify_latency: float = 0.0, title=None, description=None, **settings):
+    """
+    A fresh Shopify stand-in with cleared clients, throttle and shop metadata and a
+    temporary SKU index; yields the FakeHTTPSession.
+
+    title/description replace the LLM copy generators; `settings` are config
+    attributes to set. Both (and config.SHOPIFY_PUBLISH_MODE, which tests change
+    mid-run) are restored on exit.
+    """
+    import config
+    from langgraph_workflow.nodes import shopify_agent
+
+    reset_clients()
+    reset_shopify_throttle()
+    shopify_agent.invalidate_shop_metadata()
+    http = FakeHTTPSession(shopify_latency=shopify_latency)
+    set_client("http", http)
+    original_title, original_description = shopify_agent.generate_ai_title, shopify_agent.generate_ai_description
+    if title:
+        shopify_agent.generate_ai_title = title
+    if description:
+        shopify_agent.generate_ai_description = description
+    names = {"SHOPIFY_PUBLISH_MODE", *settings}
+    saved = {name: getattr(config, name) for name in names if hasattr(config, name)}
+    for name, value in settings.items():
+        setattr(config, name, value)
+    restore_index = _use_temporary_index()
+    try:
+        yield http
+    finally:
+        restore_index()
+        for name in names:
+            if name in saved:
+                setattr(config, name, saved[name])
+            elif hasattr(config, name):
+                delattr(config, name)
+        shopify_agent.generate_ai_title, shopify_agent.generate_ai_description = original_title, original_description
+        shopify_agent.invalidate_shop_metadata()
+        reset_clients()
+        reset_shopify_throttle()
+
+def test_throttle_waits_for_budget():
+    """A drained bucket delays the next query until the restore rate refills it"""
+    print("🧪 Testing Shopify cost throttle")
+    throttle = CostThrottle()
+    throttle.update({"cost": {"requestedQueryCost": 20,
+                              "throttleStatus": {"maximumAvailable": 100, "currentlyAvailable": 0, "restoreRate": 200}}},
+                    "productCreate")
+    assert throttle.estimate("productCreate") == 20
+    assert throttle.estimate("locations") == 10
+
+    # 20 points plus the 50 point reserve at 200 points/s
+    waited = throttle.acquire(throttle.estimate("productCreate"))
+    assert 0.25 < waited < 1.0, waited
+    assert is_throttled({"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}]})
+    assert not is_throttled({"data": {}})
+    print(f"✅ Waited {waited:.2f}s for budget")
+
+def test_publish_products_parallel_with_retries():
+    """Products publish concurrently, keep their order and retry failures before creation"""
+    print("🧪 Testing parallel publishing")
+    from langgraph_workflow.nodes import shopify_agent
+
+    failures = {"W2": 1}
+
+    def fake_title(metadata, language="en"):
+        sku = metadata["sku"]
+        if failures.get(sku):
+            failures[sku] -= 1
+            raise RuntimeError("LLM timeout")
+        return f"Title {sku}"
+
+    with _shopify_test_session(shopify_latency=0.05, title=fake_title,
+                               description=lambda metadata, language="en": "A description.") as http:
+        jobs = [({"sku": f"W{i}", "price": 10 + i}, []) for i in range(6)]
+        start = time.perf_counter()
+        results = shopify_agent.publish_products(jobs)
+        elapsed = time.perf_counter() - start
+
+        assert all(r["success"] for r in results), results
+        assert [r["title"] for r in results] == [f"Title W{i}" for i in range(6)]
+        assert results[2]["attempts"] == 2
+        assert http.shopify.operations["productSet"] == 6
+        # Six products x two requests x 50ms run four at a time (plus one 1s retry backoff)
+        assert elapsed < 6 * 2 * 0.05 + 1.0, elapsed
+
+        # A rerun reuses the published copy: no LLM calls, no Shopify requests
+        def no_llm(metadata, language="en"):
+            raise AssertionError("copy should be reused")
+
+        shopify_agent.generate_ai_title = shopify_agent.generate_ai_description = no_llm
+        http.shopify.operations.clear()
+        rerun = shopify_agent.publish_products(jobs)
+        assert all(r["unchanged"] for r in rerun), rerun
+        assert [r["title"] for r in rerun] == [f"Title W{i}" for i in range(6)]
+        assert http.shopify.operations == {}
+        print(f"✅ Published {len(results)} products in {elapsed:.2f}s, rerun skipped all")
+
+def test_shop_metadata_cached_and_refreshed():
+    """Publication and location IDs are fetched once and refetched when a step rejects them"""
+    print("🧪 Testing shop metadata cache")
+    from langgraph_workflow.nodes import shopify_agent
+
+    with _shopify_test_session() as http:
+        product_input = {"title": "Walnut Side Table", "descriptionHtml": "", "productType": "Table"}
+        for sku in ("W1", "W2", "W3"):
+            result = shopify_agent.publish_product_to_shopify(product_input, [], {"sku": sku, "price": 99})
+            assert result["success"], result
+        assert http.shopify.operations["publications"] == 1
+        assert http.shopify.operations["locations"] == 1
+
+        # The location was deleted: productSet fails once, the IDs are refreshed
+        cached = shopify_agent.get_shop_metadata()
+        shopify_agent._shop_metadata["location_id"] = "gid://shopify/Location/404"
+        answer = http.shopify._answer
+
+        def reject_unknown_location(query, variables):
+            if "productSet" in query and \
+                    variables["input"]["variants"][0]["inventoryQuantities"][0]["locationId"] != cached["location_id"]:
+                return {"data": {"productSet": {"product": None,
+                        "userErrors": [{"field": ["input", "variants", "0", "inventoryQuantities", "0", "locationId"],
+                                       "message": "Location not found"}]}}}
+            return answer(query, variables)
+
+        http.shopify._answer = reject_unknown_location
+        result = shopify_agent.publish_product_to_shopify(product_input, [], {"sku": "W4", "price": 99})
+        assert result["success"], result
+        assert http.shopify.operations["locations"] == 2
+        assert shopify_agent.get_shop_metadata()["location_id"] == cached["location_id"]
+        print("✅ Shop metadata fetched once, refreshed after a rejected location")
+
+def test_create_not_repeated_after_transport_failure():
+    """A productSet create that times out may have succeeded, so it is neither retried nor re-sent"""
+    print("🧪 Testing create after a dropped response")
+    from langgraph_workflow.nodes import shopify_agent
+
+    with _shopify_test_session(title=lambda metadata, language="en": "Pine Shelf",
+                               description=lambda metadata, language="en": "A shelf.") as http:
+        shopify_agent.get_shop_metadata()
+        answer = http.shopify._answer
+
+        def created_then_timed_out(query, variables):
+            body = answer(query, variables)
+            if "productSet" in query:
+                raise TimeoutError("read timed out")
+            return body
+
+        http.shopify._answer = created_then_timed_out
+        products_before = len(http.shopify.products)
+        result = shopify_agent.publish_listing({"sku": "P1", "price": 40}, [])
+        assert not result["success"] and result["retryable"] is False, result
+        assert result["attempts"] == 1
+        assert http.shopify.operations["productSet"] == 1
+        assert len(http.shopify.products) == products_before + 1
+        print("✅ Timed-out create sent once")
+
+def test_publish_round_trips():
+    """productSet publishes in two requests; the legacy mode skips the URL re-fetch"""
+    print("🧪 Testing publish round trips")
+    import config
+    from langgraph_workflow.nodes import shopify_agent
+
+    with _shopify_test_session() as http:
+        shopify_agent.get_shop_metadata()
+        product_input = {"title": "Oak Bench", "descriptionHtml": "", "productType": "Bench"}
+        media = [{"originalSource": "https://cdn.test/bench.jpg", "mediaContentType": "IMAGE"}]
+
+        http.shopify.operations.clear()
+        result = shopify_agent.publish_product_to_shopify(product_input, media, {"sku": "B1", "price": 120})
+        assert result["success"], result
+        assert result["live_url"] == "https://bench.myshopify.com/products/oak-bench"
+        assert http.shopify.operations == {"productSet": 1, "publishablePublish": 1}
+
+        config.SHOPIFY_PUBLISH_MODE = "legacy"
+        http.shopify.operations.clear()
+        result = shopify_agent.publish_product_to_shopify(product_input, media, {"sku": "B2", "price": 120})
+        assert result["success"], result
+        assert http.shopify.operations == {"productCreate": 1, "publishablePublish": 1, "productVariantsBulkCreate": 1}
+        print("✅ productSet: 2 requests, legacy: 3 requests")
+
+def test_publish_is_an_upsert():
+    """Republishing a SKU skips it when unchanged, updates it in place when changed and recreates deleted products"""
+    print("🧪 Testing idempotent publishing")
+    from langgraph_workflow.nodes import shopify_agent
+
+    with _shopify_test_session() as http:
+        shopify_agent.get_shop_metadata()
+        product_input = {"title": "Oak Bench", "descriptionHtml": "", "productType": "Bench"}
+        media = [{"originalSource": "https://cdn.test/bench.jpg", "mediaContentType": "IMAGE"}]
+        metadata = {"sku": "B1", "price": 120}
+
+        first = shopify_agent.publish_product_to_shopify(product_input, media, metadata)
+        assert first["success"] and shopify_agent.shopify_index().get_shopify_ids(["B1"])["B1"]["published"]
+
+        http.shopify.operations.clear()
+        again = shopify_agent.publish_product_to_shopify(product_input, media, metadata)
+        assert again["unchanged"] and again["product_id"] == first["product_id"]
+        assert again["live_url"] == first["live_url"]
+        assert http.shopify.operations == {}
+
+        # Stock sold since the first publish must survive an update
+        variant = http.shopify.variants[first["product_id"]][0]
+        assert variant["available"] == 100
+        variant["available"] = 37
+        renamed = {**product_input, "title": "Solid Oak Bench"}
+        updated = shopify_agent.publish_product_to_shopify(renamed, media, metadata)
+        assert updated["updated"] and updated["product_id"] == first["product_id"]
+        assert http.shopify.operations == {"productSet": 1}
+        assert http.shopify.variants[first["product_id"]][0]["available"] == 37
+
+        # Deleted in the Shopify admin: the stale index entry is replaced by a new product
+        del http.shopify.products[first["product_id"]]
+        http.shopify.operations.clear()
+        recreated = shopify_agent.publish_product_to_shopify(product_input, media, metadata)
+        assert recreated["success"] and recreated["product_id"] != first["product_id"]
+        assert http.shopify.operations == {"productSet": 2, "publishablePublish": 1}
+        assert shopify_agent.shopify_index().get_shopify_ids(["B1"])["B1"]["product_id"] == recreated["product_id"]
+        print("✅ Unchanged: 0 requests, changed: 1 request, deleted: recreated")
+
+if __name__ == "__main__":
+    test_throttle_waits_for_budget()
+    test_publish_products_parallel_with_retries()
+    test_shop_metadata_cached_and_refreshed()
+    test_create_not_repeated_after_transport_failure()
+    test_publish_round_trips()
+    test_publish_is_an_upsert()
+    print("\n🎉 All Shopify publishing tests passed!")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for content-addressed image storage (no external services needed)
+"""
+
+import os
+import tempfile
+
+from langgraph_workflow.utils.storage import LocalStorage, S3Storage, content_key
+from benchmarks.stand_ins import FakeS3Client
+
+def _write(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_local_storage_dedup():
+    """Identical bytes map to one object, different bytes to another"""
+    print("🧪 Testing LocalStorage deduplication")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = LocalStorage(os.path.join(tmp, "store"), base_url="http://cdn.test/")
+        first = _write(tmp, "a.jpg", b"same bytes")
+        copy = _write(tmp, "b.JPG", b"same bytes")
+        other = _write(tmp, "c.jpg", b"other bytes")
+
+        url = storage.put_file(first)
+        assert url.startswith("http://cdn.test/uploads/") and url.endswith(".jpg")
+        assert storage.put_file(copy) == url
+        assert storage.put_file(other) != url
+        assert storage.exists(content_key(first))
+        assert not [name for name in os.listdir(os.path.join(tmp, "store", "uploads")) if name.endswith(".tmp")]
+        print(f"✅ Stored once: {url}")
+
+def test_s3_storage_skips_known_objects():
+    """A second upload of the same file costs a HEAD at most, never another PUT"""
+    print("🧪 Testing S3Storage deduplication")
+    from langgraph_workflow.utils.metrics import get_metrics_snapshot, reset_metrics
+
+    reset_metrics()
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeS3Client(latency=0)
+        path = _write(tmp, "photo.png", b"\x89PNG" + b"0" * 1024)
+
+        storage = S3Storage(client, "bucket", "us-west-2")
+        url = storage.put_file(path)
+        assert url == f"https://bucket.s3.us-west-2.amazonaws.com/{content_key(path)}"
+        assert storage.put_file(path) == url
+        assert len(client.objects) == 1
+
+        # A fresh process only knows about the object through HEAD
+        restarted = S3Storage(client, "bucket", "us-west-2")
+        assert restarted.exists(content_key(path))
+        assert not restarted.exists("uploads/missing.png")
+        assert restarted.put_file(path) == url
+        assert len(client.objects) == 1
+        # A missing object is the normal first-upload answer, not an error
+        assert "s3:head_object" not in get_metrics_snapshot()["errors"]
+        print("✅ Re-uploads skipped")
+
+if __name__ == "__main__":
+    test_local_storage_dedup()
+    test_s3_storage_skips_known_objects()
+    print("\n🎉 All storage tests passed!")
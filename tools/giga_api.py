@@ -4,6 +4,7 @@ import time
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 import logging
+from langgraph_workflow.utils.metrics import track
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -108,7 +109,8 @@ class GigaApiClient:
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         
         try:
-            response = self.session.post(self.TOKEN_URL, data=token_data, headers=headers)
+            with track("giga_api", "token"):
+                response = self.session.post(self.TOKEN_URL, data=token_data, headers=headers)
             response.raise_for_status()
             
             token_response = response.json()
@@ -153,11 +155,14 @@ class GigaApiClient:
         logger.info(f"Requesting {len(sku_list)} products from Giga API")
         
         try:
-            response = self.session.post(
-                self.PRODUCT_DETAIL_URL, 
-                json=payload, 
-                headers=headers
-            )
+            with track("giga_api", "product_detail") as call:
+                call["request_bytes"] = len(json.dumps(payload).encode("utf-8"))
+                response = self.session.post(
+                    self.PRODUCT_DETAIL_URL, 
+                    json=payload, 
+                    headers=headers
+                )
+                call["response_bytes"] = len(response.content)
             
             # Log response details for debugging
             logger.info(f"Response status: {response.status_code}")
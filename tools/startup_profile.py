@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup profiling report: per-module import time for the API / LangGraph entry points.
+
+Runs each target in a fresh interpreter with `python -X importtime` and prints the
+slowest modules by cumulative and self time, plus the total cold-start time.
+
+Usage:
+    python tools/startup_profile.py                       # main_api + graph_build
+    python tools/startup_profile.py main_api --top 40
+    python tools/startup_profile.py --compile-graph       # also time get_graph()
+    python tools/startup_profile.py --json > startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TARGETS = ["main_api", "langgraph_workflow.graph_build"]
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse `-X importtime` output into a list of {module, self_us, cumulative_us, depth}."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        # Nesting is encoded as two spaces per level after the leading separator space
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append({
+            "module": name.strip(),
+            "self_us": int(self_us.strip()),
+            "cumulative_us": int(cumulative_us.strip()),
+            "depth": depth
+        })
+    return rows
+
+def profile_target(target: str, compile_graph: bool = False) -> Dict:
+    """Import `target` in a fresh interpreter and collect import timings."""
+    code = f"import {target}"
+    if compile_graph:
+        code += "\nfrom langgraph_workflow.graph_build import get_graph\nget_graph()"
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True
+    )
+    wall_s = time.perf_counter() - start
+
+    rows = parse_importtime(proc.stderr)
+    top_level = [r for r in rows if r["depth"] == 0]
+    return {
+        "target": target,
+        "compile_graph": compile_graph,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None,
+        "wall_s": wall_s,
+        "import_total_s": sum(r["cumulative_us"] for r in top_level) / 1_000_000,
+        "modules": rows
+    }
+
+def print_report(report: Dict, top: int):
+    print(f"\n📊 Startup profile: {report['target']}" + (" (+ get_graph())" if report["compile_graph"] else ""))
+    print("=" * 72)
+    if not report["ok"]:
+        print(f"❌ Import failed: {report['error']}")
+    print(f"Process wall time:   {report['wall_s']:.2f}s")
+    print(f"Total import time:   {report['import_total_s']:.2f}s")
+
+    print(f"\nTop {top} modules by cumulative import time:")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for row in sorted(report["modules"], key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        print(f"{row['cumulative_us'] / 1000:>10.1f}ms {row['self_us'] / 1000:>8.1f}ms  {row['module']}")
+
+    print(f"\nTop {top} modules by self import time:")
+    for row in sorted(report["modules"], key=lambda r: r["self_us"], reverse=True)[:top]:
+        print(f"{row['self_us'] / 1000:>10.1f}ms  {row['module']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module import time for cold start")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS, help="Modules to import")
+    parser.add_argument("--top", type=int, default=25, help="Number of modules to show")
+    parser.add_argument("--compile-graph", action="store_true", help="Also compile the graph after import")
+    parser.add_argument("--json", action="store_true", help="Emit the raw report as JSON")
+    args = parser.parse_args()
+
+    reports = [profile_target(target, args.compile_graph) for target in args.targets]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    for report in reports:
+        print_report(report, args.top)
+
+if __name__ == "__main__":
+    main()